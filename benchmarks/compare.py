@@ -0,0 +1,61 @@
+"""
+Compare two benchmark result files.
+
+    python -m benchmarks.compare base.json head.json [--threshold 10]
+
+Prints the relative change of p50, p99 and throughput per scenario and
+exits non-zero when any scenario's p50 regressed by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+METRICS = [("p50_ms", -1), ("p99_ms", -1), ("ops_per_sec", 1)]
+
+
+def change(base, head):
+    if not base:
+        return 0.0
+    return (head - base) / base * 100
+
+
+def compare(base, head, threshold):
+    regressions = []
+    rows = []
+    for name in sorted(set(base["results"]) & set(head["results"])):
+        row = [name]
+        for metric, direction in METRICS:
+            before = base["results"][name][metric]
+            after = head["results"][name][metric]
+            delta = change(before, after)
+            row.append("%10.2f -> %10.2f (%+6.1f%%)" % (before, after, delta))
+            if metric == "p50_ms" and delta * -direction > threshold:
+                regressions.append(name)
+        rows.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed p50 regression in percent.")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as fh:
+        base = json.load(fh)
+    with open(args.head) as fh:
+        head = json.load(fh)
+
+    rows, regressions = compare(base, head, args.threshold)
+    print("%-12s %-36s %-36s %-36s" % ("scenario", "p50 ms", "p99 ms", "ops/s"))
+    for row in rows:
+        print("%-12s %-36s %-36s %-36s" % tuple(row))
+    if regressions:
+        print("\np50 regressed by more than %s%%: %s" % (args.threshold, ", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
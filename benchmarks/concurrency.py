@@ -0,0 +1,158 @@
+"""
+Concurrent upload/read throughput across database configurations.
+
+    python -m benchmarks.concurrency --databases sqlite-untuned sqlite \
+        --threads 8 --requests 100 --read-ratio 0.8 --output databases.json
+
+Each configuration (see ``benchmarks.settings``) runs in its own process
+against a fresh database. ``--threads`` clients, each with its own database
+connection, issue a mix of uploads and reads (path lookups and latest
+listings) through the full request stack. The report has overall
+throughput, per-operation latency and the number of failed requests, such
+as "database is locked" errors. Postgres configurations need
+``BENCHMARK_POSTGRES_URL``.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .run import summarize
+
+READ_SCENARIOS = ["by_path", "list_latest"]
+
+
+def worker(args):
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection, connections
+    from django.test.utils import setup_test_environment
+
+    from .corpus import CorpusSpec, generate_corpus
+    from .scenarios import SCENARIOS, api_client
+
+    setup_test_environment()
+    call_command("migrate", verbosity=0)
+    if connection.vendor != "sqlite":
+        call_command("flush", interactive=False, verbosity=0)
+    corpus = generate_corpus(CorpusSpec(users=1, files=50, versions=2, size=args.size, seed=args.seed))
+    user = corpus.users[0]
+    connections.close_all()
+
+    durations = {"upload": [], "read": []}
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.threads)
+
+    def run(index):
+        rng = random.Random(args.seed + index)
+        client = api_client(user)
+        ops = {name: SCENARIOS[name](client, corpus, rng, user) for name in ["upload"] + READ_SCENARIOS}
+        barrier.wait()
+        try:
+            for _ in range(args.requests):
+                kind = "read" if rng.random() < args.read_ratio else "upload"
+                op = ops[rng.choice(READ_SCENARIOS)] if kind == "read" else ops["upload"]
+                start = time.perf_counter()
+                try:
+                    op()
+                except Exception as exc:
+                    with lock:
+                        errors.append("%s: %s" % (type(exc).__name__, exc))
+                    continue
+                elapsed = time.perf_counter() - start
+                with lock:
+                    durations[kind].append(elapsed)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    from django.conf import settings
+
+    completed = sum(len(values) for values in durations.values())
+    return {
+        "database": settings.BENCHMARK_DATABASE,
+        "engine": settings.DATABASES["default"]["ENGINE"],
+        "threads": args.threads,
+        "seconds": elapsed,
+        "requests_per_sec": completed / elapsed if elapsed else 0.0,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "results": {kind: summarize(values) for kind, values in durations.items() if values},
+    }
+
+
+def run_configuration(database, args):
+    env = dict(os.environ, BENCHMARK_DATABASE=database, DJANGO_SETTINGS_MODULE=args.settings)
+    with tempfile.TemporaryDirectory(prefix="pdm-benchmark-") as directory:
+        env["BENCHMARK_DIR"] = directory
+        command = [
+            sys.executable, "-m", "benchmarks.concurrency", "--worker",
+            "--threads", str(args.threads), "--requests", str(args.requests),
+            "--read-ratio", str(args.read_ratio), "--size", str(args.size), "--seed", str(args.seed),
+        ]
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode:
+        return {"database": database, "failed": completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--databases", nargs="+", default=["sqlite-untuned", "sqlite"])
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent clients.")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per client.")
+    parser.add_argument("--read-ratio", type=float, default=0.8, help="Share of requests that are reads.")
+    parser.add_argument("--size", type=int, default=4096, help="Bytes per uploaded version.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--settings", default="benchmarks.settings", help="Django settings module.")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", args.settings)
+        print(json.dumps(worker(args)))
+        return
+
+    report = []
+    for database in args.databases:
+        result = run_configuration(database, args)
+        report.append(result)
+        if "failed" in result:
+            print("%-20s failed: %s" % (database, " ".join(result["failed"])), file=sys.stderr)
+            continue
+        latency = {kind: "%s p50 %.1f ms p99 %.1f ms" % (kind, r["p50_ms"], r["p99_ms"])
+                   for kind, r in result["results"].items()}
+        print("%-20s %8.1f req/s  %4d errors  %s" % (
+            database, result["requests_per_sec"], result["errors"], "  ".join(latency.values())
+        ), file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import random
+
+import pytest
+
+from .corpus import CorpusSpec, generate_corpus
+from .scenarios import api_client
+
+
+@pytest.fixture(autouse=True)
+def media_storage(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+
+
+@pytest.fixture
+def corpus(db):
+    return generate_corpus(CorpusSpec(users=2, files=10, versions=3, size=2048, duplication_ratio=0.2))
+
+
+@pytest.fixture
+def user(corpus):
+    return corpus.users[0]
+
+
+@pytest.fixture
+def client(user):
+    return api_client(user)
+
+
+@pytest.fixture
+def rng():
+    return random.Random(1)
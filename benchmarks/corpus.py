@@ -0,0 +1,111 @@
+"""
+Synthetic corpus generator for benchmarks.
+
+Builds N users with M files each and K versions per file. Version content
+is legislative-looking text of roughly ``size`` bytes; ``duplication_ratio``
+of the versions reuse content that already exists somewhere in the corpus
+so deduplication paths are exercised too.
+"""
+import random
+from dataclasses import dataclass, field
+
+from django.core.files.base import ContentFile
+
+from propylon_document_manager.file_versions.hashing import digest_upload
+from propylon_document_manager.file_versions.models.file import File
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from propylon_document_manager.file_versions.models.user import User
+
+KINDS = ["bills", "amendments", "acts", "statutes"]
+TOPICS = [
+    "fisheries", "forestry", "taxation", "education", "housing", "transport",
+    "health", "energy", "agriculture", "planning", "justice", "water",
+]
+WORDS = [
+    "the", "minister", "shall", "may", "by", "order", "provide", "that", "any", "person",
+    "who", "section", "subsection", "paragraph", "pursuant", "to", "this", "act", "is",
+    "amended", "repealed", "inserted", "after", "before", "licence", "authority", "local",
+    "regulation", "offence", "liable", "on", "summary", "conviction", "fine", "not",
+    "exceeding", "year", "commencement", "schedule", "notwithstanding", "in", "of", "and",
+]
+
+
+@dataclass
+class CorpusSpec:
+    users: int = 2
+    files: int = 20
+    versions: int = 3
+    size: int = 4096
+    duplication_ratio: float = 0.1
+    seed: int = 1
+
+
+@dataclass
+class Corpus:
+    spec: CorpusSpec
+    users: list = field(default_factory=list)
+    files: list = field(default_factory=list)
+    versions: list = field(default_factory=list)
+
+    @property
+    def content_hashes(self):
+        return sorted({version.content_hash for version in self.versions})
+
+
+def make_document(rng, size, title=None):
+    """Legislative-looking text of exactly ``size`` bytes."""
+    lines = [title or "AN ACT concerning %s" % rng.choice(TOPICS), ""]
+    length = sum(len(line) + 1 for line in lines)
+    section = 1
+    while length < size:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24)))
+        line = "Section %d. %s." % (section, sentence.capitalize())
+        lines.append(line)
+        length += len(line) + 1
+        section += 1
+    return "\n".join(lines).encode()[:size]
+
+
+def generate_corpus(spec, password="benchmark"):
+    rng = random.Random(spec.seed)
+    corpus = Corpus(spec=spec)
+    pool = []
+    stored = {}
+
+    for user_index in range(spec.users):
+        user, created = User.objects.get_or_create(email="bench%d@example.com" % user_index)
+        if created:
+            user.set_password(password)
+            user.save()
+        corpus.users.append(user)
+
+        for file_index in range(spec.files):
+            name = "%s/%s/%s-%d.txt" % (rng.choice(KINDS), rng.randint(1990, 2025), rng.choice(TOPICS), file_index)
+            file_obj, _ = File.objects.get_or_create(name=name, user=user)
+            corpus.files.append(file_obj)
+
+            for version_number in range(1, spec.versions + 1):
+                if pool and rng.random() < spec.duplication_ratio:
+                    content = rng.choice(pool)
+                else:
+                    content = make_document(rng, spec.size, title="%s (version %d)" % (name, version_number))
+                    pool.append(content)
+                upload = ContentFile(content, name=name.rpartition("/")[2])
+                digest = digest_upload(upload, name=name)
+                version = FileVersion(
+                    file_obj=file_obj,
+                    version_number=version_number,
+                    user=user,
+                    content_hash=digest.content_hash,
+                    size=digest.size,
+                    mime_type=digest.mime_type,
+                )
+                if digest.content_hash in stored:
+                    version.file = stored[digest.content_hash]
+                else:
+                    version.file = upload
+                version.save()
+                stored.setdefault(digest.content_hash, version.file.name)
+                corpus.versions.append(version)
+
+    return corpus
@@ -0,0 +1,135 @@
+"""
+Payload size and encode/decode time of version listings, JSON vs MessagePack.
+
+    python -m benchmarks.formats --rows 100000 --output formats.json
+
+Serializes ``--rows`` in-memory versions (nothing touches the database) the
+way the list endpoint does for each format and reports:
+
+- ``serialize_seconds``: ``FileVersionSerializer`` for JSON (absolute file
+  URL and signed share link on every row), ``CompactFileVersionSerializer``
+  for MessagePack (raw 32-byte hashes, no URLs).
+- ``encode_seconds``: the renderer turning those rows into bytes.
+- ``decode_seconds``: what a client spends parsing the payload
+  (``json.loads`` / ``msgpack.unpackb``).
+- ``bytes`` and ``gzip_bytes``: the payload as sent, and with gzip.
+
+Each figure is the best of ``--repeat`` runs.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+
+FORMATS = ["json", "msgpack"]
+
+
+def make_rows(count):
+    from django.utils import timezone
+
+    from propylon_document_manager.file_versions.models.file import File
+    from propylon_document_manager.file_versions.models.file_version import FileVersion
+    from propylon_document_manager.file_versions.models.user import User
+    from propylon_document_manager.file_versions.storage import blob_name
+
+    user = User(id=1, email="sync-agent@example.com")
+    now = timezone.now()
+    rows = []
+    for index in range(count):
+        content_hash = hashlib.sha256(b"%d" % index).hexdigest()
+        file_obj = File(id=index // 4 + 1, name="bills/%04d/bill-%d.txt" % (index // 400, index // 4), user=user,
+                        version_count=4, total_bytes=4 * 2048)
+        rows.append(FileVersion(
+            id=index + 1, file_obj=file_obj, user=user, version_number=index % 4 + 1, content_hash=content_hash,
+            size=2048, mime_type="text/plain", file=blob_name(content_hash),
+            created_at=now - timedelta(minutes=index),
+        ))
+    return rows
+
+
+def best_of(repeat, function):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def measure(fmt, rows, repeat):
+    import msgpack
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+
+    from propylon_document_manager.file_versions.api.renderers import MessagePackRenderer
+    from propylon_document_manager.file_versions.api.serializers import (
+        CompactFileVersionSerializer, FileVersionSerializer
+    )
+
+    request = APIRequestFactory().get("/api/file_versions/")
+    if fmt == "json":
+        serializer_class, renderer, decode = FileVersionSerializer, JSONRenderer(), json.loads
+    else:
+        serializer_class, renderer = CompactFileVersionSerializer, MessagePackRenderer()
+        decode = lambda payload: msgpack.unpackb(payload, timestamp=3)  # noqa: E731
+
+    serialize_seconds, data = best_of(repeat, lambda: serializer_class(
+        rows, many=True, context={"request": request}
+    ).data)
+    encode_seconds, payload = best_of(repeat, lambda: renderer.render(data))
+    decode_seconds, decoded = best_of(repeat, lambda: decode(payload))
+    assert len(decoded) == len(rows)
+    return {
+        "format": fmt,
+        "rows": len(rows),
+        "bytes": len(payload),
+        "gzip_bytes": len(gzip.compress(payload, 6)),
+        "serialize_seconds": serialize_seconds,
+        "encode_seconds": encode_seconds,
+        "decode_seconds": decode_seconds,
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--settings", default="benchmarks.settings", help="Django settings module.")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", args.settings)
+    import django
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    rows = make_rows(args.rows)
+    report = []
+    for fmt in args.formats:
+        result = measure(fmt, rows, args.repeat)
+        report.append(result)
+        print("%-8s %7.1f MB  gzip %6.1f MB  serialize %6.2f s  encode %6.2f s  decode %6.2f s" % (
+            fmt, result["bytes"] / 1024**2, result["gzip_bytes"] / 1024**2,
+            result["serialize_seconds"], result["encode_seconds"], result["decode_seconds"]
+        ), file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Standalone end-to-end API benchmark.
+
+    python -m benchmarks.run --users 4 --files 100 --versions 3 --size 8192 \
+        --duplication-ratio 0.2 --iterations 200 --output results.json
+
+Generates a synthetic corpus in a throwaway SQLite database, runs every
+scenario through the full Django request stack and writes latency
+percentiles and throughput as JSON. Set ``BENCHMARK_DIR`` to keep the
+database and blobs afterwards. Compare two runs with
+``python -m benchmarks.compare base.json head.json``.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(durations, op_bytes=None):
+    durations = sorted(durations)
+    total = sum(durations)
+    stats = {
+        "iterations": len(durations),
+        "mean_ms": statistics.fmean(durations) * 1000,
+        "p50_ms": percentile(durations, 0.50) * 1000,
+        "p90_ms": percentile(durations, 0.90) * 1000,
+        "p99_ms": percentile(durations, 0.99) * 1000,
+        "max_ms": durations[-1] * 1000,
+        "ops_per_sec": len(durations) / total if total else 0.0,
+    }
+    if op_bytes:
+        stats["bytes_per_sec"] = stats["ops_per_sec"] * op_bytes
+    return stats
+
+
+def measure(op, iterations, warmup):
+    for _ in range(warmup):
+        op()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        op()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2, help="Number of users in the corpus.")
+    parser.add_argument("--files", type=int, default=20, help="Files per user.")
+    parser.add_argument("--versions", type=int, default=3, help="Versions per file.")
+    parser.add_argument("--size", type=int, default=4096, help="Bytes per version.")
+    parser.add_argument("--duplication-ratio", type=float, default=0.1, help="Share of versions reusing content.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=100, help="Measured requests per scenario.")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario.")
+    parser.add_argument("--scenario", action="append", help="Only run these scenarios (repeatable).")
+    parser.add_argument("--settings", default="benchmarks.settings", help="Django settings module.")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", args.settings)
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+
+    from .corpus import CorpusSpec, generate_corpus
+    from .scenarios import SCENARIOS, api_client
+
+    setup_test_environment()
+    call_command("migrate", verbosity=0)
+
+    spec = CorpusSpec(
+        users=args.users,
+        files=args.files,
+        versions=args.versions,
+        size=args.size,
+        duplication_ratio=args.duplication_ratio,
+        seed=args.seed,
+    )
+    started = time.perf_counter()
+    corpus = generate_corpus(spec)
+    corpus_seconds = time.perf_counter() - started
+
+    rng = random.Random(args.seed)
+    user = corpus.users[0]
+    client = api_client(user)
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        op = SCENARIOS[name](client, corpus, rng, user)
+        results[name] = summarize(measure(op, args.iterations, args.warmup), getattr(op, "bytes", None))
+        print("%-12s p50 %8.2f ms  p99 %8.2f ms  %8.1f ops/s" % (
+            name, results[name]["p50_ms"], results[name]["p99_ms"], results[name]["ops_per_sec"]
+        ), file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "corpus": asdict(spec),
+            "corpus_seconds": corpus_seconds,
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+    if not os.environ.get("BENCHMARK_DIR"):
+        shutil.rmtree(settings.BENCHMARK_DIR, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+API operations measured by the benchmark runner and the pytest-benchmark
+suite. Each factory takes an authenticated client, a ``Corpus`` and a
+``random.Random`` and returns a zero-argument callable performing one request.
+"""
+import itertools
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .corpus import make_document
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def decorator(factory):
+        SCENARIOS[name] = factory
+        return factory
+
+    return decorator
+
+
+def api_client(user):
+    """Client authenticating with a real token, as API consumers do."""
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token %s" % token.key)
+    return client
+
+
+def check(response, expected=200):
+    assert response.status_code == expected, "%s %s" % (response.status_code, getattr(response, "data", ""))
+    return response
+
+
+def user_versions(corpus, user):
+    return [version for version in corpus.versions if version.user_id == user.pk]
+
+
+def user_files(corpus, user):
+    return [file_obj for file_obj in corpus.files if file_obj.user_id == user.pk]
+
+
+@scenario("upload")
+def upload(client, corpus, rng, user):
+    counter = itertools.count()
+
+    def op():
+        name = "bench/uploads/upload-%d-%d.txt" % (rng.randint(0, 10**9), next(counter))
+        content = make_document(rng, corpus.spec.size)
+        check(client.post(
+            reverse("api:fileversion-list"),
+            {"file": SimpleUploadedFile("upload.txt", content), "file_name": name},
+            format="multipart"
+        ), 201)
+
+    op.bytes = corpus.spec.size
+    return op
+
+
+@scenario("list")
+def list_versions(client, corpus, rng, user):
+    def op():
+        check(client.get(reverse("api:fileversion-list")))
+
+    return op
+
+
+@scenario("list_latest")
+def list_latest(client, corpus, rng, user):
+    def op():
+        check(client.get(reverse("api:fileversion-latest")))
+
+    return op
+
+
+@scenario("by_hash")
+def by_hash(client, corpus, rng, user):
+    # Every hash of the user's, including those shared by several versions
+    # (duplicated content), which by_hash answers with the newest.
+    hashes = sorted({version.content_hash for version in user_versions(corpus, user)})
+
+    def op():
+        check(client.get(reverse("api:fileversion-by-hash", kwargs={"content_hash": rng.choice(hashes)})))
+
+    return op
+
+
+@scenario("by_path")
+def by_path(client, corpus, rng, user):
+    names = [file_obj.name for file_obj in user_files(corpus, user)]
+
+    def op():
+        check(client.get("/api/" + rng.choice(names)))
+
+    return op
+
+
+@scenario("download")
+def download(client, corpus, rng, user):
+    versions = user_versions(corpus, user)
+
+    def op():
+        response = check(client.get(reverse("api:fileversion-download", kwargs={"id": rng.choice(versions).pk})))
+        for _ in response.streaming_content:
+            pass
+        response.close()
+
+    op.bytes = corpus.spec.size
+    return op
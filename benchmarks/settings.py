@@ -0,0 +1,35 @@
+"""
+Settings for the standalone benchmark runners: the test settings with an
+on-disk database and media directory under ``BENCHMARK_DIR``.
+
+``BENCHMARK_DATABASE`` selects the database configuration:
+
+- ``sqlite`` (default): SQLite as configured in base settings.
+- ``sqlite-untuned``: SQLite with no pragmas and deferred transactions.
+- ``postgres``: ``BENCHMARK_POSTGRES_URL`` with persistent connections.
+- ``postgres-pgbouncer``: the same URL pointing at PgBouncer in transaction mode.
+- ``postgres-pool``: ``BENCHMARK_POSTGRES_URL`` with psycopg's in-process pool.
+"""
+import os
+import tempfile
+
+from tests.settings import *  # noqa
+from tests.settings import env
+
+BENCHMARK_DIR = os.environ.get("BENCHMARK_DIR") or tempfile.mkdtemp(prefix="pdm-benchmark-")
+BENCHMARK_DATABASE = os.environ.get("BENCHMARK_DATABASE", "sqlite")
+
+if BENCHMARK_DATABASE.startswith("postgres"):
+    DATABASES = {"default": env.db("BENCHMARK_POSTGRES_URL")}
+    DATABASES["default"]["CONN_MAX_AGE"] = 60
+    if BENCHMARK_DATABASE == "postgres-pgbouncer":
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+    elif BENCHMARK_DATABASE == "postgres-pool":
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {"pool": {"min_size": 2, "max_size": 20}}
+else:
+    DATABASES = {"default": {**DATABASES["default"], "NAME": os.path.join(BENCHMARK_DIR, "benchmark.sqlite3")}}  # noqa: F405
+    if BENCHMARK_DATABASE == "sqlite-untuned":
+        DATABASES["default"]["OPTIONS"] = {}
+        SQLITE_PRAGMAS = {}
+MEDIA_ROOT = os.path.join(BENCHMARK_DIR, "media")
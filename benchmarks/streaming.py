@@ -0,0 +1,194 @@
+"""
+CPU time and memory of streaming and re-hashing large versions.
+
+    python -m benchmarks.streaming --threads 8 --size 64 --output streaming.json
+
+Every mode runs in its own process over the same ``--threads`` files of
+``--size`` MiB, one thread per file, and reports wall time, CPU time (user +
+system) and peak RSS split into anonymous memory and mapped file pages:
+
+- ``download-4k``: Django's default FileResponse, 4 KiB reads copied into
+  socket writes.
+- ``download-blocks``: the download view without a file wrapper, 256 KiB reads.
+- ``download-sendfile``: ``os.sendfile`` from the blob's descriptor, which is
+  what gunicorn and uWSGI do through ``wsgi.file_wrapper``.
+- ``hash-chunks``: SHA-256 over 1 MiB blocks re-cut from copied chunks, the
+  previous verification path.
+- ``hash-mmap``: the same over slices of the blob's mapping (``read_blocks``).
+
+Downloads are written to a socketpair drained by a reader thread, the same
+for every mode. Files are read once beforehand so all modes hit the page
+cache.
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+MODES = ["download-4k", "download-blocks", "download-sendfile", "hash-chunks", "hash-mmap"]
+BLOCK = 1024 * 1024
+
+
+def drain(sock):
+    buffer = bytearray(BLOCK)
+    while sock.recv_into(buffer):
+        pass
+
+
+def download(path, mode):
+    sender, receiver = socket.socketpair()
+    reader = threading.Thread(target=drain, args=(receiver,))
+    reader.start()
+    try:
+        with open(path, "rb") as fh:
+            if mode == "download-sendfile":
+                offset, size = 0, os.fstat(fh.fileno()).st_size
+                while offset < size:
+                    offset += os.sendfile(sender.fileno(), fh.fileno(), offset, size - offset)
+            else:
+                block_size = 4096 if mode == "download-4k" else 256 * 1024
+                while chunk := fh.read(block_size):
+                    sender.sendall(chunk)
+    finally:
+        sender.close()
+        reader.join()
+        receiver.close()
+
+
+def digest(path, mode):
+    from django.core.files import File
+
+    from propylon_document_manager.file_versions.hashing import iter_blocks, read_blocks
+
+    sha256 = hashlib.sha256()
+    with File(open(path, "rb")) as blob:
+        blocks = read_blocks(blob, BLOCK) if mode == "hash-mmap" else iter_blocks(blob.chunks(), BLOCK)
+        for block in blocks:
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def memory_kb():
+    """Current anonymous and file-backed resident memory, from /proc."""
+    values = {}
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                key, _, value = line.partition(":")
+                if key in ("RssAnon", "RssFile"):
+                    values[key] = int(value.split()[0])
+    except FileNotFoundError:
+        pass
+    return values
+
+
+def worker(args):
+    paths = args.paths
+    for path in paths:
+        with open(path, "rb") as fh:
+            while fh.read(BLOCK):
+                pass
+    run = download if args.mode.startswith("download") else digest
+    peak = {"RssAnon": 0, "RssFile": 0}
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.005):
+            for key, value in memory_kb().items():
+                peak[key] = max(peak[key], value)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(path, args.mode)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    done.set()
+    sampler.join()
+
+    total = sum(os.path.getsize(path) for path in paths)
+    return {
+        "mode": args.mode,
+        "threads": len(paths),
+        "seconds": elapsed,
+        "mb_per_sec": total / elapsed / 1024**2 if elapsed else 0.0,
+        "cpu_seconds": (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime),
+        "peak_rss_anon_mb": peak["RssAnon"] / 1024,
+        "peak_rss_file_mb": peak["RssFile"] / 1024,
+    }
+
+
+def run_mode(mode, paths, args):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=args.settings)
+    command = [sys.executable, "-m", "benchmarks.streaming", "--worker", "--mode", mode, "--paths", *paths]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode:
+        return {"mode": mode, "failed": completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent streams, one file each.")
+    parser.add_argument("--size", type=int, default=64, help="MiB per file.")
+    parser.add_argument("--settings", default="benchmarks.settings", help="Django settings module.")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--paths", nargs="*", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", args.settings)
+        import django
+
+        django.setup()
+        print(json.dumps(worker(args)))
+        return
+
+    report = []
+    with tempfile.TemporaryDirectory(prefix="pdm-streaming-") as directory:
+        paths = []
+        for index in range(args.threads):
+            path = os.path.join(directory, "blob-%d" % index)
+            with open(path, "wb") as fh:
+                for _ in range(args.size):
+                    fh.write(os.urandom(BLOCK))
+            paths.append(path)
+        for mode in args.modes:
+            result = run_mode(mode, paths, args)
+            report.append(result)
+            if "failed" in result:
+                print("%-18s failed: %s" % (mode, " ".join(result["failed"])), file=sys.stderr)
+                continue
+            print("%-18s %8.1f MB/s  cpu %6.2f s  anon %7.1f MB  file %7.1f MB" % (
+                mode, result["mb_per_sec"], result["cpu_seconds"],
+                result["peak_rss_anon_mb"], result["peak_rss_file_mb"]
+            ), file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import pytest
+
+from .scenarios import SCENARIOS
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", sorted(SCENARIOS))
+def test_api_scenario(benchmark, name, client, corpus, rng, user):
+    benchmark.group = "api"
+    benchmark(SCENARIOS[name](client, corpus, rng, user))
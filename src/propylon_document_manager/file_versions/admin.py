@@ -1,3 +1,216 @@
-from django.contrib import admin
+"""
+Admin pages for tables with millions of rows.
 
-# Register your models here.
+- Changelists of unfiltered large tables show the database's row estimate
+  (``utils.db.estimated_count``) instead of running ``COUNT(*)``, and never
+  count the whole table a second time or per filter choice (facets).
+- Lists are ordered by primary key, the only column sortable for every row
+  without a full sort. Related rows are joined with ``list_select_related``
+  and foreign keys are edited as raw ids, so no page loads a whole table.
+- Users are filtered by id or email and versions looked up by content hash,
+  both through indexes. File search is a path prefix, matched with the same
+  index range as the API's path listing.
+- Files and versions are deleted through ``delete_in_batches`` (calling the
+  admin's ``delete_batch``) rather than Django's ``delete_selected``, which
+  collects every selected row and its relations in memory. Rows are deleted
+  in transactions of ``ADMIN_ACTION_BATCH_SIZE`` with
+  ``retention.delete_versions``, which keeps file aggregates and blob
+  references right. Other large tables have no delete action.
+"""
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.utils import model_ngettext
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
+
+from propylon_document_manager.utils.db import estimated_count
+
+from .models.file import File
+from .models.file_version import FileVersion
+from .models.pack_entry import PackEntry
+from .models.retention_policy import RetentionPolicy
+from .retention import delete_versions
+
+VERSION_FIELDS = ("id", "file_obj_id", "size", "content_hash", "file")
+
+
+class EstimatedCountPaginator(Paginator):
+    """Counts an unfiltered list from the database's estimate once the table is large."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    """A filter with a text box, for columns with too many values to list."""
+
+    template = "admin/file_versions/input_filter.html"
+
+    def lookups(self, request, model_admin):
+        # Non-empty, or the filter is not shown; the template ignores it.
+        return [("", "")]
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        return {}
+
+    def choices(self, changelist):
+        yield {
+            "value": self.value() or "",
+            # The other filters and the search, kept when this one is submitted.
+            "query_parts": [(key, value) for key, value in changelist.params.items() if key != self.parameter_name],
+        }
+
+
+class UserFilter(InputFilter):
+    title = "user (id or email)"
+    parameter_name = "user"
+
+    def queryset(self, request, queryset):
+        value = (self.value() or "").strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(user_id=value)
+        return queryset.filter(user__email=value)
+
+
+def pk_batches(queryset, batch_size):
+    """Primary keys of ``queryset`` in ascending lists of at most ``batch_size``."""
+    queryset = queryset.order_by("pk")
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(batch.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+@admin.action(permissions=["delete"], description="Delete selected %(verbose_name_plural)s in batches")
+def delete_in_batches(modeladmin, request, queryset):
+    if not request.POST.get("post"):
+        return TemplateResponse(request, "admin/file_versions/delete_in_batches_confirmation.html", {
+            **modeladmin.admin_site.each_context(request),
+            "title": "Delete in batches",
+            "subtitle": None,
+            "opts": modeladmin.opts,
+            "objects_name": str(model_ngettext(queryset)),
+            "count": EstimatedCountPaginator(queryset, 1).count,
+            "estimated": not queryset.query.where,
+            "batch_size": settings.ADMIN_ACTION_BATCH_SIZE,
+            "select_across": request.POST.get("select_across") == "1",
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            "media": modeladmin.media,
+        })
+
+    deleted, freed = 0, 0
+    for pks in pk_batches(queryset, settings.ADMIN_ACTION_BATCH_SIZE):
+        count, blobs = modeladmin.delete_batch(pks)
+        deleted += count
+        freed += len(blobs)
+    modeladmin.message_user(
+        request,
+        "Deleted %d %s; %d blobs freed." % (deleted, model_ngettext(modeladmin.opts, deleted), freed),
+        messages.SUCCESS,
+    )
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    ordering = ("-pk",)
+    sortable_by = ("id",)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+
+@admin.register(File)
+class FileAdmin(LargeTableAdmin):
+    list_display = ("id", "name", "user", "version_count", "total_bytes")
+    list_select_related = ("user",)
+    list_filter = (UserFilter,)
+    search_fields = ("name",)
+    search_help_text = "Path prefix, e.g. bills/2024/"
+    raw_id_fields = ("user",)
+    readonly_fields = ("parent", "latest_version", "version_count", "total_bytes")
+    actions = [delete_in_batches]
+
+    def get_search_results(self, request, queryset, search_term):
+        return queryset.with_prefix(search_term.strip().lstrip("/")), False
+
+    def delete_batch(self, pks):
+        """Delete the rows with ``pks``; returns how many and the blob names freed."""
+        versions = list(FileVersion.objects.filter(file_obj_id__in=pks).only(*VERSION_FIELDS))
+        with transaction.atomic():
+            freed = delete_versions(versions) if versions else set()
+            # Versions are the only rows referencing a file.
+            File.objects.filter(pk__in=pks)._raw_delete(File.objects.db)
+        return len(pks), freed
+
+
+@admin.register(FileVersion)
+class FileVersionAdmin(LargeTableAdmin):
+    list_display = ("id", "file_obj", "version_number", "user", "size", "mime_type", "content_hash", "created_at")
+    list_select_related = ("file_obj", "user")
+    list_filter = (UserFilter,)
+    search_fields = ("content_hash",)
+    search_help_text = "Content hash (SHA-256, exact)"
+    raw_id_fields = ("file_obj", "user")
+    readonly_fields = ("content_hash", "tree_hash", "size", "mime_type", "created_at")
+    actions = [delete_in_batches]
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip().lower()
+        return (queryset.filter(content_hash=search_term) if search_term else queryset), False
+
+    def delete_batch(self, pks):
+        versions = list(FileVersion.objects.filter(pk__in=pks).only(*VERSION_FIELDS))
+        return len(versions), delete_versions(versions)
+
+
+@admin.register(PackEntry)
+class PackEntryAdmin(LargeTableAdmin):
+    """Read-only: entries are written by uploads and dropped by ``repack_blobs``."""
+
+    list_display = ("content_hash", "pack", "offset", "length", "touched_at")
+    search_fields = ("content_hash", "pack")
+    search_help_text = "Content hash or pack name (exact)"
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(Q(content_hash=search_term.lower()) | Q(pack=search_term)), False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "keep_last", "keep_daily", "keep_weekly", "keep_monthly", "keep_within", "created_at")
+    list_select_related = ("user",)
+    list_filter = (UserFilter,)
+    raw_id_fields = ("user",)
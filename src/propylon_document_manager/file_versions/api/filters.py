@@ -0,0 +1,57 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+class FileVersionMetadataFilter(BaseFilterBackend):
+    """
+    Filters versions on the metadata captured at upload time:
+    ``mime_type`` (exact, or ``type/*``), ``min_size``/``max_size`` in bytes
+    and ``uploaded_after``/``uploaded_before`` (ISO date or datetime). Dates
+    and datetimes without an offset are in the current time zone; a date
+    stands for the start of that day.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        mime_type = params.get("mime_type")
+        if mime_type:
+            if mime_type.endswith("/*"):
+                queryset = queryset.filter(mime_type__startswith=mime_type[:-1])
+            else:
+                queryset = queryset.filter(mime_type=mime_type)
+
+        for param, lookup in (("min_size", "size__gte"), ("max_size", "size__lte")):
+            if params.get(param):
+                try:
+                    value = int(params[param])
+                except ValueError:
+                    raise serializers.ValidationError({param: "Must be an integer number of bytes."})
+                queryset = queryset.filter(**{lookup: value})
+
+        for param, lookup in (("uploaded_after", "created_at__gte"), ("uploaded_before", "created_at__lt")):
+            if params.get(param):
+                value = self.parse_timestamp(params[param])
+                if value is None:
+                    raise serializers.ValidationError({param: "Must be an ISO 8601 date or datetime."})
+                queryset = queryset.filter(**{lookup: value})
+
+        return queryset
+
+    def parse_timestamp(self, value):
+        try:
+            timestamp = parse_datetime(value)
+            if timestamp is None:
+                date = parse_date(value)
+                if date is None:
+                    return None
+                timestamp = datetime.combine(date, time.min)
+        except ValueError:
+            return None
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+        return timestamp
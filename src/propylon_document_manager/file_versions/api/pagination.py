@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class PathCursorPagination(CursorPagination):
+    """Pages over querysets annotated with the file's ``path``."""
+
+    ordering = "path"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
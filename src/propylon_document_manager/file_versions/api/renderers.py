@@ -0,0 +1,89 @@
+import json
+import posixpath
+
+import msgpack
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import encoders
+
+
+def encode_line(row):
+    return json.dumps(row, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """
+    Newline-delimited JSON: one object per line. Lists are written a row per
+    line and anything else as a single line. Views that can stream (see
+    ``iter_ndjson``) do so instead of going through ``render``.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        return b"".join(encode_line(row) for row in rows)
+
+
+def iter_ndjson(queryset, serializer_class, context, chunk_size):
+    """
+    Yield ``queryset`` as NDJSON, ``chunk_size`` rows at a time. Rows are
+    fetched with ``.iterator()`` and serialized chunk by chunk, so memory use
+    does not depend on the number of rows.
+    """
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield b"".join(encode_line(row) for row in serializer_class(chunk, many=True, context=context).data)
+            chunk = []
+    if chunk:
+        yield b"".join(encode_line(row) for row in serializer_class(chunk, many=True, context=context).data)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    MessagePack for machine clients. Views pick ``CompactFileVersionSerializer``
+    for it, so hashes travel as 32 raw bytes and timestamps as MessagePack
+    timestamps.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, use_bin_type=True, datetime=True, default=encoders.JSONEncoder().default)
+
+
+class MessagePackParser(parsers.BaseParser):
+    """
+    Parses a MessagePack map. Top-level binary values are uploaded files,
+    named after ``file_name`` when given: ``{"file_name": ..., "file": <bytes>}``
+    uploads a version without multipart encoding.
+    """
+
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            data = msgpack.unpackb(stream.read(), raw=False, timestamp=3)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError("MessagePack parse error - %s" % exc)
+        if not isinstance(data, dict):
+            return data
+        # A plain dict: request.data merges it in with dict.update.
+        files = {}
+        for key, value in list(data.items()):
+            if isinstance(value, bytes):
+                name = posixpath.basename(str(data.get("file_name") or key))
+                files[key] = SimpleUploadedFile(name, data.pop(key), content_type="application/octet-stream")
+        return parsers.DataAndFiles(data, files)
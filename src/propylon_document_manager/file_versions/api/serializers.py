@@ -1,28 +1,51 @@
+import re
+
+from django.conf import settings
 from rest_framework import serializers
 
 from propylon_document_manager.file_versions.models.file_version import FileVersion
 from propylon_document_manager.file_versions.models.file import File
+from propylon_document_manager.file_versions.paths import normalize_path
+from propylon_document_manager.file_versions.sharing import link_expiry, share_base_url, share_url
+from propylon_document_manager.utils.tracing import TracedListSerializer, TracedSerializerMixin
+
+HEX_SHA256 = re.compile(r"[0-9a-fA-F]{64}")
 
 class FileSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
-        fields = ["id", "name"]
+        fields = ["id", "name", "parent", "version_count", "total_bytes"]
 
-class FileVersionSerializer(serializers.ModelSerializer):
+class FileVersionSerializer(TracedSerializerMixin, serializers.ModelSerializer):
     shareable_link = serializers.SerializerMethodField()
     user = serializers.StringRelatedField(read_only=True)
     file_obj = FileSerializer(read_only=True)
     version_number = serializers.IntegerField(read_only=True)
     content_hash = serializers.CharField(read_only=True)
+    size = serializers.IntegerField(read_only=True)
+    mime_type = serializers.CharField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
 
     class Meta:
         model = FileVersion
-        fields = ["id", "file_obj", "version_number", "file", "shareable_link", "user", "content_hash"]
+        fields = [
+            "id", "file_obj", "version_number", "file", "shareable_link", "user",
+            "content_hash", "size", "mime_type", "created_at"
+        ]
+        # Upload only: blobs are not web-served; reads go through download/ or the
+        # signed shareable_link.
+        extra_kwargs = {"file": {"write_only": True}}
+        list_serializer_class = TracedListSerializer
 
     def get_shareable_link(self, obj):
         request = self.context.get("request")
         if hasattr(obj, 'file') and obj.file:
-            return request.build_absolute_uri(obj.file.url)
+            if "share_expires" not in self.context:
+                # One expiry and base URL for the whole page, so repeated
+                # listings give the same links and rows skip URL reversing.
+                self.context["share_expires"] = link_expiry()
+                self.context["share_base_url"] = share_base_url(request)
+            return share_url(request, obj, self.context["share_expires"], self.context["share_base_url"])
         return None
 
     def validate(self, data):
@@ -33,13 +56,62 @@ class FileVersionSerializer(serializers.ModelSerializer):
             if not file_name and uploaded_file:
                 file_name = uploaded_file.name
             if file_name:
-                if len(file_name) > 255:
+                try:
+                    file_path = normalize_path(file_name)
+                except ValueError as exc:
+                    raise serializers.ValidationError({"file_name": str(exc)})
+                if len(file_path) > 512:
+                    raise serializers.ValidationError({"file_name": "File path must be at most 512 characters."})
+                if any(len(segment) > 255 for segment in file_path.split("/")):
                     raise serializers.ValidationError({"file_name": "File name must be at most 255 characters."})
-                if '/' in file_name or '\\' in file_name:
-                    raise serializers.ValidationError({"file_name": "File name cannot contain '/' or '\\'."})
             # File size validation
             if uploaded_file:
                 max_size = 10 * 1024 * 1024
                 if uploaded_file.size > max_size:
                     raise serializers.ValidationError({"file": "File size must not exceed 10MB."})
         return data
+
+class HashField(serializers.Field):
+    """
+    A SHA-256 hex digest, represented as raw bytes. Accepts hex strings, or
+    32 raw bytes from binary formats.
+    """
+
+    default_error_messages = {"invalid": "Not a SHA-256 hash."}
+
+    def to_representation(self, value):
+        return bytes.fromhex(value)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bytes) and len(data) == 32:
+            return data.hex()
+        if isinstance(data, str) and HEX_SHA256.fullmatch(data):
+            return data.lower()
+        self.fail("invalid")
+
+class HashListSerializer(serializers.Serializer):
+    hashes = serializers.ListField(child=HashField(), allow_empty=False)
+
+    def validate_hashes(self, hashes):
+        max_hashes = settings.BATCH_LOOKUP_MAX_HASHES
+        if len(hashes) > max_hashes:
+            raise serializers.ValidationError("At most %d hashes per request." % max_hashes)
+        return list(dict.fromkeys(hashes))
+
+class CompactFileVersionSerializer(FileVersionSerializer):
+    """
+    For binary formats (MessagePack): hashes as raw bytes, timestamps as
+    datetimes and no URLs; clients fetch ``download/`` or ``share/`` by id.
+    """
+
+    content_hash = HashField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True, format=None)
+
+    class Meta(FileVersionSerializer.Meta):
+        fields = [field for field in FileVersionSerializer.Meta.fields if field != "shareable_link"]
+
+class SearchResultSerializer(FileVersionSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(FileVersionSerializer.Meta):
+        fields = FileVersionSerializer.Meta.fields + ["rank"]
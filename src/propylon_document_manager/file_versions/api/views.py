@@ -1,3 +1,10 @@
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import render
 
 from rest_framework.mixins import (
@@ -11,24 +18,74 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
 from propylon_document_manager.file_versions.models.file_version import FileVersion
 from propylon_document_manager.file_versions.models.file import File
-from .serializers import FileVersionSerializer
-import hashlib
+from propylon_document_manager.file_versions.diffing import MODES as DIFF_MODES, diff_summary, stream_diff
+from propylon_document_manager.file_versions.hash_filter import might_exist, possibly_stored
+from propylon_document_manager.file_versions.hashing import digest_upload
+from propylon_document_manager.file_versions.paths import normalize_directory, normalize_path
+from propylon_document_manager.file_versions.queue import enqueue_on_commit
+from propylon_document_manager.file_versions.search import (
+    SCOPE_LATEST, SCOPES, is_text_type, search as search_documents
+)
+from propylon_document_manager.file_versions.sharing import link_expiry, share_url
+from propylon_document_manager.utils.metrics import HASH_LATENCY, UPLOAD_BYTES, UPLOAD_DEDUP
+from propylon_document_manager.utils.query_budget import extend_budget
+from propylon_document_manager.utils.tracing import TracedViewMixin, span
+from .filters import FileVersionMetadataFilter
+from .renderers import MessagePackParser, MessagePackRenderer, NDJSONRenderer, iter_ndjson
+from .pagination import PathCursorPagination, SearchPagination
+from .serializers import (
+    CompactFileVersionSerializer, FileVersionSerializer, HashField, HashListSerializer, SearchResultSerializer
+)
 
 permission_classes = [IsAuthenticated]
+# Read size when a download is streamed through Python (Django's default is 4 KiB).
+DOWNLOAD_BLOCK_SIZE = 256 * 1024
 
 class FileVersionViewSet(
-    RetrieveModelMixin, ListModelMixin, CreateModelMixin,
+    TracedViewMixin, RetrieveModelMixin, ListModelMixin, CreateModelMixin,
     UpdateModelMixin, DestroyModelMixin, GenericViewSet
 ):
     serializer_class = FileVersionSerializer
     queryset = FileVersion.objects.all()
     lookup_field = "id"
+    filter_backends = [FileVersionMetadataFilter]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer, MessagePackRenderer]
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, MessagePackParser]
+    # Queries per request, authentication included (see utils.query_budget).
+    query_budgets = {
+        "list": 3,
+        "retrieve": 3,
+        "share": 3,
+        "download": 3,
+        "by_hash": 3,
+        # Plus one per extra batch of hashes.
+        "by_hashes": 3,
+        "latest": 3,
+        "search": 4,
+        "diff": 3,
+    }
 
     def get_queryset(self):
-        return FileVersion.objects.filter(user=self.request.user)
+        return FileVersion.objects.filter(user=self.request.user).select_related("file_obj", "user")
+
+    def get_serializer_class(self):
+        if isinstance(getattr(self.request, "accepted_renderer", None), MessagePackRenderer):
+            return CompactFileVersionSerializer
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, NDJSONRenderer):
+            return super().list(request, *args, **kwargs)
+        # Exports: stream every matching version, one JSON object per line.
+        queryset = self.filter_queryset(self.get_queryset()).order_by("pk")
+        rows = iter_ndjson(
+            queryset, self.get_serializer_class(), self.get_serializer_context(), settings.NDJSON_CHUNK_SIZE
+        )
+        return StreamingHttpResponse(rows, content_type=NDJSONRenderer.media_type)
 
     def perform_create(self, serializer):
         file_name = self.request.data.get("file_name")
@@ -41,72 +98,269 @@ class FileVersionViewSet(
         
         if "file" not in self.request.FILES:
             raise serializers.ValidationError({"file": "This field is required."})
+        file_name = normalize_path(file_name)
         
-        file_obj, created = File.objects.get_or_create(
-            name=file_name,
-            user=self.request.user
-        )
-
         uploaded_file = self.request.FILES["file"]
-        sha256 = hashlib.sha256()
-        for chunk in uploaded_file.chunks():
-            sha256.update(chunk)
-        content_hash = sha256.hexdigest()
-
-        existing_version = FileVersion.objects.filter(
-            file_obj=file_obj,
-            user=self.request.user,
-            content_hash=content_hash
-        ).first()
-        if existing_version:
-            serializer = self.get_serializer(existing_version, context={"request": self.request})
-            raise serializers.ValidationError(serializer.data)
+        with HASH_LATENCY.time(), span("hash"):
+            digest = digest_upload(uploaded_file, name=file_name)
+        content_hash = digest.content_hash
+        UPLOAD_BYTES.observe(digest.size)
 
-        latest_version = FileVersion.objects.filter(file_obj=file_obj).order_by("-version_number").first()
-        next_version = 1 if not latest_version else latest_version.version_number + 1
+        with transaction.atomic():
+            # Lock the file row so concurrent uploads get distinct version numbers.
+            file_obj, created = File.objects.select_for_update(of=("self",)).select_related(
+                "latest_version"
+            ).get_or_create(
+                name=file_name,
+                user=self.request.user
+            )
 
-        existing_file_version = FileVersion.objects.filter(content_hash=content_hash).first()
-        if existing_file_version:
-            serializer.save(
-                user=self.request.user,
+            # Checked whatever the hash filter says, so a stale filter never lets a duplicate through.
+            existing_version = FileVersion.objects.filter(
                 file_obj=file_obj,
-                version_number=next_version,
-                content_hash=content_hash,
-                file=existing_file_version.file
-            )
-        else:
-            serializer.save(
                 user=self.request.user,
-                file_obj=file_obj,
-                version_number=next_version,
                 content_hash=content_hash
+            ).first()
+            if existing_version:
+                serializer = self.get_serializer(existing_version, context={"request": self.request})
+                raise serializers.ValidationError(serializer.data)
+
+            latest_version = file_obj.latest_version
+            next_version = 1 if not latest_version else latest_version.version_number + 1
+
+            # Content the hash filter has never seen is stored rather than deduplicated.
+            existing_file_version = (
+                FileVersion.objects.filter(content_hash=content_hash).first() if might_exist(content_hash) else None
             )
+            UPLOAD_DEDUP.inc(result="hit" if existing_file_version else "miss")
+            if existing_file_version:
+                serializer.save(
+                    user=self.request.user,
+                    file_obj=file_obj,
+                    version_number=next_version,
+                    content_hash=content_hash,
+                    size=digest.size,
+                    mime_type=digest.mime_type,
+                    tree_hash=digest.tree_hash or existing_file_version.tree_hash,
+                    file=existing_file_version.file
+                )
+            else:
+                serializer.save(
+                    user=self.request.user,
+                    file_obj=file_obj,
+                    version_number=next_version,
+                    content_hash=content_hash,
+                    size=digest.size,
+                    mime_type=digest.mime_type,
+                    tree_hash=digest.tree_hash
+                )
+                for task_name in ("file_versions.verify_blob", "file_versions.index_text"):
+                    enqueue_on_commit(task_name, {"content_hash": content_hash}, idempotency_key=content_hash)
 
     @action(detail=True, methods=["get"])
     def share(self, request, id=None):
+        """
+        Signed link that downloads this version without authentication until
+        it expires. ``expires_in`` (seconds) defaults to ``SHARE_LINK_TTL``
+        and is capped at ``SHARE_LINK_MAX_TTL``.
+        """
+        ttl = request.query_params.get("expires_in")
+        if ttl is not None:
+            try:
+                ttl = int(ttl)
+            except ValueError:
+                raise serializers.ValidationError({"expires_in": "Must be a number of seconds."})
+            if ttl <= 0:
+                raise serializers.ValidationError({"expires_in": "Must be a positive number of seconds."})
         file_version = self.get_object()
         if file_version.file:
-            link = request.build_absolute_uri(file_version.file.url)
-            return Response({"shareable_link": link})
+            expires = link_expiry(ttl)
+            return Response({
+                "shareable_link": share_url(request, file_version, expires),
+                "expires_at": datetime.fromtimestamp(expires, tz=timezone.utc),
+            })
         return Response({"shareable_link": None}, status=404)
 
+    @action(detail=True, methods=["get"])
+    def download(self, request, id=None):
+        file_version = self.get_object()
+        if not file_version.file:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        latest_id = file_version.file_obj.latest_version_id
+        if latest_id != file_version.pk and hasattr(file_version.file.storage, "prefetch"):
+            # Someone reading an old version is likely to want the latest next.
+            # The key limits this to one prefetch per version and hour.
+            enqueue_on_commit(
+                "file_versions.prefetch_version",
+                {"file_version_id": latest_id},
+                idempotency_key="%s:%s" % (latest_id, int(time.time()) // 3600)
+            )
+        # Local blobs keep their file descriptor, so servers with a
+        # wsgi.file_wrapper send them with os.sendfile.
+        response = FileResponse(
+            file_version.file.open("rb"),
+            as_attachment=True,
+            filename=file_version.file_obj.name.rpartition("/")[2],
+            content_type=file_version.mime_type or None
+        )
+        response.block_size = DOWNLOAD_BLOCK_SIZE
+        return response
+
     @action(detail=False, methods=["get"], url_path="by_hash/(?P<content_hash>[0-9a-fA-F]{64})")
     def by_hash(self, request, content_hash=None):
-        try:
-            file_version = FileVersion.objects.get(content_hash=content_hash, user=request.user)
-        except FileVersion.DoesNotExist:
+        content_hash = content_hash.lower()
+        # Several versions can share the content; answer with the newest.
+        file_version = self.get_queryset().filter(
+            content_hash=content_hash
+        ).order_by("-created_at", "-pk").first() if might_exist(content_hash) else None
+        if file_version is None:
             return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
         serializer = self.get_serializer(file_version, context={"request": request})
         return Response(serializer.data)
 
-class FileByPathView(APIView):
+    @action(detail=False, methods=["post"], url_path="by_hashes")
+    def by_hashes(self, request):
+        """
+        Versions for many content hashes at once: ``{"hashes": [...]}`` up to
+        ``BATCH_LOOKUP_MAX_HASHES``. Answers ``found`` (versions grouped by
+        hash, oldest first) and ``missing``. Hashes are looked up with one
+        ``IN`` query per batch of as many as the database takes parameters.
+        """
+        hashes = HashListSerializer(data=request.data)
+        hashes.is_valid(raise_exception=True)
+        hashes = hashes.validated_data["hashes"]
+
+        candidates = possibly_stored(hashes)
+        queryset = self.get_queryset()
+        # One parameter goes to the user filter.
+        max_params = connections[queryset.db].features.max_query_params
+        batch_size = max_params - 1 if max_params else max(1, len(candidates))
+        batches = [candidates[start:start + batch_size] for start in range(0, len(candidates), batch_size)]
+        extend_budget(request, max(0, len(batches) - 1))
+
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        found = {}
+        for batch in batches:
+            versions = list(queryset.filter(content_hash__in=batch).order_by("content_hash", "created_at", "pk"))
+            rows = serializer_class(versions, many=True, context=context).data
+            for version, row in zip(versions, rows):
+                found.setdefault(version.content_hash, []).append(row)
+        encode = HashField().to_representation if issubclass(serializer_class, CompactFileVersionSerializer) else str
+        return Response({
+            "found": {encode(content_hash): rows for content_hash, rows in found.items()},
+            "missing": [encode(content_hash) for content_hash in hashes if content_hash not in found],
+        })
+
+    @action(detail=False, methods=["get"], url_path="search")
+    def search(self, request):
+        query = request.query_params.get("q", "").strip()
+        scope = request.query_params.get("scope", SCOPE_LATEST)
+        if not query:
+            raise serializers.ValidationError({"q": "This query parameter is required."})
+        if scope not in SCOPES:
+            raise serializers.ValidationError({"scope": "Must be one of: %s." % ", ".join(SCOPES)})
+
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(search_documents(request.user, query, scope), request, view=self)
+        serializer = SearchResultSerializer(page, many=True, context={"request": request})
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"], url_path="diff")
+    def diff(self, request):
+        """
+        Diff of two versions of the file at ``path``: ``from`` and ``to`` are
+        version numbers, ``mode`` is ``line`` (default) or ``word``. Streams
+        ``text/x-diff``; versions over ``DIFF_MAX_BYTES`` get a JSON summary.
+        """
+        errors = {}
+        path = request.query_params.get("path")
+        if not path:
+            errors["path"] = "This query parameter is required."
+        numbers = {}
+        for key in ("from", "to"):
+            try:
+                numbers[key] = int(request.query_params[key])
+            except (KeyError, ValueError):
+                errors[key] = "A version number is required."
+        mode = request.query_params.get("mode", "line")
+        if mode not in DIFF_MODES:
+            errors["mode"] = "Must be one of: %s." % ", ".join(DIFF_MODES)
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        try:
+            name = normalize_path(path)
+        except ValueError as exc:
+            raise serializers.ValidationError({"path": str(exc)})
+        versions = {
+            version.version_number: version
+            for version in self.get_queryset().filter(
+                file_obj__name=name, version_number__in=numbers.values()
+            )
+        }
+        if any(number not in versions for number in numbers.values()):
+            return Response({"detail": "Version not found."}, status=status.HTTP_404_NOT_FOUND)
+        old, new = versions[numbers["from"]], versions[numbers["to"]]
+
+        if not (is_text_type(old.mime_type) and is_text_type(new.mime_type)):
+            return Response(
+                {"detail": "Only text versions can be diffed."}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        if old.size + new.size > settings.DIFF_MAX_BYTES:
+            return Response(diff_summary(old, new))
+        return StreamingHttpResponse(stream_diff(old, new, mode), content_type="text/x-diff; charset=utf-8")
+
+    @action(detail=False, methods=["get"], url_path="latest")
+    def latest(self, request):
+        """
+        Latest version of each file, optionally restricted with ``prefix``,
+        ``glob`` or ``dir`` (immediate children of a directory only). ``dir``
+        listings also name the directory's subdirectories in ``directories``.
+        """
+        params = {key: request.query_params[key] for key in ("prefix", "glob", "dir") if key in request.query_params}
+        if len(params) > 1:
+            raise serializers.ValidationError({"detail": "Use only one of prefix, glob or dir."})
+
+        files = File.objects.filter(user=request.user)
+        directories = None
+        try:
+            if "prefix" in params:
+                files = files.with_prefix(params["prefix"].lstrip("/"))
+            elif "glob" in params:
+                files = files.matching_glob(params["glob"].lstrip("/"))
+            elif "dir" in params:
+                directory = normalize_directory(params["dir"])
+                directories = files.subdirectories(directory)
+                files = files.in_directory(directory)
+        except ValueError as exc:
+            raise serializers.ValidationError({next(iter(params)): str(exc)})
+
+        queryset = FileVersion.objects.filter(
+            file_obj__in=files,
+            file_obj__latest_version=F("pk")
+        ).annotate(path=F("file_obj__name")).select_related("file_obj", "user")
+        queryset = self.filter_queryset(queryset)
+
+        paginator = PathCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        if directories is not None:
+            response.data["directories"] = directories
+        return response
+
+class FileByPathView(TracedViewMixin, APIView):
     permission_classes = [IsAuthenticated]
+    query_budgets = {"get": 3}
 
     def get(self, request, file_path):
         revision = request.query_params.get("revision")
         try:
-            file_obj = File.objects.get(name=file_path, user=request.user)
-        except File.DoesNotExist:
+            file_obj = File.objects.select_related(
+                "latest_version__file_obj", "latest_version__user"
+            ).get(name=normalize_path(file_path), user=request.user)
+        except (File.DoesNotExist, ValueError):
             return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
 
         if revision is not None:
@@ -116,7 +370,7 @@ class FileByPathView(APIView):
             except (IndexError, ValueError):
                 return Response({"detail": "Revision not found."}, status=status.HTTP_404_NOT_FOUND)
         else:
-            file_version = file_obj.versions.order_by("-version_number").first()
+            file_version = file_obj.latest_version
 
         serializer = FileVersionSerializer(file_version, context={"request": request})
         return Response(serializer.data)
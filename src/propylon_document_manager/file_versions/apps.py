@@ -5,3 +5,12 @@ class FileVersionsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "propylon_document_manager.file_versions"
     verbose_name = "File Versions"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from propylon_document_manager.utils.db import configure_connection
+
+        from . import signals, tasks  # noqa: F401
+
+        connection_created.connect(configure_connection, dispatch_uid="configure_connection")
@@ -0,0 +1,90 @@
+"""
+Reference counting for content-addressed blobs.
+
+Versions with the same content share one stored blob, so a blob is
+referenced by every ``FileVersion`` row pointing at its storage name. Those
+rows are found through the ``content_hash`` index; there is no separate
+counter to keep in step with uploads, the loader and deletions.
+
+``release_blobs`` is given the blobs of deleted versions. It drops extracted
+text for hashes no version has any more and records storage names no
+version references as ``ReleasedBlob`` rows. Deleting them right away would
+race with an upload that has picked the blob for deduplication but not yet
+committed, so ``delete_released_blobs`` (run by ``apply_retention``) only
+deletes blobs released longer than a grace period ago, checking their
+references again first. Packed blobs lose their ``PackEntry`` and their
+bytes are reclaimed by ``repack_blobs``.
+"""
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models.document_text import DocumentText
+from .models.file_version import FileVersion
+from .models.released_blob import ReleasedBlob
+
+logger = logging.getLogger(__name__)
+
+
+def referenced_names(content_hashes):
+    return set(
+        FileVersion.objects.filter(content_hash__in=content_hashes).values_list("file", flat=True).distinct()
+    )
+
+
+def release_blobs(released):
+    """
+    ``released`` maps content hashes to the storage names of deleted versions.
+    Returns the names no version references any more, which are deleted from
+    storage after the grace period.
+    """
+    hashes = list(released)
+    remaining_hashes = set(
+        FileVersion.objects.filter(content_hash__in=hashes).values_list("content_hash", flat=True).distinct()
+    )
+    DocumentText.objects.filter(content_hash__in=[h for h in hashes if h not in remaining_hashes]).delete()
+
+    in_use = referenced_names(hashes)
+    orphans = {name: content_hash for content_hash, names in released.items() for name in names if name}
+    orphans = {name: content_hash for name, content_hash in orphans.items() if name not in in_use}
+    if orphans:
+        # Released again: the grace period starts over.
+        ReleasedBlob.objects.bulk_create(
+            [ReleasedBlob(name=name, content_hash=content_hash) for name, content_hash in orphans.items()],
+            update_conflicts=True,
+            unique_fields=["name"],
+            update_fields=["released_at"],
+        )
+    return set(orphans)
+
+
+def delete_released_blobs(grace=timedelta(hours=1), batch_size=500, dry_run=False):
+    """
+    Delete blobs released more than ``grace`` ago that no version references
+    (again). Returns how many were, or would be, deleted.
+    """
+    storage = FileVersion._meta.get_field("file").storage
+    cutoff = timezone.now() - grace
+    deleted = 0
+    last_pk = 0
+    while True:
+        batch = list(ReleasedBlob.objects.filter(pk__gt=last_pk, released_at__lt=cutoff).order_by("pk")[:batch_size])
+        if not batch:
+            return deleted
+        last_pk = batch[-1].pk
+        in_use = referenced_names({blob.content_hash for blob in batch})
+        for blob in batch:
+            if blob.name in in_use:
+                continue
+            deleted += 1
+            if dry_run:
+                continue
+            try:
+                storage.delete(blob.name)
+            except OSError:
+                logger.exception("Could not delete blob %s", blob.name)
+        if not dry_run:
+            # Unreferenced or referenced again, they are done with either way;
+            # failed deletes are retried when a later release records them.
+            ReleasedBlob.objects.filter(pk__in=[blob.pk for blob in batch]).delete()
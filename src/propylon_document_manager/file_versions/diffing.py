@@ -0,0 +1,139 @@
+"""
+Text diffs between two versions of a file.
+
+A diff depends only on the two blobs, so its hunks are cached under the pair
+of content hashes (and the mode) and never invalidated; only the ``---`` /
+``+++`` header naming the versions is produced per request. Output is
+generated and streamed hunk by hunk, then cached (compressed) if it fits in
+``settings.DIFF_CACHE_MAX_BYTES``.
+
+Versions whose combined size exceeds ``settings.DIFF_MAX_BYTES`` are not
+diffed at all; the view answers with a summary instead, so one request
+cannot pull two huge blobs into memory.
+
+Modes:
+
+- ``line``: unified diff hunks (``-``/``+``/`` `` prefixed lines).
+- ``word``: the same hunks, with changed lines rendered once with inline
+  ``[-removed-]{+added+}`` markers, like ``git diff --word-diff=plain``.
+"""
+import difflib
+import re
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+MODES = ("line", "word")
+STREAM_CHUNK = 64 * 1024
+
+_token_re = re.compile(r"\s+|\S+")
+
+
+def cache_key(old_hash, new_hash, mode):
+    return f"diff:{mode}:{old_hash}:{new_hash}"
+
+
+def read_text(file_version):
+    with file_version.file.open("rb") as blob:
+        data = blob.read()
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def hunk_header(group):
+    first, last = group[0], group[-1]
+    old_start, old_count = first[1], last[2] - first[1]
+    new_start, new_count = first[3], last[4] - first[3]
+    # Empty ranges point at the line before, as in unified diff.
+    return "@@ -%d,%d +%d,%d @@\n" % (
+        old_start + 1 if old_count else old_start, old_count,
+        new_start + 1 if new_count else new_start, new_count,
+    )
+
+
+def inline_words(old_lines, new_lines):
+    old_tokens = _token_re.findall("\n".join(old_lines))
+    new_tokens = _token_re.findall("\n".join(new_lines))
+    parts = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False).get_opcodes():
+        if tag == "equal":
+            parts.append("".join(old_tokens[i1:i2]))
+            continue
+        if i1 < i2:
+            parts.append("[-%s-]" % "".join(old_tokens[i1:i2]))
+        if j1 < j2:
+            parts.append("{+%s+}" % "".join(new_tokens[j1:j2]))
+    return "".join(parts) + "\n"
+
+
+def iter_hunks(old_text, new_text, mode="line", context=3):
+    """Yield the diff of two texts hunk by hunk."""
+    old_lines, new_lines = old_text.splitlines(), new_text.splitlines()
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for group in matcher.get_grouped_opcodes(context):
+        lines = [hunk_header(group)]
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line + "\n" for line in old_lines[i1:i2])
+            elif mode == "word":
+                lines.append(inline_words(old_lines[i1:i2], new_lines[j1:j2]))
+            else:
+                lines.extend("-" + line + "\n" for line in old_lines[i1:i2])
+                lines.extend("+" + line + "\n" for line in new_lines[j1:j2])
+        yield "".join(lines)
+
+
+def stream_diff(old_version, new_version, mode="line"):
+    """Yield the encoded diff of two versions in chunks, from the cache when possible."""
+    name = old_version.file_obj.name
+    yield ("--- %s@%s\n+++ %s@%s\n" % (
+        name, old_version.version_number, name, new_version.version_number
+    )).encode()
+
+    key = cache_key(old_version.content_hash, new_version.content_hash, mode)
+    cached = cache.get(key)
+    if cached is not None:
+        body = zlib.decompress(cached)
+        for offset in range(0, len(body), STREAM_CHUNK):
+            yield body[offset:offset + STREAM_CHUNK]
+        return
+
+    compressor = zlib.compressobj()
+    compressed = []
+    compressed_size = 0
+    pending = []
+    pending_size = 0
+    hunks = iter_hunks(read_text(old_version), read_text(new_version), mode)
+    for hunk in hunks:
+        data = hunk.encode()
+        if compressed is not None:
+            compressed.append(compressor.compress(data))
+            compressed_size += len(compressed[-1])
+            if compressed_size > settings.DIFF_CACHE_MAX_BYTES:
+                compressed = None
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= STREAM_CHUNK:
+            yield b"".join(pending)
+            pending, pending_size = [], 0
+    if pending:
+        yield b"".join(pending)
+    if compressed is not None:
+        compressed.append(compressor.flush())
+        cache.set(key, b"".join(compressed), timeout=None)
+
+
+def diff_summary(old_version, new_version):
+    return {
+        "detail": "Versions are too large to diff; showing a summary.",
+        "path": old_version.file_obj.name,
+        "from": {"version": old_version.version_number, "size": old_version.size,
+                 "content_hash": old_version.content_hash},
+        "to": {"version": new_version.version_number, "size": new_version.size,
+               "content_hash": new_version.content_hash},
+        "identical": old_version.content_hash == new_version.content_hash,
+        "max_bytes": settings.DIFF_MAX_BYTES,
+    }
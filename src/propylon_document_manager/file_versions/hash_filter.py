@@ -0,0 +1,353 @@
+"""
+Probabilistic "does this content hash exist?" checks.
+
+Dedup on upload, ``by_hash`` and ``by_hashes`` mostly ask about content that
+is not stored yet. A Bloom filter of every stored ``content_hash`` answers
+"definitely not" without a query; only a "maybe" goes to the database. Its
+bit positions are slices of the SHA-256 itself, so checks do not hash again.
+The filter is configured with ``settings.HASH_FILTER`` and is off when no
+backend is set:
+
+- ``LocalHashFilter`` keeps the filter in process memory. It starts from the
+  dump at ``dump_path`` (or builds it from the database and writes the
+  dump). Versions created in the process are added when they commit. Every
+  ``refresh_seconds`` it adds the rows other processes created since, with
+  one range query on the primary key, and reloads the dump once it has been
+  rebuilt. Another worker's upload can be reported missing for up to
+  ``refresh_seconds``, like a read from a lagging replica.
+- ``RedisHashFilter`` keeps the bits in a Redis bitmap shared by all workers,
+  so additions are seen everywhere at once. A check is one round trip. If
+  Redis is unreachable, every hash is a "maybe" and lookups go to the
+  database.
+
+Deleted versions leave their bits set until the next rebuild. That only
+costs a query. Run ``django-admin rebuild_hash_filter`` periodically (e.g.
+nightly) to drop them and to resize the filter as the corpus grows.
+"""
+import logging
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models.file_version import FileVersion
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {"BACKEND": "", "OPTIONS": {}}
+MAGIC = b"PDMBLOOM1"
+HEADER = struct.Struct(">QIQ")
+
+_filter = None
+
+
+class BloomFilter:
+    """
+    Bloom filter over SHA-256 hex digests. Bits are numbered from the most
+    significant bit of the first byte, the layout of a Redis bitmap.
+    """
+
+    def __init__(self, size_bits, hash_count, bits=None):
+        self.size_bits = size_bits
+        self.hash_count = hash_count
+        self.bits = bytearray((size_bits + 7) // 8) if bits is None else bytearray(bits)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate):
+        capacity = max(1, capacity)
+        size_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        hash_count = max(1, round(size_bits / capacity * math.log(2)))
+        return cls(size_bits, hash_count)
+
+    def positions(self, content_hash):
+        digest = bytes.fromhex(content_hash)
+        first = int.from_bytes(digest[:8], "big")
+        step = int.from_bytes(digest[8:16], "big") | 1
+        return [(first + index * step) % self.size_bits for index in range(self.hash_count)]
+
+    def add(self, content_hash):
+        for position in self.positions(content_hash):
+            self.bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def __contains__(self, content_hash):
+        bits = self.bits
+        return all(bits[position >> 3] & (0x80 >> (position & 7)) for position in self.positions(content_hash))
+
+    def dumps(self, watermark=0):
+        return MAGIC + HEADER.pack(self.size_bits, self.hash_count, watermark) + bytes(self.bits)
+
+    @classmethod
+    def loads(cls, data):
+        """A filter and the ``FileVersion`` pk to catch up from (see ``catch_up``)."""
+        if not data.startswith(MAGIC):
+            raise ValueError("Not a hash filter dump.")
+        size_bits, hash_count, watermark = HEADER.unpack_from(data, len(MAGIC))
+        bits = data[len(MAGIC) + HEADER.size:]
+        if len(bits) != (size_bits + 7) // 8:
+            raise ValueError("Truncated hash filter dump.")
+        return cls(size_bits, hash_count, bits), watermark
+
+
+def catch_up(add, since, window):
+    """
+    Pass the hashes of versions with a pk above ``since`` to ``add``. Returns
+    the pk to continue from: the highest pk created more than ``window``
+    seconds ago. Rows inside the window are read again next time, so rows
+    committed out of pk order within ``window`` are not missed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=window)
+    watermark = since
+    rows = FileVersion.objects.filter(pk__gt=since).order_by("pk").values_list("pk", "content_hash", "created_at")
+    for pk, content_hash, created_at in rows.iterator(chunk_size=10000):
+        add(content_hash)
+        if created_at < cutoff:
+            watermark = pk
+    return watermark
+
+
+def build_filter(capacity, error_rate, window):
+    """A filter of every stored content hash, and the pk to catch up from."""
+    count = FileVersion.objects.values("content_hash").distinct().count()
+    # Leave room to grow until the next rebuild.
+    bloom = BloomFilter.for_capacity(max(capacity, 2 * count), error_rate)
+    return bloom, catch_up(bloom.add, 0, window)
+
+
+def write_dump(path, bloom, watermark):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=".hash-filter-", delete=False) as fh:
+        fh.write(bloom.dumps(watermark))
+    os.replace(fh.name, path)
+
+
+def read_dump(path):
+    with open(path, "rb") as fh:
+        return BloomFilter.loads(fh.read())
+
+
+class LocalHashFilter:
+    """The filter in process memory, shared by the threads of one worker."""
+
+    def __init__(self, dump_path="", capacity=1_000_000, error_rate=0.001, refresh_seconds=1.0, window=60):
+        self.dump_path = dump_path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_seconds = refresh_seconds
+        self.window = window
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._watermark = 0
+        self._dump_mtime = None
+        self._refreshed_at = 0.0
+
+    def _dump_stat(self):
+        try:
+            return os.stat(self.dump_path).st_mtime_ns if self.dump_path else None
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        mtime = self._dump_stat()
+        if mtime is not None:
+            try:
+                self._bloom, self._watermark = read_dump(self.dump_path)
+                self._dump_mtime = mtime
+                self._refreshed_at = 0.0
+                return
+            except (OSError, ValueError):
+                logger.warning("Ignoring unreadable hash filter dump %s", self.dump_path, exc_info=True)
+        self._rebuild()
+
+    def _refresh(self):
+        if self._bloom is None:
+            self._load()
+        now = time.monotonic()
+        if now - self._refreshed_at < self.refresh_seconds:
+            return
+        if self._dump_stat() not in (None, self._dump_mtime):
+            # Rebuilt by another process: drops the hashes of deleted versions.
+            self._load()
+        self._watermark = catch_up(self._bloom.add, self._watermark, self.window)
+        self._refreshed_at = now
+
+    def might_exist_many(self, content_hashes):
+        with self._lock:
+            self._refresh()
+            return [content_hash in self._bloom for content_hash in content_hashes]
+
+    def add(self, content_hashes):
+        with self._lock:
+            if self._bloom is not None:
+                for content_hash in content_hashes:
+                    self._bloom.add(content_hash)
+
+    def _rebuild(self):
+        bloom, watermark = build_filter(self.capacity, self.error_rate, self.window)
+        if self.dump_path:
+            write_dump(self.dump_path, bloom, watermark)
+            self._dump_mtime = self._dump_stat()
+        self._bloom, self._watermark = bloom, watermark
+        self._refreshed_at = time.monotonic()
+        return bloom
+
+    def rebuild(self):
+        with self._lock:
+            return self._rebuild()
+
+
+class RedisHashFilter:
+    """
+    The filter as a Redis bitmap under ``key``, its shape in ``<key>:meta``.
+    Requires the ``redis`` package.
+    """
+
+    def __init__(
+        self, url, key="file_versions:hash_filter", dump_path="", capacity=1_000_000, error_rate=0.001, window=60
+    ):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.errors = (redis.RedisError,)
+        self.key = key
+        self.meta_key = key + ":meta"
+        self.dump_path = dump_path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self._shape = None
+
+    def _read_shape(self, meta):
+        if None in meta:
+            return None
+        return BloomFilter(int(meta[0]), int(meta[1]), bits=b"")
+
+    def _seed(self):
+        """Publish the dump, or a filter built from the database; one worker at a time."""
+        if not self.client.set(self.key + ":seeding", 1, nx=True, ex=600):
+            return
+        try:
+            if self.dump_path and os.path.exists(self.dump_path):
+                bloom, watermark = read_dump(self.dump_path)
+            else:
+                bloom, watermark = build_filter(self.capacity, self.error_rate, self.window)
+            self.publish(bloom, watermark)
+        finally:
+            self.client.delete(self.key + ":seeding")
+
+    def might_exist_many(self, content_hashes):
+        try:
+            for _ in range(2):
+                shape = self._shape
+                if shape is None:
+                    shape = self._shape = self._read_shape(self.client.hmget(self.meta_key, "size_bits", "hash_count"))
+                    if shape is None:
+                        # Nothing published yet: seed it and answer "maybe" meanwhile.
+                        self._seed()
+                        return [True] * len(content_hashes)
+                pipeline = self.client.pipeline(transaction=False)
+                pipeline.hmget(self.meta_key, "size_bits", "hash_count")
+                for content_hash in content_hashes:
+                    for position in shape.positions(content_hash):
+                        pipeline.getbit(self.key, position)
+                meta, *bits = pipeline.execute()
+                current = self._read_shape(meta)
+                if current is not None and (current.size_bits, current.hash_count) == (
+                    shape.size_bits, shape.hash_count
+                ):
+                    count = shape.hash_count
+                    return [all(bits[start:start + count]) for start in range(0, len(bits), count)]
+                # Rebuilt with another size since the shape was cached.
+                self._shape = current
+        except self.errors:
+            logger.warning("Hash filter unavailable, falling back to the database", exc_info=True)
+        return [True] * len(content_hashes)
+
+    def add(self, content_hashes):
+        try:
+            shape = self._read_shape(self.client.hmget(self.meta_key, "size_bits", "hash_count"))
+            if shape is None:
+                # The seeding worker reads these rows from the database.
+                return
+            pipeline = self.client.pipeline(transaction=False)
+            for content_hash in content_hashes:
+                for position in shape.positions(content_hash):
+                    pipeline.setbit(self.key, position, 1)
+            pipeline.execute()
+        except self.errors:
+            # A missing bit would hide these hashes; drop the filter so it is seeded again.
+            logger.exception("Could not add to the hash filter; discarding it")
+            try:
+                self.client.delete(self.key, self.meta_key)
+            except self.errors:
+                pass
+
+    def publish(self, bloom, watermark):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.set(self.key + ":next", bytes(bloom.bits))
+        pipeline.rename(self.key + ":next", self.key)
+        pipeline.hset(self.meta_key, mapping={"size_bits": bloom.size_bits, "hash_count": bloom.hash_count})
+        pipeline.execute()
+        self._shape = BloomFilter(bloom.size_bits, bloom.hash_count, bits=b"")
+        # Versions committed while the filter was built added their bits to
+        # the old bitmap; add them again.
+        hashes = []
+        catch_up(hashes.append, watermark, self.window)
+        self.add(hashes)
+
+    def rebuild(self):
+        bloom, watermark = build_filter(self.capacity, self.error_rate, self.window)
+        if self.dump_path:
+            write_dump(self.dump_path, bloom, watermark)
+        self.publish(bloom, watermark)
+        return bloom
+
+
+def hash_filter_settings():
+    return {**DEFAULTS, **getattr(settings, "HASH_FILTER", {})}
+
+
+def get_hash_filter():
+    """The configured filter, or None when it is disabled."""
+    global _filter
+    if _filter is None:
+        config = hash_filter_settings()
+        if not config["BACKEND"]:
+            return None
+        _filter = import_string(config["BACKEND"])(**config["OPTIONS"])
+    return _filter
+
+
+def reset_hash_filter():
+    global _filter
+    _filter = None
+
+
+def might_exist(content_hash):
+    """False only if no version has ``content_hash``."""
+    return bool(possibly_stored([content_hash]))
+
+
+def possibly_stored(content_hashes):
+    """``content_hashes`` without those no version has, in one filter round trip."""
+    hash_filter = get_hash_filter()
+    content_hashes = list(content_hashes)
+    if hash_filter is None or not content_hashes:
+        return content_hashes
+    return [h for h, maybe in zip(content_hashes, hash_filter.might_exist_many(content_hashes)) if maybe]
+
+
+def record_hashes(content_hashes):
+    """Add ``content_hashes`` once the current transaction commits."""
+    hash_filter = get_hash_filter()
+    if hash_filter is not None:
+        content_hashes = list(content_hashes)
+        transaction.on_commit(lambda: hash_filter.add(content_hashes))
@@ -0,0 +1,228 @@
+"""
+Content hashing for uploads.
+
+``content_hash`` is always the hex SHA-256 of the whole blob. Uploads larger
+than ``settings.HASH_PARALLEL_THRESHOLD`` are hashed off the request thread
+and also get a tree hash: the blob is cut into ``TREE_HASH_CHUNK_SIZE``
+blocks, each block is hashed on a worker thread and the root is the SHA-256
+of the concatenated block digests. Block hashes are independent, so a tree
+hash can be computed or verified on all cores, and a single block can be
+checked without reading the rest of the blob. hashlib releases the GIL for
+buffers over 2 KiB, so threads are enough to keep several cores busy.
+
+Local files and in-memory uploads are hashed from a memoryview of their
+bytes (see file_versions.mapped); blocks are slices of it rather than copies.
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .mapped import blob_view, iter_view
+
+SNIFF_BYTES = 2048
+
+UploadDigest = namedtuple("UploadDigest", ["content_hash", "size", "mime_type", "tree_hash"], defaults=[""])
+
+
+class TreeDigest(namedtuple("TreeDigest", ["root", "chunk_size", "leaves"])):
+    """Root and per-block digests of a tree hash."""
+
+    def encode(self):
+        """Stored form: the block size is kept with the root so it can be recomputed."""
+        return f"{self.chunk_size}:{self.root}"
+
+
+def parse_tree_hash(value):
+    """Return ``(chunk_size, root)`` from a stored tree hash."""
+    chunk_size, _, root = value.partition(":")
+    return int(chunk_size), root
+
+# (offset, signature, mime type), checked in order.
+MAGIC_NUMBERS = [
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"{\\rtf", "application/rtf"),
+    (0, b"\x1f\x8b", "application/gzip"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),
+    (0, b"PK\x03\x04", "application/zip"),
+    (257, b"ustar", "application/x-tar"),
+]
+# Containers whose real type is better told apart by extension (docx, xlsx, odt, doc, ...).
+CONTAINER_TYPES = {"application/zip", "application/x-ole-storage"}
+
+
+def looks_like_text(head):
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # A multi-byte character may be cut off at the end of the sample.
+        return exc.start >= len(head) - 3
+    return True
+
+
+def detect_mime_type(head, name=""):
+    """Guess a MIME type from the first bytes of a blob, falling back to its name."""
+    guessed, _ = mimetypes.guess_type(name or "")
+    for offset, signature, mime_type in MAGIC_NUMBERS:
+        if head[offset:offset + len(signature)] == signature:
+            if mime_type in CONTAINER_TYPES and guessed:
+                return guessed
+            return mime_type
+    if guessed:
+        return guessed
+    stripped = head.lstrip()
+    if stripped.startswith(b"<?xml"):
+        return "application/xml"
+    if stripped[:15].lower().startswith((b"<!doctype html", b"<html")):
+        return "text/html"
+    if head and looks_like_text(head):
+        return "text/plain"
+    return "application/octet-stream"
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def hash_workers():
+    return settings.HASH_WORKERS or os.cpu_count() or 1
+
+
+def hash_executor():
+    """Process-wide thread pool shared by all hashing helpers."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=hash_workers(), thread_name_prefix="hashing")
+        return _executor
+
+
+def iter_blocks(chunks, block_size):
+    """Re-cut an iterable of byte strings into ``block_size`` blocks (the last may be shorter)."""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= block_size:
+            yield bytes(buffer[:block_size])
+            del buffer[:block_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def read_blocks(file, block_size):
+    """Blocks of ``file``: slices of its mapping when it can be mapped, copies of its chunks otherwise."""
+    with blob_view(file) as view:
+        if view is None:
+            yield from iter_blocks(file.chunks(), block_size)
+        else:
+            yield from iter_view(view, block_size)
+
+
+def leaf_digest(block):
+    return hashlib.sha256(block).digest()
+
+
+def combine_leaves(leaves):
+    return hashlib.sha256(b"".join(leaves)).hexdigest()
+
+
+def tree_hash(file, chunk_size=None):
+    """Compute the tree hash of ``file`` with blocks hashed concurrently."""
+    chunk_size = chunk_size or settings.TREE_HASH_CHUNK_SIZE
+    executor = hash_executor()
+    window = hash_workers() * 2
+    pending = deque()
+    leaves = []
+    for block in read_blocks(file, chunk_size):
+        pending.append(executor.submit(leaf_digest, block))
+        # Bound the number of blocks held in memory.
+        while len(pending) > window:
+            leaves.append(pending.popleft().result())
+    leaves.extend(future.result() for future in pending)
+    return TreeDigest(combine_leaves(leaves), chunk_size, leaves)
+
+
+def verify_chunk(block, index, tree):
+    """Check block number ``index`` of a blob against its ``TreeDigest``."""
+    return 0 <= index < len(tree.leaves) and leaf_digest(block) == tree.leaves[index]
+
+
+def _digest_serial(uploaded_file, name):
+    sha256 = hashlib.sha256()
+    size = 0
+    head = b""
+    for chunk in read_blocks(uploaded_file, settings.TREE_HASH_CHUNK_SIZE):
+        if len(head) < SNIFF_BYTES:
+            head += chunk[:SNIFF_BYTES - len(head)]
+        sha256.update(chunk)
+        size += len(chunk)
+    return UploadDigest(sha256.hexdigest(), size, detect_mime_type(head, name or uploaded_file.name))
+
+
+def _digest_parallel(uploaded_file, name):
+    # The whole-blob SHA-256 is inherently sequential, so it runs as a chain
+    # of single updates on a worker (overlapping the next read) while the
+    # tree leaves are hashed on the remaining workers.
+    executor = hash_executor()
+    window = hash_workers() * 2
+    chunk_size = settings.TREE_HASH_CHUNK_SIZE
+    sha256 = hashlib.sha256()
+    size = 0
+    head = b""
+    update = None
+    pending = deque()
+    leaves = []
+    for block in read_blocks(uploaded_file, chunk_size):
+        if len(head) < SNIFF_BYTES:
+            head += block[:SNIFF_BYTES - len(head)]
+        size += len(block)
+        if update is not None:
+            update.result()
+        update = executor.submit(sha256.update, block)
+        pending.append(executor.submit(leaf_digest, block))
+        while len(pending) > window:
+            leaves.append(pending.popleft().result())
+    if update is not None:
+        update.result()
+    leaves.extend(future.result() for future in pending)
+    tree = TreeDigest(combine_leaves(leaves), chunk_size, leaves)
+    return UploadDigest(
+        sha256.hexdigest(), size, detect_mime_type(head, name or uploaded_file.name), tree.encode()
+    )
+
+
+def digest_upload(uploaded_file, name=None):
+    """
+    Hash, measure and sniff an upload in a single streaming pass so the
+    metadata never has to be read back from storage. Large uploads are
+    hashed on the shared pool and also get a tree hash.
+    """
+    size = getattr(uploaded_file, "size", None)
+    if size is not None and size >= settings.HASH_PARALLEL_THRESHOLD:
+        return _digest_parallel(uploaded_file, name)
+    return _digest_serial(uploaded_file, name)
+
+
+def _digest_opened(opener, name):
+    with opener() as fh:
+        return _digest_serial(fh, name)
+
+
+def hash_many(openers, names=None):
+    """
+    Digest many blobs concurrently, one worker per blob. Each item of
+    ``openers`` is a zero-argument callable returning an open file, so only
+    as many files are open as there are workers. Results keep input order.
+    """
+    names = names or [None] * len(openers)
+    return list(hash_executor().map(_digest_opened, openers, names))
@@ -0,0 +1,229 @@
+"""
+Bulk ingestion of a directory tree or tarball into a user's namespace.
+
+Used by the ``load_corpus`` management command to stage production-sized
+datasets. Entries are processed in batches: contents are hashed
+concurrently with ``hashing.hash_many``, every distinct blob is written to
+storage once under a content-addressed name, and ``File``/``FileVersion``
+rows are written with ``bulk_create`` inside one transaction per batch. ``bulk_create`` skips the
+signals in ``file_versions.signals``, so the per-file aggregates and the hash
+filter are updated here instead.
+
+Loading is idempotent: a version whose content already exists for that file
+is skipped, and a blob left in storage by an interrupted run is reused.
+"""
+import os
+import posixpath
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+
+from django.core.files import File as DjangoFile
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from .hash_filter import possibly_stored, record_hashes
+from .hashing import hash_many
+from .models.file import File
+from .models.file_version import FileVersion
+from .paths import normalize_directory, normalize_path, parent_of
+from .queue import enqueue_on_commit
+from .storage import blob_name
+
+
+@dataclass
+class Entry:
+    name: str
+    source: object
+    content_hash: str = ""
+    size: int = 0
+    mime_type: str = ""
+
+    def open(self):
+        if isinstance(self.source, bytes):
+            return ContentFile(self.source, name=self.name)
+        return DjangoFile(open(self.source, "rb"), name=self.name)
+
+
+@dataclass
+class LoadStats:
+    versions: int = 0
+    files: int = 0
+    blobs: int = 0
+    skipped: int = 0
+    bytes: int = 0
+
+    def add(self, other):
+        for field in ("versions", "files", "blobs", "skipped", "bytes"):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+
+def entry_name(prefix, name):
+    # `tar -C dir -czf corpus.tgz .` names every member "./...".
+    while name.startswith("./"):
+        name = name[2:]
+    return normalize_path(posixpath.join(prefix, name))
+
+
+def iter_directory(root, prefix="", on_invalid=None):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            relative = os.path.relpath(path, root).replace(os.sep, "/")
+            try:
+                name = entry_name(prefix, relative)
+            except ValueError as exc:
+                if on_invalid:
+                    on_invalid(relative, exc)
+                continue
+            yield Entry(name, path)
+
+
+def iter_tarball(path, prefix="", on_invalid=None):
+    # Members are read sequentially, so a batch of tar contents is held in memory.
+    with tarfile.open(path, "r:*") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            try:
+                name = entry_name(prefix, member.name)
+            except ValueError as exc:
+                if on_invalid:
+                    on_invalid(member.name, exc)
+                continue
+            with archive.extractfile(member) as fh:
+                content = fh.read()
+            yield Entry(name, content)
+
+
+def iter_source(path, prefix="", on_invalid=None):
+    """
+    Entries of the directory or tar archive at ``path``, named under
+    ``prefix``. Entries whose names are not valid paths (e.g. containing
+    ``..``) are skipped and passed to ``on_invalid`` with the error.
+    """
+    prefix = normalize_directory(prefix)
+    if os.path.isdir(path):
+        return iter_directory(path, prefix, on_invalid)
+    if tarfile.is_tarfile(path):
+        return iter_tarball(path, prefix, on_invalid)
+    raise ValueError(f"{path} is neither a directory nor a tar archive.")
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def store_blob(storage, entry):
+    name = blob_name(entry.content_hash)
+    if storage.exists(name):
+        return name
+    with entry.open() as fh:
+        return storage.save(name, fh)
+
+
+class CorpusLoader:
+    def __init__(self, user, *, batch_size=1000, workers=None, enqueue_tasks=True):
+        self.user = user
+        self.batch_size = batch_size
+        # Storage writes are I/O bound, so use more threads than the hashing pool.
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.enqueue_tasks = enqueue_tasks
+        self.storage = FileVersion._meta.get_field("file").storage
+
+    def load(self, entries, progress=None):
+        stats = LoadStats()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch in batched(entries, self.batch_size):
+                stats.add(self.load_batch(pool, batch))
+                if progress:
+                    progress(stats)
+        return stats
+
+    def load_batch(self, pool, entries):
+        stats = LoadStats()
+        digests = hash_many([entry.open for entry in entries], [entry.name for entry in entries])
+        for entry, digest in zip(entries, digests):
+            entry.content_hash, entry.size, entry.mime_type = digest.content_hash, digest.size, digest.mime_type
+        # Content the hash filter has never seen needs no lookups.
+        hashes = set(possibly_stored({entry.content_hash for entry in entries}))
+
+        # Blobs already known to the database are shared rather than stored again.
+        blobs = dict(
+            FileVersion.objects.filter(content_hash__in=hashes)
+            .exclude(file="")
+            .exclude(file__isnull=True)
+            .values_list("content_hash", "file")
+        ) if hashes else {}
+        new_blobs = {}
+        for entry in entries:
+            if entry.content_hash not in blobs:
+                new_blobs.setdefault(entry.content_hash, entry)
+        for content_hash, name in zip(new_blobs, pool.map(lambda e: store_blob(self.storage, e), new_blobs.values())):
+            blobs[content_hash] = name
+        stats.blobs = len(new_blobs)
+
+        with transaction.atomic():
+            files = self.lock_files({entry.name for entry in entries}, stats)
+            known = set(
+                FileVersion.objects.filter(file_obj__in=files.values(), content_hash__in=hashes)
+                .values_list("file_obj_id", "content_hash")
+            ) if hashes else set()
+            now = timezone.now()
+            versions = []
+            for entry in entries:
+                file_obj = files[entry.name]
+                if (file_obj.pk, entry.content_hash) in known:
+                    stats.skipped += 1
+                    continue
+                known.add((file_obj.pk, entry.content_hash))
+                latest = file_obj.latest_version
+                version = FileVersion(
+                    file_obj=file_obj,
+                    user=self.user,
+                    version_number=latest.version_number + 1 if latest else 1,
+                    file=blobs[entry.content_hash],
+                    content_hash=entry.content_hash,
+                    size=entry.size,
+                    mime_type=entry.mime_type,
+                    created_at=now,
+                )
+                versions.append(version)
+                file_obj.latest_version = version
+                file_obj.version_count += 1
+                file_obj.total_bytes += entry.size
+                stats.bytes += entry.size
+
+            FileVersion.objects.bulk_create(versions, batch_size=self.batch_size)
+            record_hashes({version.content_hash for version in versions})
+            touched = {version.file_obj_id: version.file_obj for version in versions}.values()
+            File.objects.bulk_update(touched, File.AGGREGATE_FIELDS, batch_size=self.batch_size)
+            stats.versions = len(versions)
+
+            if self.enqueue_tasks:
+                for content_hash in new_blobs:
+                    for task_name in ("file_versions.verify_blob", "file_versions.index_text"):
+                        enqueue_on_commit(task_name, {"content_hash": content_hash}, idempotency_key=content_hash)
+        return stats
+
+    def lock_files(self, names, stats):
+        files = {
+            file_obj.name: file_obj
+            for file_obj in File.objects.select_for_update(of=("self",))
+            .select_related("latest_version")
+            .filter(user=self.user, name__in=names)
+        }
+        missing = [File(name=name, parent=parent_of(name), user=self.user) for name in names - files.keys()]
+        File.objects.bulk_create(missing, batch_size=self.batch_size)
+        if missing and missing[0].pk is None:
+            # Backends that cannot return primary keys from a bulk insert.
+            missing = File.objects.filter(user=self.user, name__in=[f.name for f in missing])
+        for file_obj in missing:
+            files[file_obj.name] = file_obj
+        stats.files = len(missing)
+        return files
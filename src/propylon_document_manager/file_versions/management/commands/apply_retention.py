@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from propylon_document_manager.file_versions.models.user import User
+from propylon_document_manager.file_versions.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = "Delete file versions that retention policies no longer keep, and blobs nothing references any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Files examined, and versions deleted, per transaction.'
+        )
+        parser.add_argument('--email', type=str, help='Only apply retention to this user\'s files.')
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help='Only delete blobs from storage that have been unreferenced this long (default: 60).'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['email']:
+            try:
+                user = User.objects.get(email=options['email'])
+            except User.DoesNotExist:
+                raise CommandError('No user with email %s' % options['email'])
+
+        stats = apply_retention(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            user=user,
+            grace=timedelta(minutes=options['grace_minutes']),
+        )
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            '%s %s versions of %s files (%s bytes); %s blobs freed, %s deleted from storage' % (
+                verb, stats.expired, stats.files, stats.bytes, stats.blobs_freed, stats.blobs_deleted
+            )
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from propylon_document_manager.file_versions.models.document_text import DocumentText
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from propylon_document_manager.file_versions.queue import enqueue
+from propylon_document_manager.file_versions.search import index_blob
+
+
+class Command(BaseCommand):
+    help = "Queue text extraction for blobs missing from the search index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Extract text in this process instead of queueing tasks.'
+        )
+
+    def handle(self, *args, **options):
+        indexed = DocumentText.objects.values("content_hash")
+        content_hashes = (
+            FileVersion.objects.exclude(file="")
+            .exclude(content_hash__in=indexed)
+            .values_list("content_hash", flat=True)
+            .distinct()
+        )
+        count = 0
+        for content_hash in content_hashes.iterator():
+            if options['sync']:
+                index_blob(content_hash)
+            else:
+                enqueue("file_versions.index_text", {"content_hash": content_hash}, idempotency_key=content_hash)
+            count += 1
+
+        self.stdout.write(
+            self.style.SUCCESS('Indexed %s blobs' % count if options['sync'] else 'Queued %s blobs' % count)
+        )
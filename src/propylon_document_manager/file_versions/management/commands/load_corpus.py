@@ -0,0 +1,84 @@
+import tarfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from propylon_document_manager.file_versions.loader import CorpusLoader, iter_source
+from propylon_document_manager.file_versions.models.user import User
+
+
+class Command(BaseCommand):
+    help = "Bulk load a directory tree or tarball into a user's namespace"
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory or tar archive (optionally compressed) to load.')
+        parser.add_argument(
+            '--email',
+            type=str,
+            default='user1@example.com',
+            help='Email of the user who will own the loaded files.'
+        )
+        parser.add_argument(
+            '--prefix',
+            type=str,
+            default='',
+            help='Directory under which the tree is placed in the user\'s namespace.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of versions written per transaction.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Threads used for hashing and storing blobs.'
+        )
+        parser.add_argument(
+            '--no-tasks',
+            action='store_true',
+            help='Do not queue verification and indexing for new blobs (run index_documents later).'
+        )
+
+    def handle(self, *args, **options):
+        user, created = User.objects.get_or_create(email=options['email'])
+        if created:
+            user.set_unusable_password()
+            user.save()
+        invalid = []
+
+        def skip(name, exc):
+            invalid.append(name)
+            self.stderr.write('Skipping %s: %s' % (name, exc))
+
+        try:
+            entries = iter_source(options['source'], options['prefix'], on_invalid=skip)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        loader = CorpusLoader(
+            user,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            enqueue_tasks=not options['no_tasks'],
+        )
+        started = time.monotonic()
+
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write('%s versions loaded in %.1fs' % (stats.versions, time.monotonic() - started))
+
+        try:
+            stats = loader.load(entries, progress=progress)
+        except (OSError, tarfile.TarError) as exc:
+            # Batches loaded before the error are committed; loading again resumes.
+            raise CommandError('Could not read %s: %s' % (options['source'], exc))
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Loaded %s versions (%s new files, %s new blobs, %s bytes, %s skipped, %s invalid names) in %.1fs' % (
+                    stats.versions, stats.files, stats.blobs, stats.bytes, stats.skipped, len(invalid),
+                    time.monotonic() - started,
+                )
+            )
+        )
@@ -0,0 +1,25 @@
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+from propylon_document_manager.file_versions.storage import ShardedStorage, find_backend
+
+
+class Command(BaseCommand):
+    help = "Move blobs to the storage root that owns them after DJANGO_BLOB_ROOTS changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would move.')
+
+    def handle(self, *args, **options):
+        storage = find_backend(storages["default"], ShardedStorage)
+        if storage is None:
+            raise CommandError('The default storage is not sharded; set DJANGO_BLOB_ROOTS.')
+
+        moved = 0
+        for name, source, target in list(storage.misplaced()):
+            self.stdout.write('%s: %s -> %s' % (name, source, target))
+            if not options['dry_run']:
+                storage.move(name, source, target)
+            moved += 1
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS('%s %s blobs' % (verb, moved)))
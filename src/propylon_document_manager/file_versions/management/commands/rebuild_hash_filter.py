@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from propylon_document_manager.file_versions.hash_filter import get_hash_filter
+
+
+class Command(BaseCommand):
+    help = "Rebuild the content hash filter from the database, dropping the hashes of deleted versions"
+
+    def handle(self, *args, **options):
+        hash_filter = get_hash_filter()
+        if hash_filter is None:
+            raise CommandError('The hash filter is disabled; set DJANGO_HASH_FILTER_BACKEND.')
+
+        bloom = hash_filter.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt the hash filter: %s bits (%s bytes), %s hash functions' % (
+                bloom.size_bits, len(bloom.bits), bloom.hash_count
+            )
+        ))
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+from propylon_document_manager.file_versions.packs import PackedStorage, repack
+from propylon_document_manager.file_versions.storage import find_backend
+
+
+class Command(BaseCommand):
+    help = "Drop unreferenced blobs from packfiles and compact packs that are mostly garbage"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-garbage', type=float, default=0.25,
+            help='Rewrite packs with at least this share of unreferenced bytes (default: 0.25).'
+        )
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help='Keep unreferenced blobs stored or deduplicated against this recently (default: 60).'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change.')
+
+    def handle(self, *args, **options):
+        storage = find_backend(storages["default"], PackedStorage)
+        if storage is None:
+            raise CommandError('The default storage does not use packfiles; set DJANGO_PACK_DIR.')
+
+        stats = repack(
+            storage.packs,
+            min_garbage=options['min_garbage'],
+            grace=timedelta(minutes=options['grace_minutes']),
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would drop' if options['dry_run'] else 'Dropped'
+        self.stdout.write(self.style.SUCCESS(
+            '%s %s entries; %s packs rewritten, %s removed, %s bytes reclaimed' % (
+                verb, stats.dropped, stats.rewritten, stats.removed, stats.reclaimed_bytes
+            )
+        ))
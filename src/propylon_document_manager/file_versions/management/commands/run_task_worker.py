@@ -0,0 +1,53 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from propylon_document_manager.file_versions import queue
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks (post-upload processing)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit instead of polling.'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep while the queue is empty.'
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=None,
+            help='Exit after processing this many jobs.'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        backend = queue.get_backend()
+        max_jobs = options['max_jobs']
+        processed = 0
+        while not self.stopping:
+            remaining = None if max_jobs is None else max_jobs - processed
+            ran = queue.work(backend, max_jobs=remaining)
+            processed += ran
+            if options['once'] or (max_jobs is not None and processed >= max_jobs):
+                break
+            if not ran:
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(
+            self.style.SUCCESS('Processed %s tasks' % processed)
+        )
+
+    def stop(self, signum, frame):
+        self.stopping = True
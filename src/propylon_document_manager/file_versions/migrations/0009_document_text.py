@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:13
+
+from django.db import migrations, models
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE file_versions_documenttext_fts
+    USING fts5(text, content='file_versions_documenttext', content_rowid='id')
+    """,
+    """
+    CREATE TRIGGER file_versions_documenttext_ai AFTER INSERT ON file_versions_documenttext BEGIN
+        INSERT INTO file_versions_documenttext_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER file_versions_documenttext_ad AFTER DELETE ON file_versions_documenttext BEGIN
+        INSERT INTO file_versions_documenttext_fts(file_versions_documenttext_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER file_versions_documenttext_au AFTER UPDATE ON file_versions_documenttext BEGIN
+        INSERT INTO file_versions_documenttext_fts(file_versions_documenttext_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO file_versions_documenttext_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS file_versions_documenttext_au",
+    "DROP TRIGGER IF EXISTS file_versions_documenttext_ad",
+    "DROP TRIGGER IF EXISTS file_versions_documenttext_ai",
+    "DROP TABLE IF EXISTS file_versions_documenttext_fts",
+]
+
+POSTGRES_FORWARDS = [
+    """
+    ALTER TABLE file_versions_documenttext ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', text)) STORED
+    """,
+    "CREATE INDEX file_versions_documenttext_search_idx ON file_versions_documenttext USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARDS = [
+    "DROP INDEX IF EXISTS file_versions_documenttext_search_idx",
+    "ALTER TABLE file_versions_documenttext DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_versions", "0008_task"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentText",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("content_hash", models.CharField(max_length=64, unique=True)),
+                ("text", models.TextField()),
+                ("extracted_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(
+            run_for_vendor({"sqlite": SQLITE_FORWARDS, "postgresql": POSTGRES_FORWARDS}),
+            run_for_vendor({"sqlite": SQLITE_BACKWARDS, "postgresql": POSTGRES_BACKWARDS}),
+        ),
+    ]
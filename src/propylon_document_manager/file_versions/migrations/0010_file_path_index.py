@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:15
+
+from django.db import migrations, models
+
+
+def fill_parent(apps, schema_editor):
+    File = apps.get_model("file_versions", "File")
+    for file_obj in File.objects.filter(name__contains="/").only("id", "name").iterator():
+        File.objects.filter(pk=file_obj.pk).update(parent=file_obj.name.rpartition("/")[0])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_versions", "0009_document_text"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="parent",
+            field=models.CharField(blank=True, default="", editable=False, max_length=512),
+        ),
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(fields=["user", "name"], name="file_user_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(fields=["user", "parent", "name"], name="file_user_parent_name_idx"),
+        ),
+        migrations.RunPython(fill_parent, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_aggregates(apps, schema_editor):
+    File = apps.get_model("file_versions", "File")
+    FileVersion = apps.get_model("file_versions", "FileVersion")
+    for version in FileVersion.objects.exclude(file="").exclude(file__isnull=True).iterator():
+        try:
+            size = version.file.size
+        except OSError:
+            continue
+        FileVersion.objects.filter(pk=version.pk).update(size=size)
+    for file_obj in File.objects.annotate(count=Count("versions"), total=Sum("versions__size")).iterator():
+        latest = FileVersion.objects.filter(file_obj=file_obj).order_by("-version_number").first()
+        File.objects.filter(pk=file_obj.pk).update(
+            latest_version=latest, version_count=file_obj.count, total_bytes=file_obj.total or 0
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_versions", "0010_file_path_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="latest_version",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="file_versions.fileversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="total_bytes",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="version_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="fileversion",
+            name="size",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
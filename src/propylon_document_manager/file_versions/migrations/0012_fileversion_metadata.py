@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:18
+
+import mimetypes
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def guess_mime_types(apps, schema_editor):
+    # Existing rows are typed by name only; sniffing them would mean reading every blob back.
+    FileVersion = apps.get_model("file_versions", "FileVersion")
+    for version in FileVersion.objects.select_related("file_obj").only("id", "file_obj__name").iterator():
+        mime_type, _ = mimetypes.guess_type(version.file_obj.name)
+        if mime_type:
+            FileVersion.objects.filter(pk=version.pk).update(mime_type=mime_type)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_versions", "0011_file_latest_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fileversion",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name="fileversion",
+            name="mime_type",
+            field=models.CharField(blank=True, default="", editable=False, max_length=127),
+        ),
+        migrations.AddIndex(
+            model_name="fileversion",
+            index=models.Index(fields=["user", "mime_type"], name="fileversion_user_mime_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="fileversion",
+            index=models.Index(fields=["user", "size"], name="fileversion_user_size_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="fileversion",
+            index=models.Index(fields=["user", "created_at"], name="fileversion_user_created_idx"),
+        ),
+        migrations.RunPython(guess_mime_types, migrations.RunPython.noop),
+    ]
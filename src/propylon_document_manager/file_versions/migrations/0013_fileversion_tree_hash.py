@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_versions", "0012_fileversion_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fileversion",
+            name="tree_hash",
+            field=models.CharField(blank=True, default="", editable=False, max_length=96),
+        ),
+    ]
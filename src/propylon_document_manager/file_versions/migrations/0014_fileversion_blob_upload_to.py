@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:36
+
+import propylon_document_manager.file_versions.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_versions", "0013_fileversion_tree_hash"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="fileversion",
+            name="file",
+            field=models.FileField(
+                blank=True, null=True, upload_to=propylon_document_manager.file_versions.storage.blob_upload_to
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_versions", "0014_fileversion_blob_upload_to"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PackEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("content_hash", models.CharField(max_length=64, unique=True)),
+                ("pack", models.CharField(db_index=True, max_length=64)),
+                ("offset", models.PositiveBigIntegerField()),
+                ("length", models.PositiveIntegerField()),
+                ("touched_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
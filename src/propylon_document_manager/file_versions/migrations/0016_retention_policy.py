@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_versions", "0015_pack_entry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RetentionPolicy",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("path_prefix", models.CharField(blank=True, default="", max_length=512)),
+                ("keep_last", models.PositiveIntegerField(blank=True, null=True)),
+                ("keep_daily", models.PositiveIntegerField(blank=True, null=True)),
+                ("keep_weekly", models.PositiveIntegerField(blank=True, null=True)),
+                ("keep_monthly", models.PositiveIntegerField(blank=True, null=True)),
+                ("keep_within", models.DurationField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="retention_policies",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "retention policies",
+                "constraints": [
+                    models.UniqueConstraint(fields=("user", "path_prefix"), name="unique_retention_policy")
+                ],
+            },
+        ),
+    ]
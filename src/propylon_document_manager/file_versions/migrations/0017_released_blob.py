@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("file_versions", "0016_retention_policy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReleasedBlob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=512, unique=True)),
+                ("content_hash", models.CharField(max_length=64)),
+                ("released_at", models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
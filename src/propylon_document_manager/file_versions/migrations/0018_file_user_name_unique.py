@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:42
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def merge_duplicate_files(apps, schema_editor):
+    """
+    Fold Files that share a (user, name) into the oldest one. Versions of the
+    others follow its own, renumbered in upload order, and the aggregates are
+    recomputed.
+    """
+    File = apps.get_model("file_versions", "File")
+    FileVersion = apps.get_model("file_versions", "FileVersion")
+    duplicates = (
+        File.objects.values("user_id", "name").annotate(count=Count("pk"), keep=Min("pk")).filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        keep = duplicate["keep"]
+        others = list(
+            File.objects.filter(user_id=duplicate["user_id"], name=duplicate["name"])
+            .exclude(pk=keep)
+            .values_list("pk", flat=True)
+        )
+        number = FileVersion.objects.filter(file_obj_id=keep).aggregate(number=Max("version_number"))["number"] or 0
+        for pk in FileVersion.objects.filter(file_obj_id__in=others).order_by("created_at", "pk").values_list(
+            "pk", flat=True
+        ):
+            number += 1
+            FileVersion.objects.filter(pk=pk).update(file_obj_id=keep, version_number=number)
+        File.objects.filter(pk__in=others).delete()
+
+        totals = FileVersion.objects.filter(file_obj_id=keep).aggregate(count=Count("pk"), total=Sum("size"))
+        File.objects.filter(pk=keep).update(
+            latest_version=FileVersion.objects.filter(file_obj_id=keep).order_by("-version_number").first(),
+            version_count=totals["count"],
+            total_bytes=totals["total"] or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("file_versions", "0017_released_blob"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_files, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="file",
+            constraint=models.UniqueConstraint(fields=("user", "name"), name="file_user_name_uniq"),
+        ),
+        # The constraint's index replaces it.
+        migrations.RemoveIndex(
+            model_name="file",
+            name="file_user_name_idx",
+        ),
+    ]
@@ -1,5 +1,10 @@
 from .user import User, UserManager
 from .file import File
 from .file_version import FileVersion
+from .task import Task
+from .document_text import DocumentText
+from .pack_entry import PackEntry
+from .retention_policy import RetentionPolicy
+from .released_blob import ReleasedBlob
 
-__all__ = ['User', 'UserManager', 'File', 'FileVersion'] 
\ No newline at end of file
+__all__ = ['User', 'UserManager', 'File', 'FileVersion', 'Task', 'DocumentText', 'PackEntry', 'RetentionPolicy', 'ReleasedBlob']
\ No newline at end of file
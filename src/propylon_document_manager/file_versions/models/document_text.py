@@ -0,0 +1,16 @@
+from django.db import models
+
+
+class DocumentText(models.Model):
+    """
+    Text extracted from a blob, shared by every version with that content.
+    The full-text index itself is maintained by the database: an FTS5 table
+    kept in sync by triggers on SQLite, a generated tsvector column on Postgres.
+    """
+
+    content_hash = models.CharField(max_length=64, unique=True)
+    text = models.TextField()
+    extracted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.content_hash
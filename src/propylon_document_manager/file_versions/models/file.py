@@ -1,14 +1,75 @@
 from django.db import models
 from django.conf import settings
 
+from ..paths import SEPARATOR, glob_literal_prefix, glob_to_regex, parent_of, prefix_upper_bound
+
+
+class FileQuerySet(models.QuerySet):
+    def with_prefix(self, prefix, field="name"):
+        if not prefix:
+            return self
+        # The range lets the (user, name) index do the work; startswith keeps
+        # the result exact under any database collation.
+        return self.filter(**{
+            f"{field}__gte": prefix, f"{field}__lt": prefix_upper_bound(prefix), f"{field}__startswith": prefix
+        })
+
+    def matching_glob(self, pattern):
+        return self.with_prefix(glob_literal_prefix(pattern)).filter(name__regex=glob_to_regex(pattern))
+
+    def in_directory(self, directory):
+        return self.filter(parent=directory)
+
+    def subdirectories(self, directory):
+        """Sorted names of the directories directly under ``directory``, from one (user, parent) index range."""
+        prefix = directory + SEPARATOR if directory else ""
+        files = self.with_prefix(prefix, field="parent") if prefix else self.exclude(parent="")
+        parents = files.order_by().values_list("parent", flat=True).distinct()
+        return sorted({parent[len(prefix):].partition(SEPARATOR)[0] for parent in parents})
+
 
 class File(models.Model):
     name = models.CharField(max_length=512)
+    parent = models.CharField(max_length=512, blank=True, default="", editable=False)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="files"
     )
+    # Maintained by file_versions.signals whenever versions are added or removed.
+    latest_version = models.ForeignKey(
+        "file_versions.FileVersion",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+"
+    )
+    version_count = models.PositiveIntegerField(default=0, editable=False)
+    total_bytes = models.PositiveBigIntegerField(default=0, editable=False)
+
+    AGGREGATE_FIELDS = ("latest_version", "version_count", "total_bytes")
+
+    objects = FileQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "name"], name="file_user_name_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "parent", "name"], name="file_user_parent_name_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.parent = parent_of(self.name)
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # Aggregates are changed with UPDATE ... F() expressions; never
+            # write back a possibly stale in-memory copy.
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.AGGREGATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return self.name 
\ No newline at end of file
+        return self.name
@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from ..storage import blob_upload_to
 from .file import File
 
 
@@ -10,13 +12,23 @@ class FileVersion(models.Model):
         related_name="versions"
     )
     version_number = models.IntegerField()
-    file = models.FileField(upload_to=settings.FILE_UPLOAD_DIR, null=True, blank=True)
+    file = models.FileField(upload_to=blob_upload_to, null=True, blank=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="file_versions"
     )
     content_hash = models.CharField(max_length=64, editable=False, db_index=True)
+    # "<block size>:<root>" for large uploads, see file_versions.hashing.
+    tree_hash = models.CharField(max_length=96, blank=True, default="", editable=False)
+    size = models.PositiveBigIntegerField(default=0, editable=False)
+    mime_type = models.CharField(max_length=127, blank=True, default="", editable=False)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
-        unique_together = ['file_obj', 'version_number'] 
\ No newline at end of file
+        unique_together = ['file_obj', 'version_number']
+        indexes = [
+            models.Index(fields=["user", "mime_type"], name="fileversion_user_mime_idx"),
+            models.Index(fields=["user", "size"], name="fileversion_user_size_idx"),
+            models.Index(fields=["user", "created_at"], name="fileversion_user_created_idx"),
+        ] 
\ No newline at end of file
@@ -0,0 +1,21 @@
+from django.db import models
+from django.utils import timezone
+
+
+class PackEntry(models.Model):
+    """
+    Location of a small blob inside a packfile (see file_versions.packs).
+    Entries of blobs no version references any more are dropped by
+    ``repack_blobs``, which also reclaims their bytes. ``touched_at`` is
+    refreshed when an upload deduplicates against the entry, so a repack does
+    not drop a blob whose new version is still being saved.
+    """
+
+    content_hash = models.CharField(max_length=64, unique=True)
+    pack = models.CharField(max_length=64, db_index=True)
+    offset = models.PositiveBigIntegerField()
+    length = models.PositiveIntegerField()
+    touched_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.content_hash} ({self.pack}@{self.offset})"
@@ -0,0 +1,19 @@
+from django.db import models
+from django.utils import timezone
+
+
+class ReleasedBlob(models.Model):
+    """
+    A stored blob the last referencing version was deleted from (see
+    file_versions.blobs). It is deleted from storage by
+    ``delete_released_blobs`` once it has gone unreferenced for the grace
+    period, so an upload that deduplicated onto it while it was being
+    released has committed by then and keeps it.
+    """
+
+    name = models.CharField(max_length=512, unique=True)
+    content_hash = models.CharField(max_length=64)
+    released_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.name
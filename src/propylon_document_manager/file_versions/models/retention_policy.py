@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db import models
+
+
+class RetentionPolicy(models.Model):
+    """
+    Which versions of a user's files (or of everyone's, without a user) under
+    ``path_prefix`` to keep; see file_versions.retention. A version survives
+    if any rule keeps it, and the latest version of a file always survives.
+    A policy with no rules set keeps everything.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="retention_policies"
+    )
+    path_prefix = models.CharField(max_length=512, blank=True, default="")
+    keep_last = models.PositiveIntegerField(null=True, blank=True)
+    keep_daily = models.PositiveIntegerField(null=True, blank=True)
+    keep_weekly = models.PositiveIntegerField(null=True, blank=True)
+    keep_monthly = models.PositiveIntegerField(null=True, blank=True)
+    keep_within = models.DurationField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "retention policies"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "path_prefix"], name="unique_retention_policy"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # File names are stored without a leading slash.
+        self.path_prefix = self.path_prefix.lstrip("/")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return "%s:%s" % (self.user or "*", self.path_prefix or "*")
@@ -0,0 +1,259 @@
+"""
+Packfiles for small blobs.
+
+Most documents are a few KB, and one file per blob makes backups and scrubs
+spend their time on per-file metadata. ``PackedStorage`` appends blobs below
+``threshold`` bytes to large packfiles instead and records where each one
+went in ``PackEntry`` (content hash -> pack, offset, length). Larger blobs,
+and any name that is not content-addressed, go to the wrapped storage.
+
+- Writing: each process appends to its own pack and holds an exclusive
+  ``flock`` on it while it is active, so writers never share a file. A pack
+  is sealed once it reaches ``max_pack_bytes``.
+- Reading: packs are memory-mapped once per process and a blob is returned
+  as a file over a slice of the map, without copying it first.
+- Compaction: ``repack()`` (``django-admin repack_blobs``) drops entries no
+  version references and rewrites packs that are mostly garbage. Active
+  packs are skipped; a reader that loses the race with a repack retries with
+  the blob's new location.
+"""
+import fcntl
+import io
+import mmap
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+from .mapped import BlobView
+from .models.file_version import FileVersion
+from .models.pack_entry import PackEntry
+from .storage import HASH_NAME
+
+PACK_SUFFIX = ".pack"
+
+
+class PackStore:
+    """A directory of packfiles: appends for this process, mmap reads for any pack."""
+
+    def __init__(self, directory, max_pack_bytes=256 * 1024**2):
+        self.directory = directory
+        self.max_pack_bytes = max_pack_bytes
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_name = None
+        self._maps = {}
+
+    def path(self, pack):
+        return os.path.join(self.directory, pack + PACK_SUFFIX)
+
+    def packs(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len(PACK_SUFFIX)] for name in names if name.endswith(PACK_SUFFIX))
+
+    def _open_pack(self):
+        os.makedirs(self.directory, exist_ok=True)
+        name = "pack-" + uuid.uuid4().hex
+        active = open(self.path(name), "ab")
+        fcntl.flock(active, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._active, self._active_name = active, name
+
+    def _seal(self):
+        if self._active is not None:
+            self._active.close()
+            self._active = self._active_name = None
+
+    def seal(self):
+        """Stop appending to the current pack so it can be repacked."""
+        with self._lock:
+            self._seal()
+
+    def append(self, data):
+        """Append ``data`` to this process's pack and return ``(pack, offset)``."""
+        with self._lock:
+            if self._active is not None and self._active.tell() + len(data) > self.max_pack_bytes:
+                self._seal()
+            if self._active is None:
+                self._open_pack()
+            offset = self._active.tell()
+            self._active.write(data)
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            return self._active_name, offset
+
+    def view(self, pack, offset, length):
+        """A memoryview of ``length`` bytes at ``offset`` in ``pack``."""
+        if not length:
+            return memoryview(b"")
+        with self._lock:
+            mapped = self._maps.get(pack)
+            if mapped is None or offset + length > len(mapped):
+                # New pack, or one that has grown since it was mapped.
+                with open(self.path(pack), "rb") as fh:
+                    mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[pack] = mapped
+        return memoryview(mapped)[offset:offset + length]
+
+    def try_lock(self, pack):
+        """Lock a sealed pack for rewriting; returns the locked file or None if it is active."""
+        fh = open(self.path(pack), "rb")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fh.close()
+            return None
+        return fh
+
+    def remove(self, pack):
+        with self._lock:
+            # Views handed out earlier keep the old map alive until released.
+            self._maps.pop(pack, None)
+        os.unlink(self.path(pack))
+
+
+@deconstructible(path="propylon_document_manager.file_versions.packs.PackedStorage")
+class PackedStorage(Storage):
+    def __init__(
+        self,
+        backend="propylon_document_manager.file_versions.storage.BlobFileSystemStorage",
+        backend_options=None,
+        pack_dir="packs",
+        threshold=64 * 1024,
+        max_pack_bytes=256 * 1024**2,
+    ):
+        self.backend = import_string(backend)(**(backend_options or {}))
+        self.packs = PackStore(pack_dir, max_pack_bytes)
+        self.threshold = threshold
+
+    def _entry(self, name):
+        match = HASH_NAME.search(name)
+        if match is None:
+            return None
+        return PackEntry.objects.filter(content_hash=match.group(1)).first()
+
+    def _open(self, name, mode="rb"):
+        entry = self._entry(name) if mode == "rb" else None
+        if entry is None:
+            return self.backend.open(name, mode)
+        try:
+            view = self.packs.view(entry.pack, entry.offset, entry.length)
+        except FileNotFoundError:
+            # Repacked since the entry was read, possibly dropping the blob.
+            entry = self._entry(name)
+            if entry is None:
+                raise FileNotFoundError(name)
+            view = self.packs.view(entry.pack, entry.offset, entry.length)
+        blob = File(io.BufferedReader(BlobView(view)), name=name)
+        blob.size = entry.length
+        return blob
+
+    def _save(self, name, content):
+        match = HASH_NAME.search(name)
+        if match is None or content.size > self.threshold:
+            return self.backend.save(name, content)
+        content_hash = match.group(1)
+        if PackEntry.objects.filter(content_hash=content_hash).update(touched_at=timezone.now()):
+            return name
+        data = b"".join(content.chunks())
+        pack, offset = self.packs.append(data)
+        PackEntry.objects.get_or_create(
+            content_hash=content_hash, defaults={"pack": pack, "offset": offset, "length": len(data)}
+        )
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        if HASH_NAME.search(name):
+            # Content-addressed: an existing blob under this name has these bytes.
+            return name
+        return self.backend.get_available_name(name, max_length=max_length)
+
+    def delete(self, name):
+        match = HASH_NAME.search(name)
+        if match is not None:
+            PackEntry.objects.filter(content_hash=match.group(1)).delete()
+        self.backend.delete(name)
+
+    def exists(self, name):
+        return self._entry(name) is not None or self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        entry = self._entry(name)
+        return entry.length if entry is not None else self.backend.size(name)
+
+    def url(self, name):
+        # Packed blobs are only reachable through the API.
+        return self.backend.url(name)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+@dataclass
+class RepackStats:
+    dropped: int = 0
+    rewritten: int = 0
+    removed: int = 0
+    reclaimed_bytes: int = 0
+
+
+def repack(store, min_garbage=0.25, grace=timedelta(hours=1), dry_run=False):
+    """
+    Drop pack entries no version references (and untouched for ``grace``),
+    then rewrite every sealed pack with at least ``min_garbage`` of its bytes
+    unreferenced, moving its live blobs into new packs.
+    """
+    stats = RepackStats()
+    # Live blobs are copied into packs of a separate writer, sealed at the end.
+    target = PackStore(store.directory, store.max_pack_bytes)
+    unreferenced = PackEntry.objects.filter(touched_at__lt=timezone.now() - grace).exclude(
+        Exists(FileVersion.objects.filter(content_hash=OuterRef("content_hash")))
+    )
+    stats.dropped = unreferenced.count() if dry_run else unreferenced.delete()[0]
+
+    live = dict(PackEntry.objects.values_list("pack").annotate(Sum("length")).order_by())
+    for pack in store.packs():
+        locked = store.try_lock(pack)
+        if locked is None:
+            continue
+        with locked:
+            size = os.fstat(locked.fileno()).st_size
+            live_bytes = live.get(pack, 0)
+            if not size or (size - live_bytes) / size < min_garbage:
+                continue
+            stats.reclaimed_bytes += size - live_bytes
+            if dry_run:
+                stats.removed += 1
+                continue
+            if live_bytes:
+                entries = list(PackEntry.objects.filter(pack=pack).order_by("offset"))
+                for entry in entries:
+                    with store.view(entry.pack, entry.offset, entry.length) as view:
+                        entry.pack, entry.offset = target.append(view)
+                with transaction.atomic():
+                    PackEntry.objects.bulk_update(entries, ["pack", "offset"], batch_size=500)
+                stats.rewritten += 1
+            store.remove(pack)
+            stats.removed += 1
+    target.seal()
+    return stats
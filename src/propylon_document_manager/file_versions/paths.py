@@ -0,0 +1,87 @@
+"""
+Helpers for the per-user path namespace of ``File.name``.
+
+Paths are stored normalised: ``/``-separated, no leading or trailing slash,
+no empty, ``.`` or ``..`` segments. ``File.parent`` holds everything before
+the last slash ("" for top-level files) so directory listings are an exact
+match on an indexed column.
+"""
+import re
+
+SEPARATOR = "/"
+GLOB_CHARS = "*?["
+
+
+def normalize_path(path):
+    """Return ``path`` in canonical form or raise ValueError."""
+    if "\\" in path:
+        raise ValueError("Path cannot contain '\\'.")
+    segments = [segment for segment in path.strip().split(SEPARATOR) if segment]
+    if not segments:
+        raise ValueError("Path cannot be empty.")
+    if any(segment in (".", "..") for segment in segments):
+        raise ValueError("Path cannot contain '.' or '..' segments.")
+    return SEPARATOR.join(segments)
+
+
+def normalize_directory(path):
+    """Like ``normalize_path`` but the root ("" or "/") is allowed."""
+    if not path.strip(SEPARATOR + " "):
+        return ""
+    return normalize_path(path)
+
+
+def parent_of(path):
+    return path.rpartition(SEPARATOR)[0]
+
+
+def prefix_upper_bound(prefix):
+    """
+    Smallest string greater than every string starting with ``prefix``, so a
+    prefix test can be answered by an index range scan on every database.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def glob_literal_prefix(pattern):
+    """The part of ``pattern`` before its first wildcard."""
+    match = re.search(r"[*?\[]", pattern)
+    return pattern[: match.start()] if match else pattern
+
+
+def glob_to_regex(pattern):
+    """
+    Translate a path glob into an anchored regular expression. ``*`` and
+    ``?`` never match ``/``; ``**`` matches across directories, and ``**/``
+    also matches no directory at all (``docs/**/x.md`` matches ``docs/x.md``).
+    """
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == SEPARATOR):
+            regex.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                regex.append("[%s]" % body.replace("\\", "\\\\"))
+                i = end
+        else:
+            regex.append(re.escape(char))
+        i += 1
+    return "^%s$" % "".join(regex)
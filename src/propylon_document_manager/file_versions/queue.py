@@ -0,0 +1,294 @@
+"""
+Lightweight background task queue.
+
+Tasks are plain functions registered with ``@register(name)`` and enqueued
+with ``enqueue(name, payload, ...)``. The default backend stores jobs in the
+``Task`` table and is drained by the ``run_task_worker`` management command;
+``RedisBackend`` can be selected through ``settings.TASK_QUEUE["BACKEND"]``.
+
+Passing an ``idempotency_key`` (we use the blob ``content_hash``) makes the
+enqueue a no-op when a job with the same name and key already exists, so a
+blob is processed once no matter how many versions reference it.
+"""
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models.task import Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BACKEND": "propylon_document_manager.file_versions.queue.DatabaseBackend",
+    "OPTIONS": {},
+    "MAX_ATTEMPTS": 3,
+    "RETRY_DELAY": 5,
+    "LOCK_TIMEOUT": 600,
+}
+
+_registry = {}
+_backend = None
+
+
+@dataclass
+class Job:
+    id: str
+    name: str
+    payload: dict = field(default_factory=dict)
+    attempts: int = 0
+    max_attempts: int = 3
+
+
+def queue_settings():
+    return {**DEFAULTS, **getattr(settings, "TASK_QUEUE", {})}
+
+
+def register(name):
+    """Register ``func`` as the handler for tasks called ``name``."""
+
+    def decorator(func):
+        _registry[name] = func
+        return func
+
+    return decorator
+
+
+def get_handler(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f"No task registered as {name!r}.")
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        config = queue_settings()
+        _backend = import_string(config["BACKEND"])(**config["OPTIONS"])
+    return _backend
+
+
+def reset_backend():
+    global _backend
+    _backend = None
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=queue_settings()["RETRY_DELAY"] * 2 ** max(attempts - 1, 0))
+
+
+def enqueue(name, payload=None, *, priority=0, idempotency_key=None, max_attempts=None, delay=None):
+    """
+    Queue a task. Higher ``priority`` runs first. Returns False when a task
+    with the same name and ``idempotency_key`` was already queued.
+    """
+    get_handler(name)
+    return get_backend().enqueue(
+        name,
+        payload or {},
+        priority=priority,
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts or queue_settings()["MAX_ATTEMPTS"],
+        run_after=timezone.now() + (delay or timedelta(0)),
+    )
+
+
+def enqueue_on_commit(name, payload=None, **kwargs):
+    transaction.on_commit(lambda: enqueue(name, payload, **kwargs))
+
+
+def run_job(backend, job):
+    try:
+        get_handler(job.name)(**job.payload)
+    except Exception as exc:
+        logger.exception("Task %s (%s) failed on attempt %s", job.name, job.id, job.attempts)
+        backend.fail(job, f"{type(exc).__name__}: {exc}")
+        return False
+    backend.complete(job)
+    return True
+
+
+def work(backend=None, max_jobs=None):
+    """Run claimable jobs until the queue is empty. Returns the number run."""
+    backend = backend or get_backend()
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job = backend.claim()
+        if job is None:
+            break
+        run_job(backend, job)
+        processed += 1
+    return processed
+
+
+class DatabaseBackend:
+    """Stores jobs in the ``Task`` table; safe for several concurrent workers."""
+
+    def __init__(self, batch_size=10):
+        self.batch_size = batch_size
+
+    def enqueue(self, name, payload, *, priority, idempotency_key, max_attempts, run_after):
+        task = Task(
+            name=name,
+            payload=payload,
+            priority=priority,
+            idempotency_key=idempotency_key,
+            max_attempts=max_attempts,
+            run_after=run_after,
+        )
+        try:
+            with transaction.atomic():
+                task.save()
+        except IntegrityError:
+            return False
+        return True
+
+    def claim(self):
+        now = timezone.now()
+        stale = now - timedelta(seconds=queue_settings()["LOCK_TIMEOUT"])
+        claimable = Task.objects.filter(
+            Q(status=Task.Status.PENDING, run_after__lte=now) | Q(status=Task.Status.RUNNING, locked_at__lt=stale)
+        ).order_by("-priority", "run_after", "id")
+        for task in claimable[: self.batch_size]:
+            # Conditional update so only one worker wins each row.
+            claimed = Task.objects.filter(pk=task.pk, status=task.status, locked_at=task.locked_at).update(
+                status=Task.Status.RUNNING, locked_at=now, attempts=F("attempts") + 1
+            )
+            if claimed:
+                return Job(
+                    id=task.pk,
+                    name=task.name,
+                    payload=task.payload,
+                    attempts=task.attempts + 1,
+                    max_attempts=task.max_attempts,
+                )
+        return None
+
+    def complete(self, job):
+        Task.objects.filter(pk=job.id).update(
+            status=Task.Status.DONE, locked_at=None, last_error="", finished_at=timezone.now()
+        )
+
+    def fail(self, job, error):
+        if job.attempts >= job.max_attempts:
+            Task.objects.filter(pk=job.id).update(
+                status=Task.Status.FAILED, locked_at=None, last_error=error, finished_at=timezone.now()
+            )
+        else:
+            Task.objects.filter(pk=job.id).update(
+                status=Task.Status.PENDING,
+                locked_at=None,
+                last_error=error,
+                run_after=timezone.now() + retry_delay(job.attempts),
+            )
+
+
+class RedisBackend:
+    """
+    Redis-backed queue. Ready jobs live in a sorted set scored by priority and
+    enqueue time, delayed retries in a second sorted set scored by due time.
+    A claimed job moves atomically into a ``processing`` set scored by the end
+    of its lease (``LOCK_TIMEOUT``) until it completes or fails; leases that
+    run out, because the worker died, are put back in the ready set.
+    Requires the ``redis`` package.
+    """
+
+    # Pop the next ready job and lease it in one step, so a crash in between cannot lose it.
+    CLAIM_SCRIPT = """
+    local popped = redis.call('ZPOPMIN', KEYS[1])
+    if #popped == 0 then
+        return false
+    end
+    redis.call('ZADD', KEYS[2], ARGV[1], popped[1])
+    return popped[1]
+    """
+
+    def __init__(self, url, prefix="file_versions:tasks"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._claim = self.client.register_script(self.CLAIM_SCRIPT)
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + parts)
+
+    def _score(self, priority, when):
+        # Lower scores pop first: higher priority wins, then FIFO.
+        return -priority * 10**11 + when
+
+    def enqueue(self, name, payload, *, priority, idempotency_key, max_attempts, run_after):
+        if idempotency_key is not None:
+            if not self.client.set(self._key("idem", name, idempotency_key), 1, nx=True):
+                return False
+        job_id = uuid.uuid4().hex
+        job = {"name": name, "payload": payload, "priority": priority, "attempts": 0, "max_attempts": max_attempts}
+        pipe = self.client.pipeline()
+        pipe.hset(self._key("jobs"), job_id, json.dumps(job))
+        due = run_after.timestamp()
+        if due > time.time():
+            pipe.zadd(self._key("delayed"), {job_id: due})
+        else:
+            pipe.zadd(self._key("ready"), {job_id: self._score(priority, due)})
+        pipe.execute()
+        return True
+
+    def _promote_delayed(self):
+        now = time.time()
+        # Due retries, and jobs whose worker let the lease run out.
+        for queue in ("delayed", "processing"):
+            for job_id in self.client.zrangebyscore(self._key(queue), 0, now):
+                # Only the worker that removes it requeues it.
+                if self.client.zrem(self._key(queue), job_id):
+                    raw = self.client.hget(self._key("jobs"), job_id)
+                    priority = json.loads(raw)["priority"] if raw else 0
+                    self.client.zadd(self._key("ready"), {job_id: self._score(priority, now)})
+
+    def claim(self):
+        self._promote_delayed()
+        lease_expiry = time.time() + queue_settings()["LOCK_TIMEOUT"]
+        job_id = self._claim(keys=[self._key("ready"), self._key("processing")], args=[lease_expiry])
+        if job_id is None:
+            return None
+        job_id = job_id.decode()
+        raw = self.client.hget(self._key("jobs"), job_id)
+        if raw is None:
+            # Completed by a worker whose lease had run out.
+            self.client.zrem(self._key("processing"), job_id)
+            return None
+        data = json.loads(raw)
+        data["attempts"] += 1
+        self.client.hset(self._key("jobs"), job_id, json.dumps(data))
+        return Job(
+            id=job_id,
+            name=data["name"],
+            payload=data["payload"],
+            attempts=data["attempts"],
+            max_attempts=data["max_attempts"],
+        )
+
+    def complete(self, job):
+        pipe = self.client.pipeline()
+        pipe.zrem(self._key("processing"), job.id)
+        pipe.hdel(self._key("jobs"), job.id)
+        pipe.execute()
+
+    def fail(self, job, error):
+        pipe = self.client.pipeline()
+        pipe.zrem(self._key("processing"), job.id)
+        if job.attempts >= job.max_attempts:
+            pipe.hdel(self._key("jobs"), job.id)
+            pipe.hset(self._key("failed"), job.id, json.dumps({"name": job.name, "error": error}))
+        else:
+            due = (timezone.now() + retry_delay(job.attempts)).timestamp()
+            pipe.zadd(self._key("delayed"), {job.id: due})
+        pipe.execute()
@@ -0,0 +1,164 @@
+"""
+Version retention.
+
+Each file is governed by the most specific ``RetentionPolicy`` that matches
+it: a policy for the file's owner wins over one for everyone, then the
+longest matching ``path_prefix`` wins. A version is kept if any rule of the
+policy keeps it:
+
+- ``keep_last``: the N newest versions.
+- ``keep_daily`` / ``keep_weekly`` / ``keep_monthly``: the newest version of
+  each of the N most recent days / ISO weeks / months that have versions.
+- ``keep_within``: every version younger than the duration.
+
+The latest version is always kept, and version numbers are never reused or
+renumbered. ``apply_retention`` walks files in batches and deletes expired
+versions in short transactions of at most ``batch_size`` rows. File
+aggregates are adjusted in bulk, and the freed blobs go through
+``blobs.release_blobs``. Each run then deletes the blobs released (by
+retention, the admin or the API) longer than ``grace`` ago.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .blobs import delete_released_blobs, release_blobs
+from .models.file import File
+from .models.file_version import FileVersion
+from .models.retention_policy import RetentionPolicy
+
+BUCKETS = {
+    "keep_daily": lambda local: local.date(),
+    "keep_weekly": lambda local: local.isocalendar()[:2],
+    "keep_monthly": lambda local: (local.year, local.month),
+}
+
+
+@dataclass
+class RetentionStats:
+    files: int = 0
+    expired: int = 0
+    bytes: int = 0
+    blobs_freed: int = 0
+    blobs_deleted: int = 0
+
+
+def policy_for(policies, user_id, name):
+    """The most specific policy in ``policies`` matching a file, or None."""
+    best = None
+    for policy in policies:
+        if policy.user_id not in (None, user_id) or not name.startswith(policy.path_prefix):
+            continue
+        rank = (policy.user_id is not None, len(policy.path_prefix))
+        if best is None or rank > best[0]:
+            best = (rank, policy)
+    return best[1] if best else None
+
+
+def kept_versions(versions, policy, now):
+    """
+    Ids of ``versions`` (``id``, ``version_number``, ``created_at``) that
+    ``policy`` keeps at time ``now``.
+    """
+    newest_first = sorted(versions, key=lambda version: version.version_number, reverse=True)
+    rules = [policy.keep_last, policy.keep_daily, policy.keep_weekly, policy.keep_monthly, policy.keep_within]
+    if all(rule is None for rule in rules):
+        return {version.id for version in newest_first}
+
+    keep = {version.id for version in newest_first[:max(1, policy.keep_last or 0)]}
+    if policy.keep_within is not None:
+        keep.update(version.id for version in newest_first if version.created_at >= now - policy.keep_within)
+    for field, bucket_of in BUCKETS.items():
+        count = getattr(policy, field)
+        if not count:
+            continue
+        seen = set()
+        for version in newest_first:
+            bucket = bucket_of(timezone.localtime(version.created_at))
+            if bucket not in seen:
+                if len(seen) == count:
+                    break
+                seen.add(bucket)
+                keep.add(version.id)
+    return keep
+
+
+def delete_versions(versions):
+    """Delete ``versions`` in one transaction, keeping file aggregates and blob references right."""
+    per_file = defaultdict(lambda: [0, 0])
+    released = defaultdict(set)
+    for version in versions:
+        per_file[version.file_obj_id][0] += 1
+        per_file[version.file_obj_id][1] += version.size
+        released[version.content_hash].add(version.file.name)
+
+    ids = [version.id for version in versions]
+    with transaction.atomic():
+        # Bypasses the per-row post_delete aggregates, and with them the
+        # SET_NULL on File.latest_version; both are adjusted here instead.
+        File.objects.filter(latest_version__in=ids).update(latest_version=None)
+        FileVersion.objects.filter(pk__in=ids)._raw_delete(FileVersion.objects.db)
+        for file_id, (count, size) in per_file.items():
+            File.objects.filter(pk=file_id).update(
+                version_count=F("version_count") - count,
+                total_bytes=F("total_bytes") - size,
+            )
+        File.objects.filter(pk__in=list(per_file), latest_version__isnull=True).update(
+            latest_version=Subquery(
+                FileVersion.objects.filter(file_obj=OuterRef("pk")).order_by("-version_number").values("pk")[:1]
+            )
+        )
+        return release_blobs(released)
+
+
+def apply_retention(batch_size=500, now=None, dry_run=False, user=None, grace=timedelta(hours=1)):
+    now = now or timezone.now()
+    stats = RetentionStats()
+    policies = RetentionPolicy.objects.all()
+    if user is not None:
+        policies = policies.filter(Q(user__isnull=True) | Q(user=user))
+    policies = list(policies)
+    if policies:
+        expire_versions(stats, policies, batch_size, now, dry_run, user)
+    stats.blobs_deleted = delete_released_blobs(grace=grace, batch_size=batch_size, dry_run=dry_run)
+    return stats
+
+
+def expire_versions(stats, policies, batch_size, now, dry_run, user):
+
+    files = File.objects.filter(version_count__gt=1).order_by("pk")
+    if user is not None:
+        files = files.filter(user=user)
+    last_pk = 0
+    while True:
+        batch = list(files.filter(pk__gt=last_pk).values_list("pk", "user_id", "name")[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        governed = {pk: policy for pk, user_id, name in batch if (policy := policy_for(policies, user_id, name))}
+        if not governed:
+            continue
+
+        by_file = defaultdict(list)
+        for version in FileVersion.objects.filter(file_obj_id__in=governed).only(
+            "id", "file_obj_id", "version_number", "created_at", "size", "content_hash", "file"
+        ):
+            by_file[version.file_obj_id].append(version)
+
+        expired = []
+        for file_id, versions in by_file.items():
+            keep = kept_versions(versions, governed[file_id], now)
+            stale = [version for version in versions if version.id not in keep]
+            if stale:
+                stats.files += 1
+                expired.extend(stale)
+        stats.expired += len(expired)
+        stats.bytes += sum(version.size for version in expired)
+        if dry_run:
+            continue
+        for start in range(0, len(expired), batch_size):
+            stats.blobs_freed += len(delete_versions(expired[start:start + batch_size]))
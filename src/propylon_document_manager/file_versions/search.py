@@ -0,0 +1,176 @@
+"""
+Full-text search over the contents of uploaded versions.
+
+Text is extracted once per unique ``content_hash`` into ``DocumentText`` by
+the ``file_versions.index_text`` task. Queries go to SQLite FTS5 or Postgres
+``tsvector`` depending on the database, with a plain ``LIKE`` fallback for
+anything else.
+"""
+import mimetypes
+import re
+
+from django.conf import settings
+from django.db import connection
+
+from .models.document_text import DocumentText
+from .models.file_version import FileVersion
+
+TEXT_MIME_TYPES = {"application/json", "application/xml", "application/xhtml+xml"}
+SCOPE_LATEST = "latest"
+SCOPE_ALL = "all"
+SCOPES = (SCOPE_LATEST, SCOPE_ALL)
+
+_word_re = re.compile(r"\w+", re.UNICODE)
+
+
+def is_text_type(mime_type):
+    return not mime_type or mime_type.startswith("text/") or mime_type in TEXT_MIME_TYPES
+
+
+def extract_text(file, mime_type=None):
+    """Return the text of ``file`` or None when it does not look like text."""
+    if not is_text_type(mime_type):
+        return None
+    data = file.read(settings.SEARCH_MAX_EXTRACT_BYTES)
+    if b"\x00" in data[:1024]:
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def index_blob(content_hash):
+    if DocumentText.objects.filter(content_hash=content_hash).exists():
+        return
+    file_version = (
+        FileVersion.objects.filter(content_hash=content_hash).exclude(file="").select_related("file_obj").first()
+    )
+    if file_version is None or not file_version.file:
+        return
+    mime_type = file_version.mime_type or mimetypes.guess_type(file_version.file_obj.name)[0]
+    with file_version.file.open("rb") as blob:
+        text = extract_text(blob, mime_type)
+    if text:
+        DocumentText.objects.get_or_create(content_hash=content_hash, defaults={"text": text})
+
+
+class SearchResults:
+    """
+    Lazily evaluated, sliceable result set so Django's paginator can run
+    one COUNT and one LIMIT/OFFSET query per page.
+    """
+
+    def __init__(self, backend, user, query, scope):
+        self.backend = backend
+        self.user = user
+        self.query = query
+        self.scope = scope
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.user, self.query, self.scope)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        offset = item.start or 0
+        limit = (item.stop - offset) if item.stop is not None else self.count() - offset
+        ranked = self.backend.ranked_ids(self.user, self.query, self.scope, limit, offset)
+        versions = FileVersion.objects.select_related("file_obj", "user").in_bulk([pk for pk, _ in ranked])
+        results = []
+        for pk, rank in ranked:
+            version = versions.get(pk)
+            if version is not None:
+                version.rank = rank
+                results.append(version)
+        return results
+
+
+class BaseSearchBackend:
+    match_sql = None
+    rank_sql = None
+    join_sql = ""
+
+    def terms(self, query):
+        return _word_re.findall(query)
+
+    def match_param(self, query):
+        return query
+
+    def rank_params(self, query):
+        return []
+
+    def _where(self, user, query, scope):
+        sql = (
+            f" FROM file_versions_documenttext dt {self.join_sql}"
+            " JOIN file_versions_fileversion fv ON fv.content_hash = dt.content_hash"
+            f" WHERE {self.match_sql} AND fv.user_id = %s"
+        )
+        if scope == SCOPE_LATEST:
+            sql += " AND fv.id IN (SELECT f.latest_version_id FROM file_versions_file f WHERE f.user_id = %s)"
+            return sql, [self.match_param(query), user.pk, user.pk]
+        return sql, [self.match_param(query), user.pk]
+
+    def count(self, user, query, scope):
+        if not self.terms(query):
+            return 0
+        sql, params = self._where(user, query, scope)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*)" + sql, params)
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, user, query, scope, limit, offset):
+        if not self.terms(query) or limit <= 0:
+            return []
+        sql, params = self._where(user, query, scope)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT fv.id, {self.rank_sql} AS score" + sql + " ORDER BY score DESC, fv.id DESC LIMIT %s OFFSET %s",
+                self.rank_params(query) + params + [limit, offset],
+            )
+            return cursor.fetchall()
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    join_sql = "JOIN file_versions_documenttext_fts fts ON fts.rowid = dt.id"
+    match_sql = "file_versions_documenttext_fts MATCH %s"
+    # bm25() is lower for better matches.
+    rank_sql = "-bm25(file_versions_documenttext_fts)"
+
+    def match_param(self, query):
+        # Quote every term so user input can never be parsed as FTS5 syntax.
+        return " ".join('"%s"' % term for term in self.terms(query))
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    match_sql = "dt.search_vector @@ websearch_to_tsquery('english', %s)"
+    rank_sql = "ts_rank_cd(dt.search_vector, websearch_to_tsquery('english', %s))"
+
+    def rank_params(self, query):
+        return [query]
+
+
+class SubstringSearchBackend(BaseSearchBackend):
+    match_sql = "dt.text LIKE %s"
+    rank_sql = "0"
+
+    def match_param(self, query):
+        return "%%%s%%" % query
+
+
+def get_search_backend():
+    if connection.vendor == "sqlite":
+        return SQLiteSearchBackend()
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return SubstringSearchBackend()
+
+
+def search(user, query, scope=SCOPE_LATEST):
+    return SearchResults(get_search_backend(), user, query, scope)
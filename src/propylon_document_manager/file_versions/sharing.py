@@ -0,0 +1,118 @@
+"""
+Signed, expiring share links.
+
+A share link carries everything needed to serve the blob: the content hash,
+the expiry time, the download file name and MIME type, signed with
+``django.core.signing`` (HMAC-SHA256 over ``SECRET_KEY``, honouring
+``SECRET_KEY_FALLBACKS`` for key rotation). ``shared_download`` checks the
+signature and expiry and opens the content-addressed blob straight from
+storage, without a database query, an authentication lookup or a session, so
+a cache or CDN in front of ``/share/`` can serve shared documents.
+
+Expiry times are rounded up to a multiple of ``SHARE_LINK_EXPIRY_STEP``, so
+links minted for one version close together are identical and share a cache
+entry. Responses are ``public`` and cacheable until the link expires; the
+ETag is the content hash.
+
+Packed blobs (see file_versions.packs) still need their ``PackEntry`` to be
+found in a pack, which is one indexed query.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, Http404, HttpResponseForbidden, HttpResponseGone
+from django.urls import reverse
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .models.file_version import FileVersion
+from .storage import blob_name
+
+SALT = "propylon_document_manager.file_versions.share"
+# Read size when a shared blob is streamed through Python.
+BLOCK_SIZE = 256 * 1024
+
+
+class ExpiredLink(Exception):
+    pass
+
+
+def link_expiry(ttl=None, now=None):
+    """
+    Expiry time (epoch seconds) of a link minted at ``now`` that should last
+    ``ttl`` seconds, by default ``SHARE_LINK_TTL`` and at most ``SHARE_LINK_MAX_TTL``.
+    """
+    now = time.time() if now is None else now
+    ttl = max(1, min(int(settings.SHARE_LINK_TTL if ttl is None else ttl), settings.SHARE_LINK_MAX_TTL))
+    step = settings.SHARE_LINK_EXPIRY_STEP
+    return int(math.ceil((now + ttl) / step) * step)
+
+
+def sign_share(file_version, expires):
+    """Signed token for ``file_version`` that is valid until ``expires``."""
+    payload = {
+        "h": file_version.content_hash,
+        "e": expires,
+        "n": file_version.file_obj.name.rpartition("/")[2],
+        "t": file_version.mime_type,
+    }
+    if file_version.file.name != blob_name(file_version.content_hash):
+        # Stored before blobs were content-addressed.
+        payload["p"] = file_version.file.name
+    return signing.dumps(payload, salt=SALT, compress=True)
+
+
+def read_share(token, now=None):
+    """
+    The payload of a valid token. Raises ``signing.BadSignature`` for
+    tampered tokens and ``ExpiredLink`` for expired ones.
+    """
+    payload = signing.loads(token, salt=SALT)
+    now = time.time() if now is None else now
+    if payload["e"] <= now:
+        raise ExpiredLink(token)
+    return payload
+
+
+def share_base_url(request):
+    """Absolute URL that tokens are appended to."""
+    return request.build_absolute_uri(reverse("shared-download", args=["-"]))[:-1]
+
+
+def share_url(request, file_version, expires=None, base_url=None):
+    expires = link_expiry() if expires is None else expires
+    return (base_url or share_base_url(request)) + sign_share(file_version, expires)
+
+
+@require_safe
+def shared_download(request, token):
+    try:
+        payload = read_share(token)
+    except ExpiredLink:
+        response = HttpResponseGone("This link has expired.")
+    except (signing.BadSignature, KeyError, TypeError):
+        response = HttpResponseForbidden("Invalid link.")
+    else:
+        response = None
+    if response is not None:
+        add_never_cache_headers(response)
+        return response
+
+    etag = '"%s"' % payload["h"]
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        storage = FileVersion._meta.get_field("file").storage
+        try:
+            blob = storage.open(payload.get("p") or blob_name(payload["h"]), "rb")
+        except FileNotFoundError:
+            raise Http404("Blob not found.")
+        # Local blobs keep their file descriptor for wsgi.file_wrapper (sendfile).
+        response = FileResponse(blob, as_attachment=True, filename=payload["n"], content_type=payload["t"] or None)
+        response.block_size = BLOCK_SIZE
+    response["ETag"] = etag
+    response["Expires"] = http_date(payload["e"])
+    patch_cache_control(response, public=True, immutable=True, max_age=max(0, int(payload["e"] - time.time())))
+    return response
@@ -0,0 +1,54 @@
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .blobs import release_blobs
+from .hash_filter import record_hashes
+from .models.file import File
+from .models.file_version import FileVersion
+
+
+def record_version(version):
+    """Add ``version`` to its file's denormalised aggregates."""
+    File.objects.filter(pk=version.file_obj_id).update(
+        version_count=F("version_count") + 1,
+        total_bytes=F("total_bytes") + version.size,
+    )
+    File.objects.filter(pk=version.file_obj_id).filter(
+        Q(latest_version__isnull=True) | Q(latest_version__version_number__lt=version.version_number)
+    ).update(latest_version=version)
+
+    # Keep an already loaded parent in step so responses show the new totals.
+    if FileVersion.file_obj.is_cached(version):
+        file_obj = version.file_obj
+        file_obj.version_count += 1
+        file_obj.total_bytes += version.size
+        if file_obj.latest_version_id is None or (
+            File.latest_version.is_cached(file_obj)
+            and file_obj.latest_version.version_number < version.version_number
+        ):
+            file_obj.latest_version = version
+
+
+def forget_version(version):
+    """Remove ``version`` from its file's aggregates, moving ``latest_version`` back if needed."""
+    File.objects.filter(pk=version.file_obj_id).update(
+        version_count=F("version_count") - 1,
+        total_bytes=F("total_bytes") - version.size,
+    )
+    # The SET_NULL on File.latest_version has already run when the latest version is deleted.
+    previous = FileVersion.objects.filter(file_obj_id=version.file_obj_id).order_by("-version_number").first()
+    File.objects.filter(pk=version.file_obj_id, latest_version__isnull=True).update(latest_version=previous)
+
+
+@receiver(post_save, sender=FileVersion)
+def file_version_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_version(instance)
+        record_hashes([instance.content_hash])
+
+
+@receiver(post_delete, sender=FileVersion)
+def file_version_deleted(sender, instance, **kwargs):
+    forget_version(instance)
+    release_blobs({instance.content_hash: {instance.file.name}})
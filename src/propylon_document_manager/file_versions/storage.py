@@ -0,0 +1,412 @@
+"""
+Blob storage backends.
+
+``TieredStorage`` puts a size-bounded local disk cache in front of any Django
+storage (typically remote object storage).
+
+Cached blobs are keyed by content hash, so identical content stored under
+several names is cached once. A small name index maps storage names to
+hashes. The hash is computed while a blob streams into the cache, so the
+storage needs nothing from the database.
+
+- Admission: a blob enters the cache on its ``admit_after``-th miss. One-off
+  reads such as verification or a full scan do not push out the working set.
+  Blobs larger than ``max_object_bytes`` are never cached.
+- Eviction: least recently used by file mtime, which is touched on every hit.
+  Eviction runs when the cache grows past ``max_bytes`` and trims it to 90%.
+  Several processes can share one cache directory; a race only costs an
+  extra miss.
+- Prefetch: ``prefetch(name)`` pulls a blob in regardless of admission. The
+  ``file_versions.prefetch_version`` task uses it to warm the latest version of
+  files whose older versions are being downloaded.
+
+``ShardedStorage`` spreads blobs over several filesystem roots with
+consistent hashing on the content hash (see its docstring).
+
+Saving a content-addressed name (``.../<sha256>``) that is already stored
+keeps the stored blob, which has the same bytes, instead of writing a copy
+under a suffixed name such as ``<sha256>_AbC123``.
+"""
+import bisect
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+from propylon_document_manager.utils.metrics import STORAGE_CACHE, InstrumentedFileSystemStorage
+
+COPY_CHUNK = 1024 * 1024
+HASH_NAME = re.compile(r"(?:^|/)([0-9a-f]{64})$")
+
+
+def blob_name(content_hash):
+    """Content-addressed storage name, fanned out so no directory grows too large."""
+    return posixpath.join(settings.FILE_UPLOAD_DIR, content_hash[:2], content_hash[2:4], content_hash)
+
+
+def find_backend(storage, cls):
+    """The first storage of type ``cls`` in a chain of wrappers (``.backend``), or None."""
+    while storage is not None and not isinstance(storage, cls):
+        storage = getattr(storage, "backend", None)
+    return storage
+
+
+@deconstructible(path="propylon_document_manager.file_versions.storage.BlobFileSystemStorage")
+class BlobFileSystemStorage(InstrumentedFileSystemStorage):
+    """Filesystem storage that stores each content-addressed blob once."""
+
+    def get_available_name(self, name, max_length=None):
+        if HASH_NAME.search(name) and self.exists(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if HASH_NAME.search(name) is None:
+            return super()._save(name, content)
+        if self.exists(name):
+            return name
+        # Written aside and renamed into place: FileSystemStorage retries a name
+        # taken meanwhile with get_available_name, which keeps blob names as they are.
+        partial = super()._save("%s.%s.partial" % (name, uuid.uuid4().hex), content)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+
+def blob_upload_to(instance, filename):
+    if instance.content_hash:
+        return blob_name(instance.content_hash)
+    return posixpath.join(settings.FILE_UPLOAD_DIR, filename)
+
+
+@deconstructible(path="propylon_document_manager.file_versions.storage.TieredStorage")
+class TieredStorage(Storage):
+    def __init__(
+        self,
+        backend="propylon_document_manager.file_versions.storage.BlobFileSystemStorage",
+        backend_options=None,
+        cache_dir="/tmp/pdm-blob-cache",
+        max_bytes=10 * 1024**3,
+        max_object_bytes=None,
+        admit_after=2,
+    ):
+        self.backend = import_string(backend)(**(backend_options or {}))
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes or max_bytes // 8
+        self.admit_after = admit_after
+        self._misses = Counter()
+        self._lock = threading.Lock()
+        self._cached_bytes = None
+
+    # Cache layout
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.cache_dir, "blobs", content_hash[:2], content_hash)
+
+    def _name_path(self, name):
+        key = hashlib.sha256(name.encode()).hexdigest()
+        return os.path.join(self.cache_dir, "names", key[:2], key)
+
+    def cached_path(self, name):
+        """Local path of the cached copy of ``name``, or None."""
+        try:
+            with open(self._name_path(name)) as fh:
+                content_hash = fh.read().strip()
+        except FileNotFoundError:
+            return None
+        path = self._blob_path(content_hash)
+        return path if os.path.exists(path) else None
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    # Admission and eviction
+
+    def _should_admit(self, name):
+        with self._lock:
+            self._misses[name] += 1
+            admitted = self._misses[name] >= self.admit_after
+            if admitted:
+                del self._misses[name]
+            elif len(self._misses) > 100_000:
+                # Forget old candidates rather than growing without bound.
+                self._misses.clear()
+            return admitted
+
+    def _fetch(self, name):
+        """Copy ``name`` from the backend into the cache and return its local path."""
+        if self.backend.size(name) > self.max_object_bytes:
+            return None
+        tmp_dir = os.path.join(self.cache_dir, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out, self.backend.open(name, "rb") as source:
+                for chunk in source.chunks(COPY_CHUNK):
+                    sha256.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            content_hash = sha256.hexdigest()
+            path = self._blob_path(content_hash)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self._write_atomic(self._name_path(name), content_hash)
+        self._account(size)
+        return path
+
+    def _account(self, added):
+        with self._lock:
+            if self._cached_bytes is None:
+                self._cached_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._cached_bytes += added
+            over = self._cached_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def _entries(self):
+        root = os.path.join(self.cache_dir, "blobs")
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self, target=None):
+        """Remove least recently used blobs until the cache is at most ``target`` bytes."""
+        target = int(self.max_bytes * 0.9) if target is None else target
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            STORAGE_CACHE.inc(result="evicted")
+        with self._lock:
+            self._cached_bytes = total
+
+    def prefetch(self, name):
+        """Bring ``name`` into the cache, bypassing admission. Returns True if it is cached."""
+        if self.cached_path(name):
+            return True
+        return self._fetch(name) is not None
+
+    # Storage API
+
+    def _open(self, name, mode="rb"):
+        if "r" not in mode or "+" in mode:
+            return self.backend.open(name, mode)
+        path = self.cached_path(name)
+        if path:
+            STORAGE_CACHE.inc(result="hit")
+            try:
+                os.utime(path)
+                return File(open(path, mode), name=name)
+            except FileNotFoundError:
+                # Evicted by another process since the lookup.
+                pass
+        STORAGE_CACHE.inc(result="miss")
+        if self._should_admit(name):
+            path = self._fetch(name)
+            if path:
+                return File(open(path, mode), name=name)
+        return self.backend.open(name, mode)
+
+    def _save(self, name, content):
+        return self.backend.save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        return self.backend.get_available_name(name, max_length=max_length)
+
+    def delete(self, name):
+        self.backend.delete(name)
+        # The blob itself may back other names; leave it to LRU eviction.
+        try:
+            os.unlink(self._name_path(name))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+class HashRing:
+    """Consistent hash ring with ``replicas`` virtual nodes per unit of weight."""
+
+    def __init__(self, weights, replicas=128):
+        self._points = []
+        for node, weight in weights.items():
+            for index in range(int(weight * replicas)):
+                self._points.append((self._hash(f"{node}#{index}"), node))
+        self._points.sort()
+        self._keys = [point for point, _ in self._points]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "big")
+
+    def node_for(self, key):
+        if not self._points:
+            raise ValueError("The hash ring has no nodes with a positive weight.")
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._points)
+        return self._points[index][1]
+
+
+@deconstructible(path="propylon_document_manager.file_versions.storage.ShardedStorage")
+class ShardedStorage(Storage):
+    """
+    Spreads blobs over several filesystem roots (disks or mounts) with
+    consistent hashing. Content-addressed names (``.../<sha256>``) are placed
+    by their hash; any other name by the name itself.
+
+    ``roots`` maps a root name to ``{"location": path, "weight": n}``. Adding a
+    root, or removing one by setting its weight to 0, only moves the blobs
+    whose ring position changes owner; ``django-admin rebalance_blobs`` moves
+    them. Until it has run, reads and deletes fall back to every other root,
+    so nothing becomes unreadable mid-migration.
+    """
+
+    def __init__(self, roots=None, base_url=None):
+        self.roots = {
+            name: BlobFileSystemStorage(location=config["location"], base_url=base_url)
+            for name, config in (roots or {}).items()
+        }
+        self.ring = HashRing({name: config.get("weight", 1) for name, config in (roots or {}).items()})
+
+    def placement_key(self, name):
+        match = HASH_NAME.search(name)
+        return match.group(1) if match else name
+
+    def owner(self, name):
+        return self.ring.node_for(self.placement_key(name))
+
+    def locate(self, name):
+        """Name of the root holding ``name``: its owner, or wherever it still lives."""
+        owner = self.owner(name)
+        if self.roots[owner].exists(name):
+            return owner
+        for root, storage in self.roots.items():
+            if root != owner and storage.exists(name):
+                return root
+        return None
+
+    def _storage_for(self, name):
+        return self.roots[self.locate(name) or self.owner(name)]
+
+    def _open(self, name, mode="rb"):
+        return self._storage_for(name).open(name, mode)
+
+    def _save(self, name, content):
+        if HASH_NAME.search(name) and self.exists(name):
+            # Possibly on another root until rebalanced; one copy is enough.
+            return name
+        return self.roots[self.owner(name)].save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        if HASH_NAME.search(name) and self.exists(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def delete(self, name):
+        for storage in self.roots.values():
+            storage.delete(name)
+
+    def exists(self, name):
+        return self.locate(name) is not None
+
+    def listdir(self, path):
+        directories, files = set(), set()
+        for storage in self.roots.values():
+            if storage.exists(path):
+                root_directories, root_files = storage.listdir(path)
+                directories.update(root_directories)
+                files.update(root_files)
+        return sorted(directories), sorted(files)
+
+    def path(self, name):
+        return self._storage_for(name).path(name)
+
+    def size(self, name):
+        return self._storage_for(name).size(name)
+
+    def url(self, name):
+        # Blobs are never web-served (see site.urls); this only names them.
+        return self._storage_for(name).url(name)
+
+    def get_accessed_time(self, name):
+        return self._storage_for(name).get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self._storage_for(name).get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self._storage_for(name).get_modified_time(name)
+
+    def misplaced(self):
+        """Yield ``(name, current_root, owner)`` for every blob not on its owner root."""
+        for root, storage in self.roots.items():
+            for dirpath, _, filenames in os.walk(storage.location):
+                for filename in filenames:
+                    relative = os.path.relpath(os.path.join(dirpath, filename), storage.location)
+                    name = relative.replace(os.sep, "/")
+                    owner = self.owner(name)
+                    if owner != root:
+                        yield name, root, owner
+
+    def move(self, name, source, target):
+        """Copy ``name`` to ``target`` (atomically) and remove it from ``source``."""
+        source_path = self.roots[source].path(name)
+        target_path = self.roots[target].path(name)
+        if not os.path.exists(target_path):
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target_path))
+            with os.fdopen(fd, "wb") as out, open(source_path, "rb") as src:
+                shutil.copyfileobj(src, out, COPY_CHUNK)
+            os.replace(tmp, target_path)
+        os.unlink(source_path)
@@ -0,0 +1,51 @@
+import hashlib
+
+from django.conf import settings
+
+from .hashing import parse_tree_hash, read_blocks, tree_hash
+from .models.file_version import FileVersion
+from .queue import register
+from .search import index_blob
+
+
+class BlobIntegrityError(Exception):
+    pass
+
+
+@register("file_versions.verify_blob")
+def verify_blob(content_hash):
+    """
+    Re-read a freshly stored blob and check it still matches its hash. Blobs
+    with a tree hash are verified block by block on the hashing pool. Local
+    blobs are hashed straight from an mmap of the file.
+    """
+    file_version = FileVersion.objects.filter(content_hash=content_hash).exclude(file="").first()
+    if file_version is None or not file_version.file:
+        return
+    with file_version.file.open("rb") as blob:
+        if file_version.tree_hash:
+            chunk_size, root = parse_tree_hash(file_version.tree_hash)
+            valid = tree_hash(blob, chunk_size).root == root
+        else:
+            sha256 = hashlib.sha256()
+            for block in read_blocks(blob, settings.TREE_HASH_CHUNK_SIZE):
+                sha256.update(block)
+            valid = sha256.hexdigest() == content_hash
+    if not valid:
+        raise BlobIntegrityError(f"Stored blob {file_version.file.name} does not match {content_hash}.")
+
+
+@register("file_versions.index_text")
+def index_text(content_hash):
+    index_blob(content_hash)
+
+
+@register("file_versions.prefetch_version")
+def prefetch_version(file_version_id):
+    """Warm the local blob cache (see file_versions.storage) with a version's blob."""
+    file_version = FileVersion.objects.filter(pk=file_version_id).first()
+    if file_version is None or not file_version.file:
+        return
+    storage = file_version.file.storage
+    if hasattr(storage, "prefetch"):
+        storage.prefetch(file_version.file.name)
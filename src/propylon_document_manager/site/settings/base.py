@@ -3,6 +3,7 @@ Base settings to build other settings files upon.
 """
 from pathlib import Path
 
+import django
 import environ
 
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
@@ -48,8 +49,26 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": "propylon_document_manager.sqlite",
+        # Take the write lock when a transaction begins. A deferred transaction that
+        # later writes fails at once with "database is locked" instead of waiting
+        # for busy_timeout. The option exists from Django 5.1.
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"} if django.VERSION >= (5, 1) else {},
     }
 }
+# Aliases in DATABASES that receive safe reads (see utils.replicas).
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ["propylon_document_manager.utils.replicas.PrimaryReplicaRouter"]
+# Seconds a caller keeps reading from the primary after one of their writes.
+REPLICA_PIN_SECONDS = env.int("DJANGO_REPLICA_PIN_SECONDS", default=10)
+# Applied to every new SQLite connection (see utils.db). An empty dict disables tuning.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": env.int("DJANGO_SQLITE_MMAP_SIZE", default=256 * 1024 * 1024),
+    "busy_timeout": env.int("DJANGO_SQLITE_BUSY_TIMEOUT", default=5000),
+    "cache_size": -64000,
+    "temp_store": "MEMORY",
+}
 # https://docs.djangoproject.com/en/stable/ref/settings/#std:setting-DEFAULT_AUTO_FIELD
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -125,6 +144,10 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "propylon_document_manager.utils.metrics.MetricsMiddleware",
+    "propylon_document_manager.utils.tracing.TracingMiddleware",
+    "propylon_document_manager.utils.query_budget.QueryBudgetMiddleware",
+    "propylon_document_manager.utils.replicas.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -155,15 +178,97 @@ STATICFILES_FINDERS = [
 # MEDIA
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#media-root
+# Never serve MEDIA_ROOT from the web server: blobs are named by content hash,
+# which share tokens reveal.
 MEDIA_ROOT = str(BASE_DIR / "media")
 # https://docs.djangoproject.com/en/dev/ref/settings/#media-url
 MEDIA_URL = "/media/"
+# https://docs.djangoproject.com/en/dev/ref/settings/#storages
+STORAGES = {
+    "default": {
+        "BACKEND": env.str(
+            "DJANGO_STORAGE_BACKEND", default="propylon_document_manager.file_versions.storage.BlobFileSystemStorage"
+        )
+    },
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+# Spread blobs over several disks or mounts with consistent hashing on the
+# content hash (see file_versions.storage.ShardedStorage). Comma separated
+# "path" or "path=weight"; weight 0 drains a root. Run rebalance_blobs after
+# changing this.
+BLOB_ROOTS = env.list("DJANGO_BLOB_ROOTS", default=[])
+if BLOB_ROOTS:
+    STORAGES["default"] = {
+        "BACKEND": "propylon_document_manager.file_versions.storage.ShardedStorage",
+        "OPTIONS": {
+            "roots": {
+                path: {"location": path, "weight": float(weight or 1)}
+                for path, _, weight in (root.partition("=") for root in BLOB_ROOTS)
+            },
+            "base_url": MEDIA_URL,
+        },
+    }
+# Append blobs of up to DJANGO_PACK_THRESHOLD bytes to packfiles in this
+# directory instead of storing each as its own file (see file_versions.packs).
+PACK_DIR = env.str("DJANGO_PACK_DIR", default="")
+if PACK_DIR:
+    STORAGES["default"] = {
+        "BACKEND": "propylon_document_manager.file_versions.packs.PackedStorage",
+        "OPTIONS": {
+            "backend": STORAGES["default"]["BACKEND"],
+            "backend_options": STORAGES["default"].get("OPTIONS", {}),
+            "pack_dir": PACK_DIR,
+            "threshold": env.int("DJANGO_PACK_THRESHOLD", default=64 * 1024),
+            "max_pack_bytes": env.int("DJANGO_PACK_MAX_BYTES", default=256 * 1024**2),
+        },
+    }
+# Keep a size-bounded LRU cache of blobs on local disk in front of the storage
+# backend (see file_versions.storage) when a cache directory is configured.
+BLOB_CACHE_DIR = env.str("DJANGO_BLOB_CACHE_DIR", default="")
+if BLOB_CACHE_DIR:
+    STORAGES["default"] = {
+        "BACKEND": "propylon_document_manager.file_versions.storage.TieredStorage",
+        "OPTIONS": {
+            "backend": STORAGES["default"]["BACKEND"],
+            "backend_options": STORAGES["default"].get("OPTIONS", {}),
+            "cache_dir": BLOB_CACHE_DIR,
+            "max_bytes": env.int("DJANGO_BLOB_CACHE_MAX_BYTES", default=10 * 1024**3),
+            # Blobs are cached on their Nth miss, so one-off reads do not evict hot ones.
+            "admit_after": env.int("DJANGO_BLOB_CACHE_ADMIT_AFTER", default=2),
+        },
+    }
 
 # File upload settings
 # ------------------------------------------------------------------------------
 # Upload directory for file versions (relative to MEDIA_ROOT)
 FILE_UPLOAD_DIR = env.str("DJANGO_FILE_UPLOAD_DIR", default="uploads/")
 
+# Hashing
+# ------------------------------------------------------------------------------
+# Threads used to hash uploads and batches (0 = one per CPU).
+HASH_WORKERS = env.int("DJANGO_HASH_WORKERS", default=0)
+# Uploads of at least this many bytes are hashed off the request thread and get a tree hash.
+HASH_PARALLEL_THRESHOLD = env.int("DJANGO_HASH_PARALLEL_THRESHOLD", default=4 * 1024 * 1024)
+# Block size of the tree hash.
+TREE_HASH_CHUNK_SIZE = env.int("DJANGO_TREE_HASH_CHUNK_SIZE", default=1024 * 1024)
+
+# Diffs
+# ------------------------------------------------------------------------------
+# Versions whose combined size exceeds this get a summary instead of a diff.
+DIFF_MAX_BYTES = env.int("DJANGO_DIFF_MAX_BYTES", default=4 * 1024 * 1024)
+# Diffs are cached (compressed) up to this size, keyed by the two content hashes.
+DIFF_CACHE_MAX_BYTES = env.int("DJANGO_DIFF_CACHE_MAX_BYTES", default=1024 * 1024)
+
+# Share links
+# ------------------------------------------------------------------------------
+# Seconds a share link stays valid unless the caller asks for less or more.
+SHARE_LINK_TTL = env.int("DJANGO_SHARE_LINK_TTL", default=24 * 3600)
+# Longest validity a caller can ask for with ?expires_in=.
+SHARE_LINK_MAX_TTL = env.int("DJANGO_SHARE_LINK_MAX_TTL", default=7 * 24 * 3600)
+# Expiry times are rounded up to a multiple of this, so links minted close
+# together are identical and cached once by a CDN.
+SHARE_LINK_EXPIRY_STEP = env.int("DJANGO_SHARE_LINK_EXPIRY_STEP", default=3600)
+
 # TEMPLATES
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#templates
@@ -230,6 +335,11 @@ ADMIN_URL = "admin/"
 ADMINS = [("""Propylon""", "propylon@propylon.com")]
 # https://docs.djangoproject.com/en/dev/ref/settings/#managers
 MANAGERS = ADMINS
+# Changelists of tables the database estimates at this many rows or more show the
+# estimate instead of running COUNT(*) (see file_versions.admin).
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int("DJANGO_ADMIN_ESTIMATED_COUNT_THRESHOLD", default=100000)
+# Rows deleted per transaction by the admin's "Delete ... in batches" actions.
+ADMIN_ACTION_BATCH_SIZE = env.int("DJANGO_ADMIN_ACTION_BATCH_SIZE", default=1000)
 
 # LOGGING
 # ------------------------------------------------------------------------------
@@ -281,8 +391,88 @@ REST_FRAMEWORK = {
     "EXCEPTION_HANDLER": "propylon_document_manager.utils.custom_exception_handler",
 }
 
+# Most hashes accepted by one POST /api/file_versions/by_hashes/.
+BATCH_LOOKUP_MAX_HASHES = env.int("DJANGO_BATCH_LOOKUP_MAX_HASHES", default=10000)
+
+# Rows fetched and serialized at a time when a listing is streamed as NDJSON
+# ("Accept: application/x-ndjson" or ?format=ndjson).
+NDJSON_CHUNK_SIZE = env.int("DJANGO_NDJSON_CHUNK_SIZE", default=500)
+
 # django-cors-headers - https://github.com/adamchainz/django-cors-headers#setup
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Background tasks
+# ------------------------------------------------------------------------------
+# Post-upload processing queue, drained by `django-admin run_task_worker`.
+# Set the backend to "propylon_document_manager.file_versions.queue.RedisBackend"
+# with OPTIONS {"url": ...} to keep jobs in Redis instead of the database.
+TASK_QUEUE = {
+    "BACKEND": env.str(
+        "DJANGO_TASK_QUEUE_BACKEND",
+        default="propylon_document_manager.file_versions.queue.DatabaseBackend",
+    ),
+    "OPTIONS": {},
+    "MAX_ATTEMPTS": env.int("DJANGO_TASK_QUEUE_MAX_ATTEMPTS", default=3),
+    # Seconds before the first retry; doubled on each further attempt.
+    "RETRY_DELAY": env.int("DJANGO_TASK_QUEUE_RETRY_DELAY", default=5),
+    # Running jobs older than this are assumed lost and handed to another worker.
+    "LOCK_TIMEOUT": env.int("DJANGO_TASK_QUEUE_LOCK_TIMEOUT", default=600),
+}
+
+# Content hash filter
+# ------------------------------------------------------------------------------
+# Bloom filter of stored content hashes, so lookups of content that is not stored
+# skip the database. Off when BACKEND is empty. Backends:
+# "propylon_document_manager.file_versions.hash_filter.LocalHashFilter" (per process)
+# and "...hash_filter.RedisHashFilter" (shared; add {"url": ...} to OPTIONS).
+# Rebuild it with `django-admin rebuild_hash_filter`.
+HASH_FILTER = {
+    "BACKEND": env.str("DJANGO_HASH_FILTER_BACKEND", default=""),
+    "OPTIONS": {
+        # Written by rebuilds and read at startup instead of scanning the table.
+        "dump_path": env.str("DJANGO_HASH_FILTER_DUMP", default=""),
+        # Hashes the filter is sized for; a rebuild sizes it for twice the stored count if larger.
+        "capacity": env.int("DJANGO_HASH_FILTER_CAPACITY", default=1_000_000),
+        "error_rate": env.float("DJANGO_HASH_FILTER_ERROR_RATE", default=0.001),
+    },
+}
+if HASH_FILTER["BACKEND"].endswith(".LocalHashFilter"):
+    # Seconds between reads of versions created by other processes.
+    HASH_FILTER["OPTIONS"]["refresh_seconds"] = env.float("DJANGO_HASH_FILTER_REFRESH_SECONDS", default=1.0)
+
+# Metrics
+# ------------------------------------------------------------------------------
+# When set, /metrics requires "Authorization: Bearer <token>"; when empty it only
+# answers requests from localhost. Required in production.
+METRICS_TOKEN = env.str("DJANGO_METRICS_TOKEN", default="")
+
+# Query budgets
+# ------------------------------------------------------------------------------
+# Views declare per-action query budgets in `query_budgets`; requests over budget
+# or over MAX_QUERY_TIME_MS of SQL are logged with their statements.
+QUERY_BUDGET = {
+    # Budget for views that declare none (None = unlimited).
+    "DEFAULT_MAX_QUERIES": None,
+    "MAX_QUERY_TIME_MS": env.int("DJANGO_QUERY_BUDGET_MAX_TIME_MS", default=500),
+    # Individual statements slower than this are logged.
+    "SLOW_QUERY_MS": env.int("DJANGO_SLOW_QUERY_MS", default=100),
+    # Raise QueryBudgetExceeded instead of logging (enabled in tests).
+    "RAISE": False,
+}
+
+# Tracing
+# ------------------------------------------------------------------------------
+# Lets staff trace a request with "X-Trace: 1" ("X-Trace: profile" adds a
+# sampling profiler). Traces and collapsed stacks are written to TRACE_DIR.
+TRACE_ENABLED = env.bool("DJANGO_TRACE_ENABLED", default=False)
+TRACE_DIR = env.str("DJANGO_TRACE_DIR", default=str(BASE_DIR / "traces"))
+# Seconds between profiler samples.
+TRACE_PROFILE_INTERVAL = env.float("DJANGO_TRACE_PROFILE_INTERVAL", default=0.005)
+
+# Full-text search
+# ------------------------------------------------------------------------------
+# Only the first N bytes of each blob are extracted into the search index.
+SEARCH_MAX_EXTRACT_BYTES = env.int("DJANGO_SEARCH_MAX_EXTRACT_BYTES", default=5 * 1024 * 1024)
+
 # Your stuff...
 # ------------------------------------------------------------------------------
@@ -13,6 +13,14 @@ SECRET_KEY = env(
 # https://docs.djangoproject.com/en/dev/ref/settings/#allowed-hosts
 ALLOWED_HOSTS = ["localhost", "0.0.0.0", "127.0.0.1"]
 
+# DATABASES
+# ------------------------------------------------------------------------------
+# DJANGO_LOCAL_REPLICA=True routes safe reads to a second SQLite file; refresh it
+# from the primary with `django-admin sync_sqlite_replicas`.
+if env.bool("DJANGO_LOCAL_REPLICA", default=False):
+    DATABASES["replica"] = {**DATABASES["default"], "NAME": "propylon_document_manager_replica.sqlite"}  # noqa: F405
+    DATABASE_REPLICAS = ["replica"]
+
 # CACHES
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#caches
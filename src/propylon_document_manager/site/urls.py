@@ -1,5 +1,4 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from django.views import defaults as default_views
@@ -7,6 +6,8 @@ from django.views.generic import TemplateView
 from rest_framework.authtoken.views import obtain_auth_token
 
 from propylon_document_manager.file_versions.api.views import FileByPathView
+from propylon_document_manager.file_versions.sharing import shared_download
+from propylon_document_manager.utils.metrics import metrics_view
 
 # API URLS
 urlpatterns = [
@@ -16,9 +17,14 @@ urlpatterns = [
     # DRF auth token
     path("api-auth/", include("rest_framework.urls")),
     path("auth-token/", obtain_auth_token),
+    # Prometheus scrape target
+    path("metrics", metrics_view, name="metrics"),
+    # Signed share links, served without a database query (cacheable by a CDN)
+    path("share/<str:token>", shared_download, name="shared-download"),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# MEDIA_ROOT is deliberately not served: blob names are content hashes, which
+# share tokens carry readably, so a media URL would outlive every link.
 
 if settings.DEBUG:
     if "debug_toolbar" in settings.INSTALLED_APPS:
@@ -1,11 +1,19 @@
+import logging
+
 from rest_framework.views import exception_handler
 from rest_framework.response import Response
 from rest_framework import status
 
+logger = logging.getLogger(__name__)
+
 def custom_exception_handler(exc, context):
     response = exception_handler(exc, context)
     if response is not None:
         return response
+    from .metrics import UNHANDLED_EXCEPTIONS
+
+    UNHANDLED_EXCEPTIONS.inc(exception=type(exc).__name__)
+    logger.error("Unhandled API error in %s", context.get("view").__class__.__name__, exc_info=exc)
     return Response(
         {"detail": "An unexpected error occurred. Please contact support if the problem persists."},
         status=status.HTTP_500_INTERNAL_SERVER_ERROR
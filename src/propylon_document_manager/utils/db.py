@@ -0,0 +1,59 @@
+"""
+Per-connection database tuning.
+
+``configure_connection`` runs on ``connection_created``. For SQLite it
+applies ``settings.SQLITE_PRAGMAS``. WAL lets readers proceed while a writer
+commits, and ``synchronous=NORMAL`` is durable under WAL except on power
+loss. ``mmap_size`` serves reads from the page cache, and ``busy_timeout``
+makes a blocked writer wait instead of failing with "database is locked".
+The PRAGMAs go straight to the DB-API connection, past Django's execute
+wrappers, so they are not counted against the query budget of the request
+that happened to open the connection.
+
+``estimated_count`` reads a table's row count from the database's own
+bookkeeping instead of running ``COUNT(*)``, which scans the whole table.
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+    cursor = connection.connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+def estimated_count(model, using="default"):
+    """
+    Approximate number of rows in ``model``'s table, or None when the database
+    has no estimate. PostgreSQL and MySQL answer from table statistics as of
+    the last ANALYZE; SQLite from the largest rowid, which overcounts by the
+    rows deleted since.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        elif connection.vendor == "sqlite":
+            cursor.execute("SELECT max(rowid) FROM %s" % connection.ops.quote_name(table))
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for tables that were never analyzed.
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
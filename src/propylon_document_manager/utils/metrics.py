@@ -0,0 +1,251 @@
+"""
+In-process metrics exposed in the Prometheus text format on ``/metrics``.
+
+Counters and histograms are plain Python objects guarded by a lock, so
+recording a sample costs a dict lookup and a few additions. Values are per
+process; with several application workers each one reports its own series
+and the scrape target should be the individual worker.
+
+``/metrics`` requires ``settings.METRICS_TOKEN`` as a bearer token. Without
+a token (development) it only answers requests from the loopback interface.
+"""
+import bisect
+import ipaddress
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from .tracing import span
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = tuple(4 ** n * 1024 for n in range(10))  # 1 KiB .. 256 GiB
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{%s}" % ",".join(escaped)
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self.render_series(key, value) for key, value in series)
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._series.get(self._key(labels), 0)
+
+    def render_series(self, key, value):
+        return f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts plus running sum and count.
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render_series(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = format_labels(self.labelnames, key, [("le", format_value(bound))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {format_value(float(total))}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time spent serving a request.", ["view", "method", "status"]
+)
+REQUEST_QUERIES = REGISTRY.histogram(
+    "http_request_db_queries", "Database queries run while serving a request.", ["view"], COUNT_BUCKETS
+)
+DB_QUERY_LATENCY = REGISTRY.histogram("db_query_duration_seconds", "Time spent in database queries.", ["alias"])
+UPLOAD_BYTES = REGISTRY.histogram("upload_size_bytes", "Size of uploaded versions.", buckets=SIZE_BUCKETS)
+UPLOAD_DEDUP = REGISTRY.counter(
+    "upload_dedup_total", "Uploads by whether their content was already stored.", ["result"]
+)
+HASH_LATENCY = REGISTRY.histogram("upload_hash_duration_seconds", "Time spent hashing an upload.")
+STORAGE_LATENCY = REGISTRY.histogram(
+    "storage_operation_duration_seconds", "Time spent in blob storage operations.", ["operation"]
+)
+STORAGE_CACHE = REGISTRY.counter(
+    "storage_cache_total", "Local blob cache lookups and evictions.", ["result"]
+)
+STORAGE_BYTES = REGISTRY.counter("storage_bytes_total", "Bytes written to blob storage.", ["operation"])
+UNHANDLED_EXCEPTIONS = REGISTRY.counter(
+    "api_unhandled_exceptions_total", "API errors turned into a generic 500.", ["exception"]
+)
+
+
+class InstrumentedStorageMixin:
+    """Times opens and saves of a Django storage backend."""
+
+    def _open(self, name, mode="rb"):
+        with STORAGE_LATENCY.time(operation="read"), span("storage.read", path=name):
+            return super()._open(name, mode)
+
+    def _save(self, name, content):
+        with STORAGE_LATENCY.time(operation="write"), span("storage.write", path=name):
+            name = super()._save(name, content)
+        STORAGE_BYTES.inc(content.size, operation="write")
+        return name
+
+
+class InstrumentedFileSystemStorage(InstrumentedStorageMixin, FileSystemStorage):
+    pass
+
+
+class MetricsMiddleware:
+    """Records latency and query count for every request, labelled by URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                DB_QUERY_LATENCY.observe(time.perf_counter() - start, alias=context["connection"].alias)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start, view=view, method=request.method, status=response.status_code
+        )
+        REQUEST_QUERIES.observe(queries[0], view=view)
+        return response
+
+
+def is_loopback(address):
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def metrics_view(request):
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        allowed = constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    else:
+        allowed = is_loopback(request.META.get("REMOTE_ADDR", ""))
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,107 @@
+"""
+Per-request SQL accounting with per-view query budgets.
+
+Views declare budgets as a mapping of action (viewsets) or handler method
+(``get``, ``post`` on plain API views) to the most queries a request may run,
+authentication included::
+
+    class FileVersionViewSet(...):
+        query_budgets = {"list": 3, "retrieve": 3}
+
+Requests over their budget, or spending more than ``MAX_QUERY_TIME_MS`` in
+SQL, are logged with the statements they ran. With ``RAISE`` set (the test
+settings do) an exceeded query count raises ``QueryBudgetExceeded`` instead,
+so an N+1 regression fails the test that triggers it.
+"""
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "DEFAULT_MAX_QUERIES": None,
+    "MAX_QUERY_TIME_MS": 500,
+    "SLOW_QUERY_MS": 100,
+    "RAISE": False,
+}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def budget_settings():
+    return {**DEFAULTS, **getattr(settings, "QUERY_BUDGET", {})}
+
+
+def view_budget(view_func, method):
+    cls = getattr(view_func, "cls", None)
+    budgets = getattr(cls, "query_budgets", None)
+    if not budgets:
+        return None
+    actions = getattr(view_func, "actions", None) or {}
+    return budgets.get(actions.get(method, method))
+
+
+def extend_budget(request, queries):
+    """
+    Allow ``queries`` more on this request, for views whose query count grows
+    with their input in fixed-size batches.
+    """
+    request = getattr(request, "_request", request)
+    if getattr(request, "query_budget", None) is not None:
+        request.query_budget += queries
+
+
+def format_queries(queries):
+    return "\n".join("  %.1f ms  %s" % (duration * 1000, sql) for sql, duration in queries)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = budget_settings()
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                duration = time.perf_counter() - start
+                queries.append((sql, duration))
+                if duration * 1000 > config["SLOW_QUERY_MS"]:
+                    logger.warning("Slow query (%.1f ms) on %s: %s", duration * 1000, request.path, sql)
+
+        request.query_budget = config["DEFAULT_MAX_QUERIES"]
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record))
+            response = self.get_response(request)
+
+        budget = request.query_budget
+        total_ms = sum(duration for _, duration in queries) * 1000
+        if budget is not None and len(queries) > budget:
+            message = "%s %s ran %s queries, budget is %s:\n%s" % (
+                request.method, request.path, len(queries), budget, format_queries(queries)
+            )
+            if config["RAISE"]:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        elif total_ms > config["MAX_QUERY_TIME_MS"]:
+            logger.warning(
+                "%s %s spent %.1f ms in %s queries:\n%s",
+                request.method, request.path, total_ms, len(queries), format_queries(queries)
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = view_budget(view_func, request.method.lower())
+        if budget is not None:
+            request.query_budget = budget
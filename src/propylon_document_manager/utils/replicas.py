@@ -0,0 +1,76 @@
+"""
+Primary/replica routing for read-heavy traffic.
+
+``ReplicaRoutingMiddleware`` picks one of ``settings.DATABASE_REPLICAS`` for
+each safe (GET/HEAD/OPTIONS) request, and ``PrimaryReplicaRouter`` sends all
+of that request's reads to it, so they see one consistent snapshot. Everything else goes to ``default``: writes,
+unsafe requests, management commands and task workers.
+
+Read-your-writes: after an unsafe request the caller is pinned to the
+primary for ``REPLICA_PIN_SECONDS``, so their next reads do not hit a
+replica that has not caught up yet. Callers are identified before DRF
+authentication runs, by a hash of the Authorization header or the session
+cookie. Pins live in the default cache, which must be shared between
+workers (Redis in production) for pinning to hold across processes.
+"""
+import hashlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Alias of the replica serving the current request, or None for the primary.
+_replica = ContextVar("replica", default=None)
+
+
+def caller_key(request):
+    credential = request.headers.get("Authorization") or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return "replica-pin:" + hashlib.sha256(credential.encode()).hexdigest()
+
+
+def pin_to_primary(request):
+    key = caller_key(request)
+    if key:
+        cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(request):
+    key = caller_key(request)
+    return bool(key and cache.get(key))
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            pin_to_primary(request)
+            return response
+
+        token = _replica.set(None if is_pinned(request) else random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return self.get_response(request)
+        finally:
+            _replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
@@ -0,0 +1,244 @@
+"""
+Per-request tracing and sampling profiler.
+
+Staff users can ask for a trace of a single request by sending
+``X-Trace: 1``; ``X-Trace: profile`` also runs a sampling profiler. Spans
+(request, auth, permissions, queries, hashing, storage, serialization,
+rendering) are written to ``settings.TRACE_DIR`` as a Chrome trace-event file
+(open it in Perfetto or chrome://tracing) and profiler samples as collapsed
+stacks (``<id>.folded``, the input format of flamegraph.pl and speedscope).
+
+Nothing is traced or profiled until the view has authenticated the caller
+as staff (``TracedViewMixin``), so other callers cannot put tracing overhead
+on the server by sending the header. Only views using the mixin can be
+traced.
+
+Tracing is off unless ``settings.TRACE_ENABLED`` is set; without it the
+middleware removes itself at startup. Outside a traced request ``span()`` is
+a single context-variable lookup.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+_trace = ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.depth = 0
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            self.record(name, start, self.depth, **args)
+
+    def record(self, name, start, depth, **args):
+        self.spans.append((name, start - self.origin, time.perf_counter() - start, depth, args))
+
+    def trace_events(self):
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": round(start * 1e6, 1),
+                    "dur": round(duration * 1e6, 1),
+                    "pid": pid,
+                    "tid": depth,
+                    "args": args,
+                }
+                for name, start, duration, depth, args in sorted(self.spans, key=lambda s: s[1])
+            ],
+            "metadata": {"trace_id": self.id, "name": self.name},
+        }
+
+
+def span(name, **args):
+    """Time a block as part of the current trace; a no-op when nothing is traced."""
+    trace = _trace.get()
+    if trace is None:
+        return nullcontext()
+    return trace.span(name, **args)
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def trace_queries(execute, sql, params, many, context):
+    with span("db", alias=context["connection"].alias, sql=sql[:200]):
+        return execute(sql, params, many, context)
+
+
+def write_trace(trace, profiler=None):
+    os.makedirs(settings.TRACE_DIR, exist_ok=True)
+    base = os.path.join(settings.TRACE_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}-{trace.id}")
+    with open(base + ".trace.json", "w") as fh:
+        json.dump(trace.trace_events(), fh)
+    if profiler is not None:
+        with open(base + ".folded", "w") as fh:
+            fh.write(profiler.collapsed())
+    return base
+
+
+class RequestedTrace:
+    """
+    A trace asked for with the header. ``TracedViewMixin`` starts it once the
+    caller is known to be staff; the middleware stops and writes it.
+    """
+
+    def __init__(self, request, mode):
+        self.mode = mode
+        self.method = request.method
+        self.path = request.path
+        self.trace = Trace(f"{request.method} {request.path}")
+        self.profiler = None
+        self.started = False
+        self._token = None
+        self._connections = []
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        self._token = _trace.set(self.trace)
+        # Spans from here on are inside the "request" span recorded by stop().
+        self.trace.depth = 1
+        if self.mode == "profile":
+            self.profiler = SamplingProfiler(threading.get_ident(), settings.TRACE_PROFILE_INTERVAL)
+            self.profiler.__enter__()
+        for connection in connections.all():
+            # Outermost and removed by identity: the query budget middleware
+            # pushes and pops its own wrapper in between.
+            connection.execute_wrappers.insert(0, trace_queries)
+            self._connections.append(connection)
+
+    def stop(self):
+        if not self.started:
+            return
+        for connection in self._connections:
+            connection.execute_wrappers.remove(trace_queries)
+        if self.profiler is not None:
+            self.profiler.__exit__(None, None, None)
+        _trace.reset(self._token)
+        self.trace.depth = 0
+        self.trace.record("request", self.trace.origin, 0, method=self.method, path=self.path)
+
+
+class TracingMiddleware:
+    header = "X-Trace"
+
+    def __init__(self, get_response):
+        if not settings.TRACE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.headers.get(self.header)
+        if not mode:
+            return self.get_response(request)
+
+        requested = request.requested_trace = RequestedTrace(request, mode)
+        try:
+            response = self.get_response(request)
+        finally:
+            requested.stop()
+
+        if requested.started:
+            write_trace(requested.trace, requested.profiler)
+            response["X-Trace-Id"] = requested.trace.id
+        return response
+
+    def process_template_response(self, request, response):
+        # Called just before the handler renders the response (DRF responses included).
+        trace = _trace.get()
+        if trace is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: trace.record("render", start, 1))
+        return response
+
+
+class TracedViewMixin:
+    """
+    Starts a requested trace once a staff user is authenticated, and adds auth
+    and permission spans to a DRF view.
+    """
+
+    def perform_authentication(self, request):
+        start = time.perf_counter()
+        super().perform_authentication(request)
+        requested = getattr(request._request, "requested_trace", None)
+        if requested is not None and request.user.is_staff:
+            requested.start()
+            requested.trace.record("auth", start, 1)
+
+    def check_permissions(self, request):
+        with span("permissions"):
+            super().check_permissions(request)
+
+
+class TracedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with span("serialize", many=True):
+            return super().data
+
+
+class TracedSerializerMixin:
+    """Adds a serialization span; use with ``list_serializer_class = TracedListSerializer``."""
+
+    @property
+    def data(self):
+        with span("serialize"):
+            return super().data
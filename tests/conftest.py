@@ -1,4 +1,7 @@
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework.test import APIClient
 
 from propylon_document_manager.file_versions.models.user import User
 from .factories import UserFactory
@@ -15,3 +18,23 @@ def media_storage(settings, tmpdir):
 @pytest.fixture
 def user(db) -> User:
     return UserFactory()
+
+
+@pytest.fixture
+def api_client(user) -> APIClient:
+    """An API client authenticated as ``user`` (also available as ``api_client.user``)."""
+    client = APIClient()
+    client.force_authenticate(user=user)
+    client.user = user
+    return client
+
+
+def upload(client, name, content, status=201):
+    """Upload ``content`` as a new version of the file at path ``name``; returns the response."""
+    response = client.post(
+        reverse("api:fileversion-list"),
+        {"file": SimpleUploadedFile(name.rpartition("/")[2], content), "file_name": name},
+        format="multipart",
+    )
+    assert response.status_code == status, response.data
+    return response
@@ -28,5 +28,16 @@ EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 # DEBUGGING FOR TEMPLATES
 # ------------------------------------------------------------------------------
 TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore # noqa: F405
+# DATABASES
+# ------------------------------------------------------------------------------
+# Second database for replica routing tests; routing stays off unless a test
+# sets DATABASE_REPLICAS = ["replica"].
+DATABASES["replica"] = {**DATABASES["default"], "NAME": "propylon_document_manager_replica.sqlite"}  # noqa: F405
+
+# QUERY BUDGETS
+# ------------------------------------------------------------------------------
+# Fail tests that exceed a view's declared query budget.
+QUERY_BUDGET = {**QUERY_BUDGET, "RAISE": True}  # noqa: F405
+
 # Your stuff...
 # ------------------------------------------------------------------------------
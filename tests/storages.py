@@ -0,0 +1,18 @@
+import time
+
+from django.core.files.storage import FileSystemStorage
+
+
+class SlowFileSystemStorage(FileSystemStorage):
+    """Stand-in for remote object storage: every open pays ``delay`` seconds and is counted."""
+
+    opens = 0
+
+    def __init__(self, delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+
+    def _open(self, name, mode="rb"):
+        type(self).opens += 1
+        time.sleep(self.delay)
+        return super()._open(name, mode)
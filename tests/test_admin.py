@@ -0,0 +1,102 @@
+import hashlib
+from datetime import timedelta
+
+import pytest
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from propylon_document_manager.file_versions.admin import LargeTableAdmin
+from propylon_document_manager.file_versions.blobs import delete_released_blobs
+from propylon_document_manager.file_versions.models.file import File
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from .conftest import upload
+
+
+@pytest.fixture
+def uploads(admin_user):
+    client = APIClient()
+    client.force_authenticate(user=admin_user)
+
+    def upload_one(name, content):
+        return FileVersion.objects.get(pk=upload(client, name, content).data["id"])
+
+    return upload_one
+
+
+@pytest.mark.django_db
+def test_changelist_shows_an_estimate_instead_of_counting(admin_client, admin_user, uploads, settings):
+    versions = [uploads("bills/a.txt", b"version %d" % index) for index in range(3)]
+    settings.ADMIN_ESTIMATED_COUNT_THRESHOLD = 1
+    FileVersion.objects.filter(pk=versions[0].pk).delete()
+
+    with CaptureQueriesContext(connection) as queries:
+        response = admin_client.get(reverse("admin:file_versions_fileversion_changelist"))
+    assert response.status_code == 200
+    assert not [query for query in queries if "COUNT(" in query["sql"].upper()]
+    # SQLite's estimate is the largest rowid, so it still counts the deleted row.
+    assert response.context["cl"].result_count == versions[-1].pk
+
+    # Filtered lists are counted exactly.
+    response = admin_client.get(
+        reverse("admin:file_versions_fileversion_changelist"),
+        {"user": admin_user.email, "q": hashlib.sha256(b"version 1").hexdigest().upper()},
+    )
+    assert [row.pk for row in response.context["cl"].result_list] == [versions[1].pk]
+    assert response.context["cl"].result_count == 1
+
+    response = admin_client.get(reverse("admin:file_versions_file_changelist"), {"q": "/bills/", "user": "0"})
+    assert response.context["cl"].result_count == 0
+
+
+@pytest.mark.django_db
+def test_deleting_versions_in_batches_keeps_file_aggregates(admin_client, uploads, settings):
+    settings.ADMIN_ACTION_BATCH_SIZE = 2
+    versions = [uploads("bills/a.txt", b"version %d" % index) for index in range(5)]
+    keep = versions[1]
+    url = reverse("admin:file_versions_fileversion_changelist")
+    selected = [version.pk for version in versions if version != keep]
+
+    response = admin_client.post(url, {"action": "delete_in_batches", helpers.ACTION_CHECKBOX_NAME: selected})
+    assert response.status_code == 200
+    assert "Are you sure" in response.content.decode()
+    assert FileVersion.objects.count() == 5
+
+    response = admin_client.post(
+        url, {"action": "delete_in_batches", helpers.ACTION_CHECKBOX_NAME: selected, "post": "yes"}, follow=True
+    )
+    assert "Deleted 4 file versions" in response.content.decode()
+    assert list(FileVersion.objects.all()) == [keep]
+    file_obj = File.objects.get()
+    assert (file_obj.version_count, file_obj.total_bytes, file_obj.latest_version) == (1, keep.size, keep)
+
+
+@pytest.mark.django_db
+def test_deleting_all_files_frees_their_blobs(admin_client, uploads, settings):
+    settings.ADMIN_ACTION_BATCH_SIZE = 2
+    versions = [uploads("bills/%d.txt" % index, b"content %d" % (index % 2)) for index in range(5)]
+    storage = FileVersion._meta.get_field("file").storage
+    assert all(storage.exists(version.file.name) for version in versions)
+
+    response = admin_client.post(
+        reverse("admin:file_versions_file_changelist"),
+        {"action": "delete_in_batches", "select_across": "1", helpers.ACTION_CHECKBOX_NAME: [0], "post": "yes"},
+        follow=True,
+    )
+    assert "Deleted 5 files; 2 blobs freed." in response.content.decode()
+    assert not File.objects.exists() and not FileVersion.objects.exists()
+    assert delete_released_blobs(grace=timedelta(0)) == 2
+    assert not any(storage.exists(version.file.name) for version in versions)
+
+
+def test_only_admins_that_delete_in_batches_offer_it(rf, admin_user):
+    request = rf.get("/")
+    request.user = admin_user
+    for model_admin in admin.site._registry.values():
+        if isinstance(model_admin, LargeTableAdmin):
+            actions = model_admin.get_actions(request)
+            assert "delete_selected" not in actions
+            assert ("delete_in_batches" in actions) == hasattr(model_admin, "delete_batch"), model_admin
@@ -0,0 +1,71 @@
+import hashlib
+
+import msgpack
+import pytest
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from propylon_document_manager.file_versions.models.user import User
+from .conftest import upload
+
+
+def sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+@pytest.fixture
+def client(api_client):
+    for name, content in (("a.txt", b"shared"), ("b.txt", b"shared"), ("c.txt", b"unique")):
+        upload(api_client, name, content)
+    return api_client
+
+
+@pytest.mark.django_db
+def test_by_hash_answers_the_newest_of_several_versions(client):
+    response = client.get(reverse("api:fileversion-by-hash", kwargs={"content_hash": sha256(b"shared").upper()}))
+
+    assert response.status_code == 200
+    assert response.data["file_obj"]["name"] == "b.txt"
+
+
+@pytest.mark.django_db
+def test_by_hashes_groups_versions_and_reports_missing(client, settings, monkeypatch):
+    other = User.objects.create_user(email="other@example.com", password="password")
+    intruder = APIClient()
+    intruder.force_authenticate(user=other)
+    upload(intruder, "x.txt", b"theirs")
+    # Small batches, so the lookup takes several IN queries within its budget.
+    monkeypatch.setattr(connection.features, "max_query_params", 2)
+    hashes = [sha256(b"shared"), sha256(b"unique"), sha256(b"theirs"), sha256(b"nothing"), sha256(b"shared")]
+
+    response = client.post(reverse("api:fileversion-by-hashes"), {"hashes": hashes}, format="json")
+
+    assert response.status_code == 200
+    found = response.data["found"]
+    assert [row["file_obj"]["name"] for row in found[sha256(b"shared")]] == ["a.txt", "b.txt"]
+    assert [row["file_obj"]["name"] for row in found[sha256(b"unique")]] == ["c.txt"]
+    assert response.data["missing"] == [sha256(b"theirs"), sha256(b"nothing")]
+
+    settings.BATCH_LOOKUP_MAX_HASHES = 2
+    response = client.post(reverse("api:fileversion-by-hashes"), {"hashes": hashes}, format="json")
+    assert response.status_code == 400
+    response = client.post(reverse("api:fileversion-by-hashes"), {"hashes": ["not-a-hash"]}, format="json")
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_by_hashes_takes_and_returns_raw_hashes_in_msgpack(client):
+    raw = [hashlib.sha256(b"unique").digest(), hashlib.sha256(b"nothing").digest()]
+    response = client.post(
+        reverse("api:fileversion-by-hashes"),
+        msgpack.packb({"hashes": raw}),
+        content_type="application/msgpack",
+        HTTP_ACCEPT="application/msgpack",
+    )
+
+    assert response.status_code == 200
+    body = msgpack.unpackb(response.content, timestamp=3)
+    assert list(body["found"]) == [raw[0]]
+    assert body["found"][raw[0]][0]["content_hash"] == raw[0]
+    assert body["missing"] == [raw[1]]
@@ -0,0 +1,47 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from propylon_document_manager.file_versions.models.user import User
+
+
+@pytest.mark.django_db
+def test_sqlite_connections_are_tuned():
+    if connection.vendor != "sqlite":
+        pytest.skip("SQLite only")
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA synchronous")
+        assert cursor.fetchone()[0] == 1  # NORMAL
+        cursor.execute("PRAGMA busy_timeout")
+        assert cursor.fetchone()[0] == 5000
+        cursor.execute("PRAGMA temp_store")
+        assert cursor.fetchone()[0] == 2  # MEMORY
+
+
+@pytest.mark.django_db(transaction=True)
+def test_connection_setup_does_not_count_against_query_budgets(settings):
+    if connection.vendor != "sqlite":
+        pytest.skip("SQLite only")
+    assert settings.QUERY_BUDGET["RAISE"]
+    user = User.objects.create_user(email="fresh@example.com", password="password")
+    client = APIClient()
+    client.force_authenticate(user=user)
+    response = client.post(
+        reverse("api:fileversion-list"),
+        {"file": SimpleUploadedFile("bill.txt", b"An Act"), "file_name": "bill.txt"},
+        format="multipart",
+    )
+    download = reverse("api:fileversion-download", kwargs={"id": response.data["id"]})
+
+    # Forget the connection, as at the end of a request with CONN_MAX_AGE=0. The
+    # old one stays open only so the in-memory test database outlives it.
+    stale = connection.connection
+    connection.connection = None
+    try:
+        response = client.get(download)
+        assert connection.connection is not stale
+    finally:
+        stale.close()
+    assert response.status_code == 200
@@ -0,0 +1,66 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from propylon_document_manager.file_versions.diffing import cache_key
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from .conftest import upload
+
+OLD = "Section 1\nThe Minister may make regulations.\nSection 2\nCommencement.\n"
+NEW = "Section 1\nThe Minister shall make regulations.\nSection 2\nCommencement.\nSection 3\n"
+
+
+@pytest.fixture
+def client(api_client):
+    cache.clear()
+    for content in (OLD, NEW):
+        upload(api_client, "bills/bill.txt", content.encode())
+    return api_client
+
+
+def get_diff(client, **params):
+    return client.get(reverse("api:fileversion-diff"), {"path": "/bills/bill.txt", "from": 1, "to": 2, **params})
+
+
+@pytest.mark.django_db
+def test_line_diff_is_streamed_and_cached_by_content_hashes(client):
+    response = get_diff(client)
+
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/x-diff")
+    assert b"".join(response.streaming_content).decode() == (
+        "--- bills/bill.txt@1\n"
+        "+++ bills/bill.txt@2\n"
+        "@@ -1,4 +1,5 @@\n"
+        " Section 1\n"
+        "-The Minister may make regulations.\n"
+        "+The Minister shall make regulations.\n"
+        " Section 2\n"
+        " Commencement.\n"
+        "+Section 3\n"
+    )
+    old, new = FileVersion.objects.order_by("version_number")
+    assert cache.get(cache_key(old.content_hash, new.content_hash, "line")) is not None
+
+    reversed_diff = b"".join(get_diff(client, **{"from": 2, "to": 1}).streaming_content).decode()
+    assert "-Section 3\n" in reversed_diff
+
+
+@pytest.mark.django_db
+def test_word_diff_marks_changed_words(client):
+    body = b"".join(get_diff(client, mode="word").streaming_content).decode()
+
+    assert "The Minister [-may-]{+shall+} make regulations.\n" in body
+    assert "{+Section 3+}" in body
+
+
+@pytest.mark.django_db
+def test_large_or_binary_versions_are_not_diffed(client, settings):
+    settings.DIFF_MAX_BYTES = 100
+    response = get_diff(client)
+    assert response.status_code == 200
+    assert response.data["from"]["size"] == len(OLD) and response.data["identical"] is False
+
+    upload(client, "bills/bill.txt", b"%PDF-1.4 binary")
+    assert get_diff(client, **{"to": 3}).status_code == 415
+    assert get_diff(client, **{"to": 9}).status_code == 404
+    assert get_diff(client, mode="chars").status_code == 400
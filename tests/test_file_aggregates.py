@@ -0,0 +1,76 @@
+import pytest
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.urls import reverse
+from propylon_document_manager.file_versions.models.file import File
+from .conftest import upload
+
+
+@pytest.mark.django_db
+def test_file_tracks_latest_version_and_totals(api_client):
+    upload(api_client, "bill.txt", b"first")
+    second = upload(api_client, "bill.txt", b"second!")
+
+    file_obj = File.objects.get(name="bill.txt")
+    assert file_obj.latest_version_id == second.data["id"]
+    assert file_obj.version_count == 2
+    assert file_obj.total_bytes == len(b"first") + len(b"second!")
+    assert second.data["size"] == len(b"second!")
+    assert second.data["file_obj"]["version_count"] == 2
+
+
+@pytest.mark.django_db
+def test_deleting_latest_version_moves_pointer_back(api_client):
+    first = upload(api_client, "bill.txt", b"first")
+    second = upload(api_client, "bill.txt", b"second!")
+
+    response = api_client.delete(reverse("api:fileversion-detail", kwargs={"id": second.data["id"]}))
+    assert response.status_code == 204
+
+    file_obj = File.objects.get(name="bill.txt")
+    assert file_obj.latest_version_id == first.data["id"]
+    assert file_obj.version_count == 1
+    assert file_obj.total_bytes == len(b"first")
+
+    api_client.delete(reverse("api:fileversion-detail", kwargs={"id": first.data["id"]}))
+    file_obj.refresh_from_db()
+    assert file_obj.latest_version is None
+    assert file_obj.version_count == 0
+
+
+@pytest.mark.django_db
+def test_latest_by_path_is_a_single_query(api_client, django_assert_num_queries):
+    upload(api_client, "bill.txt", b"first")
+    second = upload(api_client, "bill.txt", b"second!")
+
+    with django_assert_num_queries(1):
+        response = api_client.get("/api/bill.txt")
+    assert response.data["id"] == second.data["id"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_migration_merges_duplicate_files():
+    executor = MigrationExecutor(connection)
+    executor.migrate([("file_versions", "0017_released_blob")])
+    apps = executor.loader.project_state([("file_versions", "0017_released_blob")]).apps
+    HistoricalUser = apps.get_model("file_versions", "User")
+    HistoricalFile = apps.get_model("file_versions", "File")
+    HistoricalVersion = apps.get_model("file_versions", "FileVersion")
+    user = HistoricalUser.objects.create(email="merge@example.com")
+    first, second = [HistoricalFile.objects.create(user=user, name="bill.txt", parent="") for _ in range(2)]
+    for file_obj, number, size in [(first, 1, 10), (second, 1, 20), (second, 2, 30)]:
+        HistoricalVersion.objects.create(
+            file_obj=file_obj, user=user, version_number=number, size=size, content_hash="%064d" % size
+        )
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+
+    file_obj = File.objects.get(name="bill.txt")
+    assert file_obj.pk == first.pk
+    assert list(file_obj.versions.order_by("version_number").values_list("version_number", "size")) == [
+        (1, 10), (2, 20), (3, 30)
+    ]
+    assert (file_obj.version_count, file_obj.total_bytes, file_obj.latest_version.size) == (3, 60, 30)
+    with pytest.raises(IntegrityError), transaction.atomic():
+        File.objects.create(user_id=user.pk, name="bill.txt")
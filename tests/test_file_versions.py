@@ -318,3 +318,27 @@ def test_multiple_users_same_content():
 
     assert response1.data["id"] != response2.data["id"]
     assert response1.data["content_hash"] == response2.data["content_hash"]
+
+@pytest.mark.django_db
+def test_download_returns_file_content():
+    """Test that a version can be downloaded by its owner only."""
+    user = User.objects.create_user(email="test@example.com", password="test123")
+    other = User.objects.create_user(email="other@example.com", password="test123")
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    uploaded_file = SimpleUploadedFile("test.txt", b"download me", content_type="text/plain")
+    response = client.post(
+        reverse("api:fileversion-list"),
+        {"file": uploaded_file, "file_name": "docs/report.txt"},
+        format="multipart"
+    )
+    url = reverse("api:fileversion-download", kwargs={"id": response.data["id"]})
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == b"download me"
+    assert 'filename="report.txt"' in response["Content-Disposition"]
+
+    client.force_authenticate(user=other)
+    assert client.get(url).status_code == 404
@@ -0,0 +1,88 @@
+import hashlib
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from propylon_document_manager.file_versions.hash_filter import (
+    BloomFilter, LocalHashFilter, reset_hash_filter
+)
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from .conftest import upload
+
+
+def sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+@pytest.fixture
+def local_filter(settings, tmp_path):
+    settings.HASH_FILTER = {
+        "BACKEND": "propylon_document_manager.file_versions.hash_filter.LocalHashFilter",
+        "OPTIONS": {"dump_path": str(tmp_path / "hash-filter.bin"), "capacity": 1000, "refresh_seconds": 3600},
+    }
+    reset_hash_filter()
+    yield
+    reset_hash_filter()
+
+
+def test_bloom_filter_has_no_false_negatives_and_roundtrips():
+    bloom = BloomFilter.for_capacity(10000, 0.01)
+    stored = [sha256(b"stored %d" % index) for index in range(10000)]
+    for content_hash in stored:
+        bloom.add(content_hash)
+
+    assert all(content_hash in bloom for content_hash in stored)
+    false_positives = sum(sha256(b"absent %d" % index) in bloom for index in range(10000))
+    assert false_positives < 200
+
+    loaded, watermark = BloomFilter.loads(bloom.dumps(watermark=42))
+    assert watermark == 42
+    assert (loaded.size_bits, loaded.hash_count, loaded.bits) == (bloom.size_bits, bloom.hash_count, bloom.bits)
+    with pytest.raises(ValueError):
+        BloomFilter.loads(bloom.dumps()[:-1])
+
+
+@pytest.mark.django_db
+def test_lookups_of_unknown_hashes_skip_the_database(
+    local_filter, api_client, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        upload(api_client, "bill.txt", b"An Act")
+
+    unknown = [sha256(b"never uploaded %d" % index) for index in range(20)]
+    with django_assert_num_queries(0):
+        response = api_client.get(reverse("api:fileversion-by-hash", kwargs={"content_hash": unknown[0]}))
+        assert response.status_code == 404
+        response = api_client.post(reverse("api:fileversion-by-hashes"), {"hashes": unknown}, format="json")
+        assert response.data == {"found": {}, "missing": unknown}
+
+    # Uploads are added once they commit.
+    response = api_client.get(reverse("api:fileversion-by-hash", kwargs={"content_hash": sha256(b"An Act")}))
+    assert response.status_code == 200
+    with django_capture_on_commit_callbacks(execute=True):
+        assert upload(api_client, "copy.txt", b"An Act").data["content_hash"] == sha256(b"An Act")
+
+
+@pytest.mark.django_db
+def test_filter_starts_from_the_dump_and_catches_up(local_filter, settings, api_client, django_assert_num_queries):
+    upload(api_client, "before.txt", b"before the dump")
+    call_command("rebuild_hash_filter")
+
+    upload(api_client, "after.txt", b"after the dump")
+    # Another process loads the dump and reads the rows created since in one query.
+    fresh = LocalHashFilter(**{**settings.HASH_FILTER["OPTIONS"], "refresh_seconds": 0})
+    with django_assert_num_queries(1):
+        found = fresh.might_exist_many([sha256(b"before the dump"), sha256(b"after the dump"), sha256(b"never")])
+    assert found == [True, True, False]
+
+
+@pytest.mark.django_db
+def test_duplicates_are_rejected_even_if_the_filter_misses_them(local_filter, api_client, monkeypatch):
+    upload(api_client, "bill.txt", b"An Act")
+    # A filter that has lost track of stored hashes, e.g. restored from an old dump.
+    monkeypatch.setattr(LocalHashFilter, "might_exist_many", lambda self, hashes: [False] * len(hashes))
+
+    response = upload(api_client, "bill.txt", b"An Act", status=400)
+    assert response.data["version_number"] == "1"
+    assert FileVersion.objects.count() == 1
@@ -0,0 +1,68 @@
+import hashlib
+
+import pytest
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.core.files.uploadedfile import SimpleUploadedFile
+from propylon_document_manager.file_versions.hashing import (
+    digest_upload, hash_many, parse_tree_hash, tree_hash, verify_chunk
+)
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from propylon_document_manager.file_versions.models.user import User
+from propylon_document_manager.file_versions.tasks import BlobIntegrityError, verify_blob
+
+CONTENT = bytes(range(256)) * 1000
+
+
+def test_tree_hash_combines_block_digests():
+    tree = tree_hash(ContentFile(CONTENT), chunk_size=10000)
+
+    blocks = [CONTENT[i:i + 10000] for i in range(0, len(CONTENT), 10000)]
+    assert len(tree.leaves) == len(blocks) == 26
+    assert tree.root == hashlib.sha256(b"".join(hashlib.sha256(b).digest() for b in blocks)).hexdigest()
+    assert verify_chunk(blocks[3], 3, tree)
+    assert not verify_chunk(blocks[3], 4, tree)
+    assert not verify_chunk(blocks[3], 99, tree)
+
+
+def test_parallel_digest_keeps_plain_sha256(settings):
+    settings.HASH_PARALLEL_THRESHOLD = 1024
+    settings.TREE_HASH_CHUNK_SIZE = 4096
+
+    digest = digest_upload(SimpleUploadedFile("data.bin", CONTENT), name="data.bin")
+    assert digest.content_hash == hashlib.sha256(CONTENT).hexdigest()
+    assert digest.size == len(CONTENT)
+    assert parse_tree_hash(digest.tree_hash) == (4096, tree_hash(ContentFile(CONTENT), 4096).root)
+
+    small = digest_upload(SimpleUploadedFile("small.txt", b"small"), name="small.txt")
+    assert small.tree_hash == ""
+
+    contents = [b"a" * n for n in range(1, 20)]
+    digests = hash_many([lambda c=c: ContentFile(c) for c in contents])
+    assert [d.content_hash for d in digests] == [hashlib.sha256(c).hexdigest() for c in contents]
+
+
+@pytest.mark.django_db
+def test_verify_blob_uses_tree_hash(settings):
+    settings.HASH_PARALLEL_THRESHOLD = 1024
+    settings.TREE_HASH_CHUNK_SIZE = 4096
+    user = User.objects.create_user(email="test@example.com", password="test123")
+    client = APIClient()
+    client.force_authenticate(user=user)
+    response = client.post(
+        reverse("api:fileversion-list"),
+        {"file": SimpleUploadedFile("big.bin", CONTENT), "file_name": "big.bin"},
+        format="multipart"
+    )
+    assert response.status_code == 201
+
+    version = FileVersion.objects.get(pk=response.data["id"])
+    assert version.tree_hash.startswith("4096:")
+    verify_blob(version.content_hash)
+
+    with open(version.file.path, "r+b") as fh:
+        fh.seek(5000)
+        fh.write(b"corrupt")
+    with pytest.raises(BlobIntegrityError):
+        verify_blob(version.content_hash)
@@ -0,0 +1,94 @@
+import io
+import tarfile
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from propylon_document_manager.file_versions.loader import blob_name
+from propylon_document_manager.file_versions.models.file import File
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from propylon_document_manager.file_versions.models.task import Task
+from propylon_document_manager.file_versions.models.user import User
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "corpus"
+    (root / "bills").mkdir(parents=True)
+    (root / "bills" / "a.txt").write_bytes(b"bill a")
+    (root / "bills" / "b.txt").write_bytes(b"shared content")
+    (root / "statute.pdf").write_bytes(b"%PDF-1.4 shared content")
+    (root / "copy.txt").write_bytes(b"shared content")
+    return root
+
+
+@pytest.mark.django_db
+def test_load_directory_deduplicates_blobs_and_maintains_aggregates(tree, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command("load_corpus", str(tree), "--email", "loader@example.com", "--prefix", "import", "--batch-size", "2")
+
+    user = User.objects.get(email="loader@example.com")
+    files = {f.name: f for f in File.objects.filter(user=user)}
+    assert sorted(files) == ["import/bills/a.txt", "import/bills/b.txt", "import/copy.txt", "import/statute.pdf"]
+    assert files["import/bills/a.txt"].parent == "import/bills"
+    assert files["import/bills/a.txt"].version_count == 1
+    assert files["import/bills/a.txt"].total_bytes == len(b"bill a")
+
+    copy = FileVersion.objects.get(file_obj=files["import/copy.txt"])
+    shared = FileVersion.objects.get(file_obj=files["import/bills/b.txt"])
+    assert files["import/copy.txt"].latest_version_id == copy.pk
+    assert copy.file.name == shared.file.name == blob_name(copy.content_hash)
+    assert copy.file.read() == b"shared content"
+    assert FileVersion.objects.get(file_obj=files["import/statute.pdf"]).mime_type == "application/pdf"
+    # Two tasks per distinct blob.
+    assert Task.objects.count() == 6
+
+
+@pytest.mark.django_db
+def test_reloading_adds_only_changed_versions(tree):
+    call_command("load_corpus", str(tree), "--email", "loader@example.com", "--no-tasks")
+    (tree / "bills" / "a.txt").write_bytes(b"bill a, amended")
+    call_command("load_corpus", str(tree), "--email", "loader@example.com", "--no-tasks")
+
+    file_obj = File.objects.get(name="bills/a.txt")
+    assert file_obj.version_count == 2
+    assert file_obj.latest_version.version_number == 2
+    assert file_obj.latest_version.file.read() == b"bill a, amended"
+    assert FileVersion.objects.count() == 5
+    assert Task.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_load_tarball(tmp_path):
+    archive = tmp_path / "corpus.tar.gz"
+    with tarfile.open(archive, "w:gz") as tar:
+        for name, content in [("docs/one.txt", b"one"), ("docs/one.txt", b"one, again")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+    call_command("load_corpus", str(archive), "--no-tasks")
+
+    file_obj = File.objects.get(name="docs/one.txt")
+    assert file_obj.version_count == 2
+    assert file_obj.latest_version.file.read() == b"one, again"
+
+
+@pytest.mark.django_db
+def test_load_tarball_of_current_directory_skips_invalid_names(tmp_path):
+    # As written by `tar -C corpus -czf corpus.tgz .`
+    archive = tmp_path / "corpus.tgz"
+    with tarfile.open(archive, "w:gz") as tar:
+        for name, content in [("./bills/a.txt", b"bill a"), ("./../escape.txt", b"outside"), ("./top.txt", b"top")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    stdout, stderr = io.StringIO(), io.StringIO()
+
+    call_command("load_corpus", str(archive), "--prefix", "import", "--no-tasks", stdout=stdout, stderr=stderr)
+
+    assert sorted(File.objects.values_list("name", flat=True)) == ["import/bills/a.txt", "import/top.txt"]
+    assert "Skipping ./../escape.txt" in stderr.getvalue()
+    assert "1 invalid names" in stdout.getvalue()
+    with pytest.raises(CommandError):
+        call_command("load_corpus", str(archive), "--prefix", "../up", "--no-tasks")
@@ -0,0 +1,73 @@
+import warnings
+from datetime import datetime, timezone as dt_timezone
+
+import pytest
+from django.urls import reverse
+from propylon_document_manager.file_versions.hashing import detect_mime_type
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from .conftest import upload
+
+
+@pytest.fixture
+def client(api_client):
+    for name, content in [
+        ("bill.pdf", b"%PDF-1.4\n" + b"x" * 100),
+        ("notes", b"plain notes"),
+        ("scan.bin", b"\x89PNG\r\n\x1a\n" + b"\x00" * 2000),
+    ]:
+        upload(api_client, name, content)
+    return api_client
+
+
+@pytest.mark.django_db
+def test_upload_records_size_and_detected_mime_type(client):
+    versions = {v.file_obj.name: v for v in FileVersion.objects.select_related("file_obj")}
+    assert versions["bill.pdf"].mime_type == "application/pdf"
+    assert versions["bill.pdf"].size == 109
+    assert versions["notes"].mime_type == "text/plain"
+    assert versions["scan.bin"].mime_type == "image/png"
+    assert versions["scan.bin"].created_at is not None
+
+
+@pytest.mark.django_db
+def test_list_filters_on_metadata(client):
+    def names(**params):
+        response = client.get(reverse("api:fileversion-list"), params)
+        assert response.status_code == 200
+        return sorted(r["file_obj"]["name"] for r in response.data)
+
+    assert names(mime_type="application/pdf") == ["bill.pdf"]
+    assert names(mime_type="image/*") == ["scan.bin"]
+    assert names(min_size=100) == ["bill.pdf", "scan.bin"]
+    assert names(max_size=100) == ["notes"]
+    assert names(uploaded_after="2000-01-01") == ["bill.pdf", "notes", "scan.bin"]
+    assert names(uploaded_before="2000-01-01") == []
+    assert client.get(reverse("api:fileversion-list"), {"min_size": "big"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_upload_time_filters_use_the_current_time_zone(client, settings):
+    settings.TIME_ZONE = "America/New_York"
+    # 22:00 on 31 December in New York.
+    FileVersion.objects.update(created_at=datetime(2024, 1, 1, 3, 0, tzinfo=dt_timezone.utc))
+
+    def count(**params):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", RuntimeWarning)
+            response = client.get(reverse("api:fileversion-list"), params)
+        assert response.status_code == 200
+        return len(response.data)
+
+    assert count(uploaded_after="2024-01-01") == 0
+    assert count(uploaded_before="2024-01-01") == 3
+    assert count(uploaded_after="2023-12-31T21:59:00") == 3
+    assert count(uploaded_after="2024-01-01T02:59:00Z") == 3
+    assert count(uploaded_before="2024-01-01T02:59:00Z") == 0
+    assert client.get(reverse("api:fileversion-list"), {"uploaded_after": "2024-13-01"}).status_code == 400
+
+
+def test_detect_mime_type_prefers_extension_for_containers():
+    docx = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    assert detect_mime_type(b"PK\x03\x04rest", "amendment.docx") == docx
+    assert detect_mime_type(b"PK\x03\x04rest", "archive") == "application/zip"
+    assert detect_mime_type(b"\x00\x01\x02", "") == "application/octet-stream"
@@ -0,0 +1,66 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.core.files.uploadedfile import SimpleUploadedFile
+from propylon_document_manager.file_versions.models.user import User
+from propylon_document_manager.utils.metrics import REGISTRY, Histogram
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    REGISTRY.clear()
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_reports_uploads_and_requests():
+    user = User.objects.create_user(email="test@example.com", password="test123")
+    client = APIClient()
+    client.force_authenticate(user=user)
+    for name in ("a.txt", "b.txt"):
+        response = client.post(
+            reverse("api:fileversion-list"),
+            {"file": SimpleUploadedFile(name, b"same content"), "file_name": name},
+            format="multipart"
+        )
+        assert response.status_code == 201
+    client.get(reverse("api:fileversion-by-hash", kwargs={"content_hash": "0" * 64}))
+
+    response = APIClient().get("/metrics")
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    body = response.content.decode()
+    assert 'upload_dedup_total{result="hit"} 1' in body
+    assert 'upload_dedup_total{result="miss"} 1' in body
+    assert "upload_size_bytes_count 2" in body
+    assert 'storage_operation_duration_seconds_count{operation="write"} 1' in body
+    assert 'http_request_duration_seconds_count{view="api:fileversion-list",method="POST",status="201"} 2' in body
+    assert 'http_request_duration_seconds_count{view="api:fileversion-by-hash",method="GET",status="404"} 1' in body
+    assert 'http_request_db_queries_count{view="api:fileversion-by-hash"} 1' in body
+
+
+@pytest.mark.django_db
+def test_metrics_token(settings):
+    settings.METRICS_TOKEN = "s3cret"
+    assert APIClient().get("/metrics").status_code == 403
+    assert APIClient().get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code == 200
+
+    # Without a token, only local scrapers are answered.
+    settings.METRICS_TOKEN = ""
+    assert APIClient().get("/metrics").status_code == 200
+    assert APIClient().get("/metrics", REMOTE_ADDR="203.0.113.7").status_code == 403
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ["view"], buckets=(0.1, 1))
+    histogram.observe(0.05, view="a")
+    histogram.observe(0.5, view="a")
+    histogram.observe(5, view="a")
+    assert histogram.render().splitlines() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{view="a",le="0.1"} 1',
+        'latency_seconds_bucket{view="a",le="1"} 2',
+        'latency_seconds_bucket{view="a",le="+Inf"} 3',
+        'latency_seconds_sum{view="a"} 5.55',
+        'latency_seconds_count{view="a"} 3',
+    ]
@@ -0,0 +1,60 @@
+import hashlib
+from datetime import datetime
+
+import msgpack
+import pytest
+from django.urls import reverse
+
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from .conftest import upload
+
+MSGPACK = "application/msgpack"
+
+
+def unpack(response):
+    return msgpack.unpackb(response.content, timestamp=3)
+
+
+@pytest.mark.django_db
+def test_list_encodes_hashes_as_bytes_and_omits_links(api_client):
+    for index in range(3):
+        upload(api_client, "bills/a.txt", b"version %d" % index)
+
+    response = api_client.get(reverse("api:fileversion-list"), HTTP_ACCEPT=MSGPACK)
+    assert response.status_code == 200
+    assert response["Content-Type"] == MSGPACK
+    rows = unpack(response)
+    versions = {version.id: version for version in FileVersion.objects.all()}
+    assert len(rows) == 3
+    for row in rows:
+        assert row["content_hash"] == bytes.fromhex(versions[row["id"]].content_hash)
+        assert isinstance(row["created_at"], datetime)
+        assert "shareable_link" not in row and "file" not in row
+    assert len(response.content) < len(api_client.get(reverse("api:fileversion-list")).content) / 2
+
+
+@pytest.mark.django_db
+def test_upload_with_a_msgpack_body(api_client):
+    content = b"An Act without multipart."
+    response = api_client.post(
+        reverse("api:fileversion-list"),
+        msgpack.packb({"file_name": "acts/act.txt", "file": content}),
+        content_type=MSGPACK,
+        HTTP_ACCEPT=MSGPACK,
+    )
+
+    assert response.status_code == 201
+    row = unpack(response)
+    assert row["content_hash"] == hashlib.sha256(content).digest()
+    assert row["file_obj"]["name"] == "acts/act.txt"
+    assert FileVersion.objects.get().file.read() == content
+
+
+@pytest.mark.django_db
+def test_malformed_msgpack_is_a_bad_request(api_client):
+    response = api_client.post(
+        reverse("api:fileversion-list"), b"\xc1not msgpack", content_type=MSGPACK, HTTP_ACCEPT=MSGPACK
+    )
+
+    assert response.status_code == 400
+    assert "MessagePack parse error" in unpack(response)["detail"]
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+from django.urls import reverse
+from .conftest import upload
+
+
+NDJSON = "application/x-ndjson"
+
+
+@pytest.fixture
+def client(api_client):
+    for index in range(5):
+        upload(api_client, "reports/r%d.csv" % index if index % 2 else "bills/b%d.txt" % index, b"content %d" % index)
+    return api_client
+
+
+def read_lines(response):
+    body = b"".join(response.streaming_content) if response.streaming else response.content
+    assert body.endswith(b"\n")
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+
+@pytest.mark.django_db
+def test_list_streams_every_version_in_chunks(client, settings):
+    settings.NDJSON_CHUNK_SIZE = 2
+    response = client.get(reverse("api:fileversion-list"), HTTP_ACCEPT=NDJSON)
+
+    assert response.status_code == 200
+    assert response.streaming
+    assert response["Content-Type"] == NDJSON
+    rows = read_lines(response)
+    listed = client.get(reverse("api:fileversion-list")).json()
+    assert rows == sorted(listed, key=lambda row: row["id"])
+    assert len(rows) == 5
+
+
+@pytest.mark.django_db
+def test_streamed_list_applies_filters_and_format_parameter(client):
+    response = client.get(reverse("api:fileversion-list"), {"format": "ndjson", "mime_type": "text/csv"})
+
+    rows = read_lines(response)
+    assert [row["file_obj"]["name"] for row in rows] == ["reports/r1.csv", "reports/r3.csv"]
+
+
+@pytest.mark.django_db
+def test_other_actions_render_a_single_line(client):
+    response = client.get(reverse("api:fileversion-list"), {"min_size": "lots"}, HTTP_ACCEPT=NDJSON)
+    assert response.status_code == 400
+    assert list(read_lines(response)[0]) == ["min_size"]
+
+    version_id = client.get(reverse("api:fileversion-list")).json()[0]["id"]
+    response = client.get(reverse("api:fileversion-detail", kwargs={"id": version_id}), HTTP_ACCEPT=NDJSON)
+    assert response.status_code == 200
+    assert [row["id"] for row in read_lines(response)] == [version_id]
@@ -0,0 +1,93 @@
+import hashlib
+import os
+from datetime import timedelta
+
+import pytest
+from django.core.files.storage import storages
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from propylon_document_manager.file_versions.models.pack_entry import PackEntry
+from propylon_document_manager.file_versions.packs import repack
+from .conftest import upload
+
+
+@pytest.fixture
+def packed(settings, tmp_path):
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "default": {
+            "BACKEND": "propylon_document_manager.file_versions.packs.PackedStorage",
+            "OPTIONS": {
+                "backend_options": {"location": str(tmp_path / "media")},
+                "pack_dir": str(tmp_path / "packs"),
+                "threshold": 1024,
+            },
+        },
+    }
+    yield storages["default"]
+    storages["default"].packs.seal()
+
+
+@pytest.mark.django_db
+def test_small_blobs_are_packed_and_large_ones_stored_as_files(packed, api_client, tmp_path):
+    small_id = upload(api_client, "/docs/small.txt", b"small document").data["id"]
+    upload(api_client, "/docs/large.bin", b"x" * 2048)
+
+    assert list(PackEntry.objects.values_list("content_hash", flat=True)) == [
+        hashlib.sha256(b"small document").hexdigest()
+    ]
+    assert len(os.listdir(tmp_path / "packs")) == 1
+    assert [files for _, _, files in os.walk(tmp_path / "media") if files] == [
+        [hashlib.sha256(b"x" * 2048).hexdigest()]
+    ]
+
+    response = api_client.get(reverse("api:fileversion-download", args=[small_id]))
+    assert b"".join(response.streaming_content) == b"small document"
+
+
+@pytest.mark.django_db
+def test_repack_drops_unreferenced_blobs_and_compacts_packs(packed, api_client):
+    keep_id = upload(api_client, "/docs/keep.txt", b"keep me").data["id"]
+    drop_id = upload(api_client, "/docs/drop.txt", b"drop me" * 10).data["id"]
+    FileVersion.objects.filter(pk=drop_id).delete()
+    PackEntry.objects.update(touched_at=timezone.now() - timedelta(hours=2))
+    packed.packs.seal()
+    [old_pack] = packed.packs.packs()
+
+    stats = repack(packed.packs)
+
+    assert (stats.dropped, stats.rewritten, stats.removed) == (1, 1, 1)
+    entry = PackEntry.objects.get()
+    assert entry.pack != old_pack and entry.offset == 0
+    assert packed.packs.packs() == [entry.pack]
+    with FileVersion.objects.get(pk=keep_id).file.open("rb") as blob:
+        assert blob.read() == b"keep me"
+
+
+@pytest.mark.django_db
+def test_repack_skips_the_pack_being_written(packed, api_client):
+    upload(api_client, "/docs/a.txt", b"active pack")
+    FileVersion.objects.all().delete()
+
+    out_of_grace = repack(packed.packs)
+    assert out_of_grace.dropped == 0
+
+    call_command("repack_blobs", "--grace-minutes=0", stdout=open(os.devnull, "w"))
+    assert not PackEntry.objects.exists()
+    # Still open for appends in this process, so it is left alone.
+    assert len(packed.packs.packs()) == 1
+
+
+@pytest.mark.django_db
+def test_open_fails_cleanly_when_repack_drops_the_blob_meanwhile(packed, api_client, monkeypatch):
+    name = FileVersion.objects.get(pk=upload(api_client, "/docs/a.txt", b"dropped").data["id"]).file.name
+
+    def repacked(pack, offset, length):
+        PackEntry.objects.all().delete()
+        raise FileNotFoundError(pack)
+
+    monkeypatch.setattr(packed.packs, "view", repacked)
+    with pytest.raises(FileNotFoundError):
+        packed.open(name)
@@ -0,0 +1,90 @@
+import pytest
+from django.urls import reverse
+from propylon_document_manager.file_versions.models.file import File
+from propylon_document_manager.file_versions.paths import glob_to_regex, normalize_path
+from .conftest import upload
+
+
+@pytest.fixture
+def client(api_client):
+    for name, content in [
+        ("bills/2024/fisheries.txt", b"v1"),
+        ("bills/2024/fisheries.txt", b"v2"),
+        ("bills/2024/forestry.txt", b"forestry"),
+        ("bills/draft.txt", b"draft"),
+        ("statutes/1998.txt", b"statute"),
+        ("readme.txt", b"readme"),
+    ]:
+        upload(api_client, name, content)
+    return api_client
+
+
+def listed(client, **params):
+    response = client.get(reverse("api:fileversion-latest"), params)
+    assert response.status_code == 200
+    return [(r["file_obj"]["name"], r["version_number"]) for r in response.data["results"]]
+
+
+@pytest.mark.django_db
+def test_prefix_listing_returns_latest_versions(client):
+    assert listed(client, prefix="bills/2024/") == [
+        ("bills/2024/fisheries.txt", 2),
+        ("bills/2024/forestry.txt", 1),
+    ]
+    assert len(listed(client)) == 5
+
+
+@pytest.mark.django_db
+def test_glob_and_directory_listing(client):
+    assert listed(client, glob="bills/*.txt") == [("bills/draft.txt", 1)]
+    assert [name for name, _ in listed(client, glob="bills/**/f*.txt")] == [
+        "bills/2024/fisheries.txt",
+        "bills/2024/forestry.txt",
+    ]
+    assert [name for name, _ in listed(client, glob="bills/**/*.txt")] == [
+        "bills/2024/fisheries.txt",
+        "bills/2024/forestry.txt",
+        "bills/draft.txt",
+    ]
+    assert listed(client, dir="/") == [("readme.txt", 1)]
+    assert listed(client, dir="bills") == [("bills/draft.txt", 1)]
+
+
+@pytest.mark.django_db
+def test_directory_listing_names_subdirectories(client):
+    response = client.get(reverse("api:fileversion-latest"), {"dir": "/"})
+    assert response.data["directories"] == ["bills", "statutes"]
+    response = client.get(reverse("api:fileversion-latest"), {"dir": "bills"})
+    assert response.data["directories"] == ["2024"]
+    response = client.get(reverse("api:fileversion-latest"), {"dir": "bills/2024"})
+    assert response.data["directories"] == []
+    assert "directories" not in client.get(reverse("api:fileversion-latest"), {"prefix": "bills/"}).data
+
+
+@pytest.mark.django_db
+def test_listing_uses_cursor_pagination_and_one_query(client, django_assert_num_queries):
+    response = client.get(reverse("api:fileversion-latest"), {"page_size": 2})
+    names = [r["file_obj"]["name"] for r in response.data["results"]]
+    assert names == ["bills/2024/fisheries.txt", "bills/2024/forestry.txt"]
+
+    with django_assert_num_queries(1):
+        response = client.get(response.data["next"])
+    assert [r["file_obj"]["name"] for r in response.data["results"]] == ["bills/draft.txt", "readme.txt"]
+
+
+@pytest.mark.django_db
+def test_paths_are_normalized(client):
+    file_obj = File.objects.get(name="bills/2024/forestry.txt")
+    assert file_obj.parent == "bills/2024"
+    response = client.get("/api//bills//2024/forestry.txt")
+    assert response.status_code == 200
+    upload(client, "bills/../secret.txt", b"x", status=400)
+
+
+def test_path_helpers():
+    assert normalize_path("/a//b/c.txt/") == "a/b/c.txt"
+    with pytest.raises(ValueError):
+        normalize_path("a\\b")
+    assert glob_to_regex("a/*.txt") == r"^a/[^/]*\.txt$"
+    assert glob_to_regex("a/**/b") == r"^a/(?:.*/)?b$"
+    assert glob_to_regex("a**/b") == r"^a.*/b$"
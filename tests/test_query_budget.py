@@ -0,0 +1,45 @@
+import logging
+
+import pytest
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from propylon_document_manager.file_versions.api.views import FileVersionViewSet
+from propylon_document_manager.utils.query_budget import QueryBudgetExceeded
+from .conftest import upload
+
+
+@pytest.fixture
+def client(api_client, user):
+    for n in range(5):
+        upload(api_client, "docs/doc%d.txt" % (n % 2), b"content %d" % n)
+    # Authenticate for real so the budgets include the token lookup.
+    api_client.force_authenticate(user=None)
+    api_client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects.create(user=user).key)
+    return api_client
+
+
+@pytest.mark.django_db
+def test_read_endpoints_stay_within_budget(client):
+    versions = client.get(reverse("api:fileversion-list")).data
+    assert len(versions) == 5
+    content_hash = versions[0]["content_hash"]
+    assert client.get(reverse("api:fileversion-by-hash", kwargs={"content_hash": content_hash})).status_code == 200
+    assert len(client.get(reverse("api:fileversion-latest")).data["results"]) == 2
+    assert client.get("/api/docs/doc0.txt").status_code == 200
+
+
+@pytest.mark.django_db
+def test_exceeding_budget_raises_in_tests(client, monkeypatch):
+    monkeypatch.setattr(FileVersionViewSet, "query_budgets", {"list": 1})
+    with pytest.raises(QueryBudgetExceeded, match="ran 2 queries, budget is 1"):
+        client.get(reverse("api:fileversion-list"))
+
+
+@pytest.mark.django_db
+def test_exceeding_budget_is_logged_outside_tests(client, monkeypatch, settings, caplog):
+    settings.QUERY_BUDGET = {**settings.QUERY_BUDGET, "RAISE": False}
+    monkeypatch.setattr(FileVersionViewSet, "query_budgets", {"list": 1})
+    with caplog.at_level(logging.WARNING, logger="propylon_document_manager.utils.query_budget"):
+        assert client.get(reverse("api:fileversion-list")).status_code == 200
+    assert "budget is 1" in caplog.text
+    assert "file_versions_fileversion" in caplog.text
@@ -0,0 +1,65 @@
+import pytest
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from propylon_document_manager.utils.replicas import PrimaryReplicaRouter, ReplicaRoutingMiddleware
+from .conftest import upload
+
+# Not wrapped in a transaction so the replica can be overwritten with SQLite's backup API.
+pytestmark = pytest.mark.django_db(databases=["default", "replica"], transaction=True)
+
+
+@pytest.fixture
+def client(settings, user):
+    settings.DATABASE_REPLICAS = ["replica"]
+    cache.clear()
+    token = Token.objects.create(user=user)
+    # The replica starts as a copy of the primary.
+    call_command("sync_sqlite_replicas")
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+    return client
+
+
+def test_reads_go_to_replica_and_writes_to_primary(client):
+    upload(client, "bill.txt", b"first")
+    assert FileVersion.objects.using("default").count() == 1
+    assert FileVersion.objects.using("replica").count() == 0
+
+    # Once the pin expires, reads come from the (stale) replica.
+    cache.clear()
+    assert client.get(reverse("api:fileversion-list")).data == []
+
+    call_command("sync_sqlite_replicas")
+    assert len(client.get(reverse("api:fileversion-list")).data) == 1
+
+
+def test_writer_reads_own_writes_from_primary(client):
+    response = upload(client, "bill.txt", b"first")
+
+    assert client.get("/api/bill.txt").data["id"] == response.data["id"]
+    assert len(client.get(reverse("api:fileversion-list")).data) == 1
+    assert FileVersion.objects.using("replica").count() == 0
+
+
+def test_each_request_reads_from_one_replica(settings):
+    settings.DATABASE_REPLICAS = ["replica", "replica-2", "replica-3"]
+    router = PrimaryReplicaRouter()
+    aliases = []
+
+    def view(request):
+        aliases.append({router.db_for_read(FileVersion) for _ in range(20)})
+        return HttpResponse()
+
+    middleware = ReplicaRoutingMiddleware(view)
+    for _ in range(20):
+        middleware(RequestFactory().get("/api/file_versions/"))
+
+    assert all(len(request_aliases) == 1 for request_aliases in aliases)
+    assert len(set.union(*aliases)) > 1
+    assert router.db_for_read(FileVersion) == "default"
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from types import SimpleNamespace
+
+import pytest
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.urls import reverse
+from propylon_document_manager.file_versions.blobs import delete_released_blobs
+from propylon_document_manager.file_versions.models.document_text import DocumentText
+from propylon_document_manager.file_versions.models.file import File
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from propylon_document_manager.file_versions.models.released_blob import ReleasedBlob
+from propylon_document_manager.file_versions.models.retention_policy import RetentionPolicy
+from propylon_document_manager.file_versions.retention import apply_retention, kept_versions
+from .conftest import upload
+
+NOW = datetime(2024, 6, 30, 12, tzinfo=dt_timezone.utc)
+
+
+def test_rules_keep_the_union_of_their_versions():
+    # Two versions a day, from 1 May to 30 June.
+    versions = [
+        SimpleNamespace(id=n, version_number=n, created_at=NOW - timedelta(hours=12 * (120 - n)))
+        for n in range(1, 121)
+    ]
+    policy = RetentionPolicy(keep_last=3, keep_daily=5, keep_monthly=3, keep_within=timedelta(hours=36))
+
+    keep = kept_versions(versions, policy, NOW)
+
+    last_three = {120, 119, 118}
+    within = {117, 118, 119, 120}  # 36 hours back, inclusive
+    daily = {120, 118, 116, 114, 112}
+    monthly = {120, 60}  # newest of June and May; there is nothing older
+    assert keep == last_three | within | daily | monthly
+    assert kept_versions(versions, RetentionPolicy(), NOW) == {version.id for version in versions}
+
+
+def upload_aged(client, name, content, age_days):
+    response = upload(client, name, content)
+    FileVersion.objects.filter(pk=response.data["id"]).update(created_at=NOW - timedelta(days=age_days))
+    return FileVersion.objects.get(pk=response.data["id"])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_expired_versions_are_deleted_and_their_blobs_freed(api_client):
+    RetentionPolicy.objects.create(path_prefix="/bills/", keep_last=2)
+    versions = [upload_aged(api_client, "bills/bill.txt", b"draft %d" % n, age_days=10 - n) for n in range(5)]
+    shared = upload_aged(api_client, "notes/copy.txt", b"draft 0", age_days=1)
+    DocumentText.objects.create(content_hash=versions[1].content_hash, text="draft 1")
+
+    stats = apply_retention(batch_size=2, now=NOW)
+
+    assert (stats.files, stats.expired, stats.blobs_freed, stats.blobs_deleted) == (1, 3, 2, 0)
+    assert list(FileVersion.objects.filter(file_obj__name="bills/bill.txt").values_list(
+        "version_number", flat=True
+    ).order_by("version_number")) == [4, 5]
+    bill = File.objects.get(name="bills/bill.txt")
+    assert (bill.version_count, bill.total_bytes, bill.latest_version_id) == (2, 14, versions[4].pk)
+    assert not DocumentText.objects.exists()
+    # Freed blobs stay stored for the grace period, in case an upload is deduplicating onto them.
+    assert default_storage.exists(versions[1].file.name)
+
+    stats = apply_retention(now=NOW, grace=timedelta(0))
+    assert stats.blobs_deleted == 2
+    # "draft 0" is still used by another file; the others are gone from storage.
+    assert default_storage.exists(shared.file.name)
+    assert not default_storage.exists(versions[1].file.name)
+    assert not ReleasedBlob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_deleting_a_version_releases_its_blob(api_client):
+    version = upload_aged(api_client, "bills/bill.txt", b"draft", age_days=1)
+    DocumentText.objects.create(content_hash=version.content_hash, text="draft")
+
+    response = api_client.delete(reverse("api:fileversion-detail", args=[version.pk]))
+    assert response.status_code == 204
+    assert not DocumentText.objects.exists()
+    assert list(ReleasedBlob.objects.values_list("name", flat=True)) == [version.file.name]
+
+    # Uploaded again before the grace period ran out: the stored blob is reused and kept.
+    again = upload_aged(api_client, "bills/bill.txt", b"draft", age_days=0)
+    assert again.file.name == version.file.name
+    assert delete_released_blobs(grace=timedelta(0)) == 0
+    assert default_storage.exists(version.file.name)
+    assert not ReleasedBlob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_user_policy_overrides_global_one_and_dry_run_deletes_nothing(api_client):
+    RetentionPolicy.objects.create(keep_last=1)
+    RetentionPolicy.objects.create(user=api_client.user, path_prefix="keep/")
+    for n in range(3):
+        upload_aged(api_client, "keep/a.txt", b"a %d" % n, age_days=3 - n)
+        upload_aged(api_client, "other/b.txt", b"b %d" % n, age_days=3 - n)
+
+    out = StringIO()
+    call_command("apply_retention", "--dry-run", stdout=out)
+    assert "Would delete 2 versions of 1 files" in out.getvalue()
+    assert FileVersion.objects.count() == 6
+
+    call_command("apply_retention", "--email=%s" % api_client.user.email, stdout=out)
+    assert FileVersion.objects.filter(file_obj__name="keep/a.txt").count() == 3
+    assert FileVersion.objects.filter(file_obj__name="other/b.txt").count() == 1
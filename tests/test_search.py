@@ -0,0 +1,72 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.core.files.uploadedfile import SimpleUploadedFile
+from propylon_document_manager.file_versions import queue
+from propylon_document_manager.file_versions.models.document_text import DocumentText
+from propylon_document_manager.file_versions.models.user import User
+
+
+def upload(client, name, content, capture):
+    uploaded_file = SimpleUploadedFile(name, content, content_type="text/plain")
+    with capture(execute=True):
+        response = client.post(
+            reverse("api:fileversion-list"),
+            {"file": uploaded_file, "file_name": name},
+            format="multipart"
+        )
+    assert response.status_code == 201
+    return response
+
+
+@pytest.fixture
+def client_for():
+    def make(email):
+        user = User.objects.create_user(email=email, password="test123")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+    return make
+
+
+@pytest.mark.django_db
+def test_search_finds_latest_versions_by_content(client_for, django_capture_on_commit_callbacks):
+    client = client_for("test@example.com")
+    upload(client, "bill.txt", b"An act concerning fisheries licences", django_capture_on_commit_callbacks)
+    upload(client, "bill.txt", b"An act concerning forestry", django_capture_on_commit_callbacks)
+    upload(client, "statute.txt", b"Fisheries statute of 1998", django_capture_on_commit_callbacks)
+    queue.work()
+
+    response = client.get(reverse("api:fileversion-search"), {"q": "fisheries"})
+    assert response.status_code == 200
+    assert response.data["count"] == 1
+    assert response.data["results"][0]["file_obj"]["name"] == "statute.txt"
+
+    response = client.get(reverse("api:fileversion-search"), {"q": "fisheries", "scope": "all"})
+    assert response.data["count"] == 2
+    assert {r["version_number"] for r in response.data["results"]} == {1}
+
+
+@pytest.mark.django_db
+def test_search_is_scoped_to_user_and_indexes_each_blob_once(client_for, django_capture_on_commit_callbacks):
+    owner = client_for("owner@example.com")
+    other = client_for("other@example.com")
+    upload(owner, "amendment.txt", b"amendment to section 4", django_capture_on_commit_callbacks)
+    upload(other, "copy.txt", b"amendment to section 4", django_capture_on_commit_callbacks)
+    queue.work()
+
+    assert DocumentText.objects.count() == 1
+    response = other.get(reverse("api:fileversion-search"), {"q": "amendment section"})
+    assert response.data["count"] == 1
+    assert response.data["results"][0]["file_obj"]["name"] == "copy.txt"
+
+
+@pytest.mark.django_db
+def test_search_rejects_bad_parameters(client_for):
+    client = client_for("test@example.com")
+    assert client.get(reverse("api:fileversion-search")).status_code == 400
+    response = client.get(reverse("api:fileversion-search"), {"q": "act", "scope": "oldest"})
+    assert response.status_code == 400
+    assert "scope" in response.data
+    response = client.get(reverse("api:fileversion-search"), {"q": '"unbalanced AND ('})
+    assert response.status_code == 200
@@ -0,0 +1,107 @@
+import hashlib
+from io import StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.core.files.uploadedfile import SimpleUploadedFile
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from propylon_document_manager.file_versions.models.user import User
+from propylon_document_manager.file_versions.storage import (
+    BlobFileSystemStorage, HashRing, ShardedStorage, blob_name
+)
+
+
+def roots(tmp_path, *names, weights=None):
+    weights = weights or {}
+    return {name: {"location": str(tmp_path / name), "weight": weights.get(name, 1)} for name in names}
+
+
+def test_adding_a_root_only_moves_blobs_to_the_new_root():
+    keys = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(2000)]
+    before = HashRing({"a": 1, "b": 1, "c": 1})
+    after = HashRing({"a": 1, "b": 1, "c": 1, "d": 1})
+
+    moved = [key for key in keys if before.node_for(key) != after.node_for(key)]
+
+    assert all(after.node_for(key) == "d" for key in moved)
+    # About a quarter of the blobs belong on the new root.
+    assert 0.15 < len(moved) / len(keys) < 0.35
+
+
+class ConfiguredShardedStorage(ShardedStorage):
+    """Lets a test choose the roots of the ``default`` storage."""
+
+    roots_config = {}
+
+    def __init__(self):
+        super().__init__(self.roots_config)
+
+
+@pytest.fixture
+def sharded_default(settings):
+    settings.STORAGES = {
+        **settings.STORAGES, "default": {"BACKEND": "tests.test_sharded_storage.ConfiguredShardedStorage"}
+    }
+    return ConfiguredShardedStorage
+
+
+def test_reads_fall_back_until_rebalanced(tmp_path, sharded_default):
+    old = ShardedStorage(roots(tmp_path, "a"))
+    names = [
+        old.save(blob_name(hashlib.sha256(b"blob %d" % i).hexdigest()), ContentFile(b"blob %d" % i))
+        for i in range(20)
+    ]
+
+    # Draining "a" makes "b" the owner of everything; reads still find the old copies.
+    new = ShardedStorage(roots(tmp_path, "a", "b", weights={"a": 0}))
+    assert all(new.owner(name) == "b" for name in names)
+    with new.open(names[0]) as fh:
+        assert fh.read() == b"blob 0"
+
+    sharded_default.roots_config = roots(tmp_path, "a", "b", weights={"a": 0})
+    out = StringIO()
+    call_command("rebalance_blobs", stdout=out)
+
+    assert "Moved 20 blobs" in out.getvalue()
+    assert list(new.misplaced()) == []
+    assert all(new.locate(name) == "b" for name in names)
+    assert not [path for path in (tmp_path / "a").rglob("*") if path.is_file()]
+
+
+@pytest.mark.django_db
+def test_uploads_are_stored_under_their_content_hash(tmp_path, sharded_default):
+    sharded_default.roots_config = roots(tmp_path, "a", "b")
+    user = User.objects.create_user(email="shard@example.com", password="password")
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    response = client.post(
+        reverse("api:fileversion-list"),
+        {"file": SimpleUploadedFile("notes.txt", b"sharded"), "path": "/docs/notes.txt"},
+        format="multipart",
+    )
+
+    assert response.status_code == 201
+    name = FileVersion.objects.get().file.name
+    assert name == blob_name(hashlib.sha256(b"sharded").hexdigest())
+    storage = ShardedStorage(roots(tmp_path, "a", "b"))
+    assert storage.locate(name) == storage.owner(name)
+
+
+@pytest.mark.parametrize("make_storage", [
+    lambda tmp_path: BlobFileSystemStorage(location=str(tmp_path / "flat")),
+    lambda tmp_path: ShardedStorage(roots(tmp_path, "a", "b")),
+])
+def test_existing_blobs_are_not_stored_again(tmp_path, make_storage):
+    storage = make_storage(tmp_path)
+    name = blob_name(hashlib.sha256(b"blob").hexdigest())
+
+    assert storage.save(name, ContentFile(b"blob")) == name
+    assert storage.save(name, ContentFile(b"blob")) == name
+    assert storage.listdir(name.rpartition("/")[0]) == ([], [name.rpartition("/")[2]])
+    # Other names still get a free name.
+    assert storage.save("notes.txt", ContentFile(b"a")) == "notes.txt"
+    assert storage.save("notes.txt", ContentFile(b"b")) != "notes.txt"
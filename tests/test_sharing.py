@@ -0,0 +1,102 @@
+import importlib
+import time
+
+import pytest
+from django.test import Client
+from django.urls import Resolver404, resolve, reverse
+
+from propylon_document_manager.file_versions.models.file_version import FileVersion
+from propylon_document_manager.file_versions.sharing import sign_share
+from propylon_document_manager.file_versions.storage import blob_name
+from .conftest import upload
+
+
+@pytest.fixture
+def client(api_client):
+    upload(api_client, "bills/bill.txt", b"An Act to share things.")
+    return api_client
+
+
+def share(client, **params):
+    version = FileVersion.objects.get()
+    return client.get(reverse("api:fileversion-share", kwargs={"id": version.id}), params)
+
+
+@pytest.mark.django_db
+def test_share_link_is_served_without_queries_and_cacheable(client, django_assert_num_queries):
+    response = share(client)
+    assert response.status_code == 200
+    link = response.data["shareable_link"]
+    assert "/share/" in link
+
+    anonymous = Client()
+    with django_assert_num_queries(0):
+        shared = anonymous.get(link)
+    assert shared.status_code == 200
+    assert b"".join(shared.streaming_content) == b"An Act to share things."
+    assert 'filename="bill.txt"' in shared["Content-Disposition"]
+    assert "public" in shared["Cache-Control"] and "max-age=" in shared["Cache-Control"]
+    etag = '"%s"' % FileVersion.objects.get().content_hash
+    assert shared["ETag"] == etag
+
+    with django_assert_num_queries(0):
+        assert anonymous.get(link, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+
+@pytest.mark.django_db
+def test_tampered_and_expired_links_are_refused(client):
+    link = share(client).data["shareable_link"]
+    token = link.rpartition("/")[2]
+    tampered = token[:-1] + ("A" if token[-1] != "A" else "B")
+    response = Client().get(reverse("shared-download", args=[tampered]))
+    assert response.status_code == 403
+    assert "no-cache" in response["Cache-Control"]
+
+    expired = sign_share(FileVersion.objects.get(), int(time.time()) - 1)
+    assert Client().get(reverse("shared-download", args=[expired])).status_code == 410
+
+
+@pytest.mark.django_db
+def test_expiry_is_capped_rounded_and_shared_by_listed_links(client, settings):
+    settings.SHARE_LINK_MAX_TTL = 3600
+    settings.SHARE_LINK_EXPIRY_STEP = 60
+    response = share(client, expires_in=10 * 24 * 3600)
+    expires_at = response.data["expires_at"].timestamp()
+    assert expires_at % 60 == 0
+    assert time.time() + 3600 <= expires_at < time.time() + 3600 + 60
+
+    assert share(client, expires_in="soon").status_code == 400
+    # Coarse enough that both links fall in the same step.
+    settings.SHARE_LINK_EXPIRY_STEP = 10**9
+    listed = client.get(reverse("api:fileversion-list")).data[0]["shareable_link"]
+    assert listed == share(client, expires_in=3600).data["shareable_link"]
+
+
+@pytest.mark.django_db
+def test_responses_do_not_expose_media_urls(client, settings):
+    version = FileVersion.objects.get()
+    urls = [
+        reverse("api:fileversion-list"),
+        reverse("api:fileversion-detail", kwargs={"id": version.id}),
+        reverse("api:fileversion-latest"),
+        reverse("api:fileversion-by-hash", kwargs={"content_hash": version.content_hash}),
+        reverse("file-by-path", kwargs={"file_path": "bills/bill.txt"}),
+    ]
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200, url
+        assert settings.MEDIA_URL.encode() not in response.content, url
+        assert b'"file":' not in response.content, url
+    assert "/share/" in response.data["shareable_link"]
+
+
+def test_media_root_is_not_served_even_in_debug(settings):
+    # Share tokens reveal content hashes, which are also the blob names.
+    debug, settings.DEBUG = settings.DEBUG, True
+    urls = importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    try:
+        with pytest.raises(Resolver404):
+            resolve(settings.MEDIA_URL + blob_name("0" * 64), urlconf=urls)
+    finally:
+        settings.DEBUG = debug
+        importlib.reload(urls)
@@ -0,0 +1,81 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.core.files.uploadedfile import SimpleUploadedFile
+from propylon_document_manager.file_versions import queue
+from propylon_document_manager.file_versions.models.task import Task
+from propylon_document_manager.file_versions.models.user import User
+
+calls = []
+
+
+@queue.register("tests.record")
+def record(value):
+    calls.append(value)
+
+
+@queue.register("tests.explode")
+def explode():
+    raise RuntimeError("boom")
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+    queue.reset_backend()
+
+
+@pytest.mark.django_db
+def test_upload_queues_one_verification_per_blob(django_capture_on_commit_callbacks):
+    """Test that the same content uploaded under two names is only processed once."""
+    user = User.objects.create_user(email="test@example.com", password="test123")
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    for name in ["first.txt", "second.txt"]:
+        uploaded_file = SimpleUploadedFile(name, b"shared content", content_type="text/plain")
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                reverse("api:fileversion-list"),
+                {"file": uploaded_file, "file_name": name},
+                format="multipart"
+            )
+        assert response.status_code == 201
+
+    tasks = Task.objects.filter(name="file_versions.verify_blob")
+    assert tasks.count() == 1
+    assert tasks.get().idempotency_key == response.data["content_hash"]
+
+    call_command("run_task_worker", "--once")
+    assert tasks.get().status == Task.Status.DONE
+
+
+@pytest.mark.django_db
+def test_enqueue_is_idempotent_and_runs_by_priority():
+    assert queue.enqueue("tests.record", {"value": "low"}, idempotency_key="a")
+    assert not queue.enqueue("tests.record", {"value": "again"}, idempotency_key="a")
+    queue.enqueue("tests.record", {"value": "high"}, priority=10)
+
+    assert queue.work() == 2
+    assert calls == ["high", "low"]
+    assert Task.objects.filter(status=Task.Status.DONE).count() == 2
+
+
+@pytest.mark.django_db
+def test_failed_task_is_retried_then_marked_failed():
+    queue.enqueue("tests.explode", max_attempts=2)
+
+    assert queue.work() == 1
+    task = Task.objects.get()
+    assert task.status == Task.Status.PENDING
+    assert task.attempts == 1
+    assert task.run_after > timezone.now()
+    assert "boom" in task.last_error
+
+    Task.objects.update(run_after=timezone.now())
+    queue.work()
+    task.refresh_from_db()
+    assert task.status == Task.Status.FAILED
+    assert task.attempts == 2
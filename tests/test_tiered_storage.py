@@ -0,0 +1,87 @@
+import os
+
+import pytest
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.core.files.uploadedfile import SimpleUploadedFile
+from propylon_document_manager.file_versions import queue
+from propylon_document_manager.file_versions.models.file import File
+from propylon_document_manager.file_versions.models.user import User
+from propylon_document_manager.file_versions.storage import TieredStorage
+from .storages import SlowFileSystemStorage
+
+
+@pytest.fixture
+def remote(tmp_path):
+    SlowFileSystemStorage.opens = 0
+    return {"backend": "tests.storages.SlowFileSystemStorage", "backend_options": {"location": str(tmp_path / "remote")}}
+
+
+def read(storage, name):
+    with storage.open(name) as fh:
+        return fh.read()
+
+
+def test_blobs_are_admitted_on_second_miss_and_deduplicated(remote, tmp_path):
+    storage = TieredStorage(**remote, cache_dir=str(tmp_path / "cache"), admit_after=2)
+    storage.save("a.txt", ContentFile(b"same"))
+    storage.save("b.txt", ContentFile(b"same"))
+
+    assert read(storage, "a.txt") == b"same"
+    assert storage.cached_path("a.txt") is None
+    assert read(storage, "a.txt") == b"same"
+    assert read(storage, "a.txt") == b"same"
+    assert SlowFileSystemStorage.opens == 2
+
+    storage.prefetch("b.txt")
+    assert storage.cached_path("a.txt") == storage.cached_path("b.txt")
+    assert len(os.listdir(os.path.dirname(storage.cached_path("a.txt")))) == 1
+
+
+def test_least_recently_used_blobs_are_evicted(remote, tmp_path):
+    storage = TieredStorage(
+        **remote, cache_dir=str(tmp_path / "cache"), max_bytes=2500, max_object_bytes=1000, admit_after=1
+    )
+    for name in ("a", "b", "c"):
+        storage.save(name, ContentFile(name.encode() * 1000))
+
+    read(storage, "a")
+    read(storage, "b")
+    os.utime(storage.cached_path("a"), (0, 0))
+    os.utime(storage.cached_path("b"), (1, 1))
+    read(storage, "a")  # a hit makes "a" the most recently used
+    read(storage, "c")
+
+    assert storage.cached_path("b") is None
+    assert storage.cached_path("a") and storage.cached_path("c")
+
+
+@pytest.mark.django_db
+def test_downloading_an_old_version_prefetches_the_latest(remote, tmp_path, settings, django_capture_on_commit_callbacks):
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "default": {
+            "BACKEND": "propylon_document_manager.file_versions.storage.TieredStorage",
+            "OPTIONS": {**remote, "cache_dir": str(tmp_path / "cache"), "admit_after": 3},
+        },
+    }
+    user = User.objects.create_user(email="test@example.com", password="test123")
+    client = APIClient()
+    client.force_authenticate(user=user)
+    ids = []
+    for content in (b"first", b"second"):
+        response = client.post(
+            reverse("api:fileversion-list"),
+            {"file": SimpleUploadedFile("bill.txt", content), "file_name": "bill.txt"},
+            format="multipart"
+        )
+        ids.append(response.data["id"])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.get(reverse("api:fileversion-download", kwargs={"id": ids[0]}))
+    assert b"".join(response.streaming_content) == b"first"
+    queue.work()
+
+    latest = File.objects.get(name="bill.txt").latest_version
+    assert latest.file.storage.cached_path(latest.file.name)
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.core.files.uploadedfile import SimpleUploadedFile
+from propylon_document_manager.file_versions.models.user import User
+from propylon_document_manager.utils import tracing as tracing_module
+from propylon_document_manager.utils.tracing import Trace, span
+
+
+@pytest.fixture
+def tracing(settings, tmp_path):
+    settings.TRACE_ENABLED = True
+    settings.TRACE_DIR = str(tmp_path / "traces")
+    settings.TRACE_PROFILE_INTERVAL = 0.001
+    return tmp_path / "traces"
+
+
+def client_for(email, is_staff=False):
+    user = User.objects.create_user(email=email, password="test123", is_staff=is_staff)
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.mark.django_db
+def test_staff_request_writes_trace_and_profile(tracing):
+    client = client_for("staff@example.com", is_staff=True)
+    client.post(
+        reverse("api:fileversion-list"),
+        {"file": SimpleUploadedFile("a.txt", b"content"), "file_name": "a.txt"},
+        format="multipart",
+        HTTP_X_TRACE="1"
+    )
+
+    response = client.get(reverse("api:fileversion-list"), HTTP_X_TRACE="profile")
+    assert response.status_code == 200
+    trace_id = response["X-Trace-Id"]
+
+    trace_file, = tracing.glob(f"*-{trace_id}.trace.json")
+    names = {event["name"] for event in json.loads(trace_file.read_text())["traceEvents"]}
+    assert {"request", "auth", "permissions", "db", "serialize", "render"} <= names
+    assert tracing.glob(f"*-{trace_id}.folded")
+
+    upload_trace = [path for path in tracing.glob("*.trace.json") if path != trace_file]
+    names = {event["name"] for event in json.loads(upload_trace[0].read_text())["traceEvents"]}
+    assert {"hash", "storage.write"} <= names
+
+
+@pytest.mark.django_db
+def test_non_staff_requests_are_not_traced(tracing, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("Profiler started for a non-staff request")
+
+    monkeypatch.setattr(tracing_module, "SamplingProfiler", refuse)
+    monkeypatch.setattr(tracing_module, "trace_queries", refuse)
+    for client in (client_for("test@example.com"), APIClient()):
+        response = client.get(reverse("api:fileversion-list"), HTTP_X_TRACE="profile")
+        assert response.status_code in (200, 401, 403)
+        assert "X-Trace-Id" not in response
+    assert not tracing.exists()
+
+
+def test_span_outside_a_trace_is_a_no_op():
+    with span("anything"):
+        pass
+    trace = Trace("test")
+    with trace.span("outer"):
+        with trace.span("inner"):
+            pass
+    assert [(name, depth) for name, _, _, depth, _ in trace.spans] == [("inner", 1), ("outer", 0)]